@@ -23,17 +23,24 @@ if getattr(sys, 'frozen', False):
     os.environ["PATH"] = str(Path(base_path) / "lib") + os.pathsep + os.environ["PATH"]
 
 # === MATPLOTLIB CONFIGURATION ===
-import matplotlib
-matplotlib.use('Agg')  # CRITICAL for frozen apps
+# matplotlib itself is imported on the first map render (loss_map picks the Agg backend there)
 
-# Basic configuration for frozen apps
+# Frozen apps: a persistent per-user MPLCONFIGDIR, seeded with the matplotlibrc and font cache that
+# setupF.py ships in lib/mpl_config, so not even the first render waits on a font scan
 if getattr(sys, 'frozen', False):
     try:
-        import tempfile
-        temp_config = Path(tempfile.gettempdir()) / "matplotlib_config"
-        temp_config.mkdir(exist_ok=True)
-        os.environ['MPLCONFIGDIR'] = str(temp_config)
-        print(f"✅ Using temp config: {temp_config}")
+        from baseline_cache import default_cache_dir
+        mpl_config = default_cache_dir().parent / "matplotlib"
+        mpl_config.mkdir(parents=True, exist_ok=True)
+        shipped = Path(base_path) / "lib" / "mpl_config"
+        if shipped.is_dir():
+            for f in shipped.iterdir():
+                target = mpl_config / f.name
+                # a newer build ships a newer cache (or a new fontlist-vNNN.json for a new matplotlib)
+                if not target.exists() or f.stat().st_mtime > target.stat().st_mtime:
+                    shutil.copy2(f, target)
+        os.environ['MPLCONFIGDIR'] = str(mpl_config)
+        print(f"✅ Using matplotlib config: {mpl_config}")
     except Exception as e:
         print(f"⚠️ Config setup failed: {e}")
 
@@ -41,17 +48,16 @@ if getattr(sys, 'frozen', False):
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
-import pandas as pd
-import geopandas as gpd
-import numpy as np
-from shapely.validation import make_valid
-from shapely.geometry import Polygon
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
 import csv
-import tempfile
 import time
 
+# loss_engine / loss_map (geopandas, shapely, matplotlib) are imported when a loss run starts and pandas
+# once the window is up (_ensure_gain_data), so the window paints without them; see benchmarks/bench_startup.py
+from loss_worker import LossWorker, PreviewWorker
+from gain_engine import (CONDITION_MAPPING, DIFFICULTY_MAPPING, SPATIAL_MAPPING, STRATEGIC_MAPPING,
+                         GainTables, calculate_gain_batch, gain_units, load_habitats, load_years,
+                         read_gain_parcels, write_gain_results, year_key)
+
 # ---------- CONFIG ----------
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
@@ -62,12 +68,8 @@ YEARS_CSV = DATA_DIR / "target_year.csv"
 
 MAIN_BG = "#f0f0f0"  # chosen color
 
-# Mappings
-CONDITION_MAPPING = {"Good": 3.0, "Fairly Good": 2.5, "Moderate": 2.0, "Fairly poor": 1.5, "Poor": 1.0}
-DIFFICULTY_MAPPING = {"Very high": 0.1, "High": 0.33, "Medium": 0.67, "Low": 1.0}
-SPATIAL_MAPPING = {"On-site": 1.0, "Within same city": 0.75, "Somewhere further": 0.5}
-STRATEGIC_MAPPING = {"High": 1.15, "Low": 1.0}
-DISTINCTIVENESS_MAP = {"V.High": 8, "High": 6, "Medium": 4, "Low": 2, "V.Low": 0}
+# Loss tab precision grid choices -> LossOptions.grid_size (metres in EPSG:31370)
+LOSS_GRID_SIZES = {"Off": None, "1 mm": 0.001, "1 cm": 0.01}
 
 # ---------- Utility: logo manager ----------
 class LogoManager:
@@ -112,435 +114,35 @@ def get_ogr2ogr_path():
         return str(candidate)
     return None
 
-def force_polygon(geom):
-    """Convert line-like geometries to polygons where sensical"""
-    if geom is None or geom.is_empty:
-        return None
-    try:
-        if geom.type in ["Polygon", "MultiPolygon"]:
-            return geom
-        if geom.type == "LineString":
-            coords = list(geom.coords)
-            if len(coords) >= 3:
-                if coords[0] != coords[-1]:
-                    coords.append(coords[0])
-                if len(coords) >= 4:
-                    poly = Polygon(coords)
-                    if poly.is_valid:
-                        return poly
-        if geom.type == "MultiLineString":
-            polys = []
-            for line in geom.geoms:
-                if line.type == "LineString":
-                    coords = list(line.coords)
-                    if len(coords) >= 3:
-                        if coords[0] != coords[-1]:
-                            coords.append(coords[0])
-                        if len(coords) >= 4:
-                            poly = Polygon(coords)
-                            if poly.is_valid:
-                                polys.append(poly)
-            if polys:
-                from shapely.geometry import MultiPolygon
-                mp = MultiPolygon(polys)
-                if mp.is_valid:
-                    return mp
-    except Exception as e:
-        print(f"Warning force_polygon: {e}")
-    return geom
-
-def load_and_fix(path):
-    """Load file through geopandas and attempt to clean geometries robustly."""
-    gdf = gpd.read_file(path)
-    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
-    if gdf.empty:
-        raise RuntimeError("No valid geometries found")
-    # buffer(0) attempt
-    try:
-        gdf["geometry"] = gdf.geometry.buffer(0)
-    except Exception:
-        pass
-    # make_valid
-    try:
-        gdf["geometry"] = gdf.geometry.apply(make_valid)
-    except Exception:
-        pass
-    # convert lines to polygons when possible
-    try:
-        gdf["geometry"] = gdf.geometry.apply(force_polygon)
-    except Exception:
-        pass
-    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
-    if gdf.empty:
-        raise RuntimeError("All geometries invalid after cleaning")
-    return gdf
-
-def convert_dxf_layers(input_path, output_shp):
-    """Convert DXF to Shapefile using direct ezdxf processing (no layer selection)"""
-    try:
-        import ezdxf
-        import warnings
-        from shapely.geometry import Polygon
-        
-        warnings.filterwarnings("ignore")
-        
-        print(f"Processing DXF file: {input_path}")
-        
-        # Read DXF file
-        doc = ezdxf.readfile(input_path)
-        all_geometries = []
-        
-        # Process ALL polyline entities (no layer filtering)
-        for entity in doc.modelspace():
-            # Skip invalid entities
-            if callable(entity) or not hasattr(entity, 'dxftype'):
-                continue
-                
-            # Process any polyline (LWPOLYLINE or POLYLINE)
-            if entity.dxftype() in ['LWPOLYLINE', 'POLYLINE']:
-                
-                points = []
-                if entity.dxftype() == 'LWPOLYLINE':
-                    raw_points = list(entity.get_points())
-                    points = [(p[0], p[1]) for p in raw_points]
-                elif entity.dxftype() == 'POLYLINE':
-                    for vertex in entity.vertices:
-                        points.append((vertex.dxf.location.x, vertex.dxf.location.y))
-                
-                # Create polygon (ensure it's closed)
-                if len(points) >= 3:
-                    if points[0] != points[-1]:
-                        points.append(points[0])
-                    
-                    polygon = Polygon(points)
-                    if polygon.is_valid:
-                        all_geometries.append(polygon)
-                        print(f"✓ Added {entity.dxftype()} from layer '{entity.dxf.layer}' with {len(points)} points")
-        
-        if not all_geometries:
-            raise RuntimeError("No valid polyline geometries found in DXF file")
-        
-        # Save to shapefile - USE EPSG:31370
-        gdf = gpd.GeoDataFrame(geometry=all_geometries, crs="EPSG:31370")
-        gdf.to_file(output_shp)
-        
-        print(f"✅ Successfully converted {len(all_geometries)} polygons to {output_shp}")
-        return output_shp
-        
-    except Exception as e:
-        print(f"❌ DXF conversion failed: {e}")
-        raise RuntimeError(f"Failed to convert DXF: {e}")
-
-def convert_if_needed(input_path, is_baseline=False):
-    ext = os.path.splitext(input_path)[1].lower()
-    if is_baseline:
-        if ext in (".shp", ".gpkg"):
-            return input_path
-        raise RuntimeError("Baseline must be .shp or .gpkg")
-    else:
-        if ext == ".dxf":
-            out = os.path.splitext(input_path)[0] + "_conv.shp"
-            return convert_dxf_layers(input_path, out)
-        if ext == ".shp":
-            return input_path
-        raise RuntimeError("Planned development must be .shp or .dxf")
-
-# ---------- Map Visualization Functions ----------
-def add_scale_bar(ax, gdf, location='lower left', length_km=None):
-    """Add a scale bar to the map"""
-    try:
-        # Get the bounds of the data
-        bounds = gdf.total_bounds  # [minx, miny, maxx, maxy]
-        
-        # Calculate appropriate scale bar length (auto-adjust based on map size)
-        map_width_m = bounds[2] - bounds[0]
-        if length_km is None:
-            # Auto-calculate reasonable scale bar length
-            if map_width_m > 5000:  # Large area
-                length_km = 1.0
-            elif map_width_m > 1000:  # Medium area
-                length_km = 0.5
-            else:  # Small area
-                length_km = 0.1
-        
-        length_m = length_km * 1000  # Convert to meters
-        
-        # Set position (using relative coordinates) - LOWER LEFT for scale bar
-        if location == 'lower left':
-            x_rel = 0.05  # 5% from left
-            y_rel = 0.08  # 8% from bottom (moved up slightly to avoid edge)
-        elif location == 'lower right':
-            x_rel = 0.95  # 95% from left  
-            y_rel = 0.08  # 8% from bottom
-        else:  # lower center
-            x_rel = 0.5   # center
-            y_rel = 0.08  # 8% from bottom
-        
-        # Convert relative to data coordinates
-        x_data = bounds[0] + x_rel * map_width_m
-        y_data = bounds[1] + y_rel * (bounds[3] - bounds[1])
-        
-        # Draw the main scale bar (thicker for better visibility)
-        ax.plot([x_data, x_data + length_m], [y_data, y_data], 
-               color='black', linewidth=6, solid_capstyle='butt')  # Increased linewidth
-        
-        # Add perpendicular ends (thicker)
-        end_height = length_m * 0.15  # 15% of bar length (increased)
-        ax.plot([x_data, x_data], [y_data - end_height/2, y_data + end_height/2], 
-               color='black', linewidth=4)  # Thicker
-        ax.plot([x_data + length_m, x_data + length_m], 
-               [y_data - end_height/2, y_data + end_height/2], 
-               color='black', linewidth=4)  # Thicker
-        
-        # Add scale text (larger font)
-        if length_km >= 1:
-            scale_text = f'{length_km:.0f} km'
-        else:
-            scale_text = f'{length_km * 1000:.0f} m'
-        
-        ax.text(x_data + length_m/2, y_data + end_height, scale_text,
-               ha='center', va='bottom', fontsize=12, fontweight='bold',  # Increased font size
-               bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.9, linewidth=1))
-        
-        print(f"✅ Added scale bar: {scale_text}")
-        
-    except Exception as e:
-        print(f"⚠️ Could not add scale bar: {e}")
+def create_loss_map_as_png(baseline_gdf, intersection_gdf, output_png, preview_mode=False, summary=None):
+    """loss_map.create_loss_map_as_png, imported on first use"""
+    from loss_map import create_loss_map_as_png as draw
+    return draw(baseline_gdf, intersection_gdf, output_png, preview_mode, summary=summary)
 
-def add_north_arrow(ax, location='lower right', size=40):
-    """Add a north arrow to the map - bigger and in lower right corner"""
-    try:
-        # Use relative coordinates for positioning
-        if location == 'lower right':
-            x = 0.93  # 93% from left (lower right)
-            y = 0.08  # 8% from bottom (lower position)
-        elif location == 'upper right':
-            x = 0.95
-            y = 0.95
-        elif location == 'upper left':
-            x = 0.05
-            y = 0.95
-        else:  # lower left
-            x = 0.05
-            y = 0.08
-        
-        # Create a larger north arrow using a triangle (more visible)
-        arrow_size = size * 0.001  # Scale factor for arrow size
-        
-        # Draw a triangle for the north arrow
-        arrow_points = [
-            [x, y + arrow_size],           # Top point
-            [x - arrow_size/2, y],         # Bottom left
-            [x + arrow_size/2, y],         # Bottom right
-            [x, y + arrow_size]            # Back to top (close triangle)
-        ]
-        
-        arrow_patch = mpatches.Polygon(
-            arrow_points,
-            closed=True,
-            facecolor='black',
-            edgecolor='black',
-            linewidth=2,
-            transform=ax.transAxes
-        )
-        ax.add_patch(arrow_patch)
-        
-        # Add "N" text below the arrow (bigger and bolder)
-        ax.text(x, y + arrow_size, 'N', 
-               ha='center', va='top', 
-               fontsize=16, fontweight='bold',  # Increased font size
-               transform=ax.transAxes,
-               bbox=dict(boxstyle="circle,pad=0.4", facecolor='white', edgecolor='black', linewidth=1))
-        
-        print("✅ Added BIG north arrow in lower right corner")
-        
-    except Exception as e:
-        print(f"⚠️ Could not add north arrow: {e}")
+def render_loss_map_preview(baseline_gdf, intersection_gdf, width, height, summary=None):
+    """loss_map.render_loss_map_preview, imported on first use"""
+    from loss_map import render_loss_map_preview as draw
+    return draw(baseline_gdf, intersection_gdf, width, height, summary=summary)
 
-def create_loss_map_as_png(baseline_gdf, intersection_gdf, output_png, preview_mode=False):
-    """Create PNG map - can be used for both high-quality save and fast preview"""
-    try:
-        print("🔍 Starting PNG map creation...")
-        
-        # Clear matplotlib cache
-        plt.close('all')
-        import gc
-        gc.collect()
-        
-        # Different settings for preview vs save
-        if preview_mode:
-            # PREVIEW SETTINGS - Fast rendering
-            figsize = (14, 8)  # Smaller
-            dpi = 100          # Lower quality
-            fontsize = 10      # Smaller text
-            linewidth = 1.0    # Thinner lines
-        else:
-            # SAVE SETTINGS - High quality
-            figsize = (20, 12) # Larger
-            dpi = 300          # Higher quality  
-            fontsize = 12      # Normal text
-            linewidth = 1.5    # Thicker lines
-        
-        fig, (ax_map, ax_table) = plt.subplots(1, 2, figsize=figsize,
-                                              gridspec_kw={'width_ratios': [2, 1]})
-        
-        # Step 1: Define nature-inspired color palette
-        nature_colors = {
-            'Grassland': '#9ACD32', 'Woodland': '#228B22', 'Forest': '#006400',
-            'Heathland and shrub': '#DAA520', 'Cropland': '#8B4513',
-            'Wetland': '#20B2AA', 'Urban': '#A9A9A9', 'Other': '#FFD700'
-        }
-        
-        # Step 2: Plot baseline habitats
-        color_map = {}
-        if 'Baseline Broad Habitat Type' in baseline_gdf.columns:
-            # Get unique habitat types
-            habitat_types = baseline_gdf['Baseline Broad Habitat Type'].unique()
-            
-            # Assign colors
-            for habitat_type in habitat_types:
-                clean_habitat = str(habitat_type).strip()
-                if clean_habitat in nature_colors:
-                    color_map[habitat_type] = nature_colors[clean_habitat]
-                else:
-                    color_map[habitat_type] = '#FF6B35'
-            
-            # Plot baseline with light colors
-            for habitat_type, color in color_map.items():
-                subset = baseline_gdf[baseline_gdf['Baseline Broad Habitat Type'] == habitat_type]
-                subset.plot(ax=ax_map, color=color, alpha=0.3, edgecolor='gray', linewidth=0.5)
-        else:
-            # Fallback if no habitat type column
-            baseline_gdf.plot(ax=ax_map, color='lightgray', alpha=0.5, edgecolor='gray', linewidth=0.5)
-        
-        # Step 3: Plot intersection/loss areas
-        if 'Baseline Broad Habitat Type' in intersection_gdf.columns:
-            intersection_gdf = intersection_gdf.copy()
-            intersection_gdf['color'] = intersection_gdf['Baseline Broad Habitat Type'].map(color_map)
-            intersection_gdf['color'] = intersection_gdf['color'].fillna('#FF6B35')
-            
-            intersection_gdf.plot(ax=ax_map, 
-                                color=intersection_gdf['color'], 
-                                alpha=0.8, 
-                                edgecolor='black', 
-                                linewidth=linewidth)
-        else:
-            intersection_gdf.plot(ax=ax_map, color='red', alpha=0.8, edgecolor='black', linewidth=linewidth)
-        
-        # Step 4: Create summary table
-        if 'Baseline Broad Habitat Type' in intersection_gdf.columns:
-            summary_data = []
-            for habitat_type in intersection_gdf['Baseline Broad Habitat Type'].unique():
-                habitat_data = intersection_gdf[intersection_gdf['Baseline Broad Habitat Type'] == habitat_type]
-                total_area = habitat_data['Loss area (ha)'].sum()
-                total_biodiversity = habitat_data['Biodiversity units'].sum()
-                
-                if preview_mode:
-                    # Truncate long names for preview
-                    display_name = habitat_type[:12] + '...' if len(habitat_type) > 12 else habitat_type
-                    summary_data.append([display_name, f"{total_area:.1f}", f"{total_biodiversity:.1f}"])
-                else:
-                    summary_data.append([habitat_type, f"{total_area:.2f}", f"{total_biodiversity:.2f}"])
-            
-            # Create table
-            if summary_data:
-                if preview_mode:
-                    col_labels = ['Habitat', 'Area', 'Loss']
-                else:
-                    col_labels = ['Habitat Type', 'Area (ha)', 'Biodiversity Loss']
-                    
-                table = ax_table.table(cellText=summary_data,
-                                     colLabels=col_labels,
-                                     loc='center',
-                                     cellLoc='center',
-                                     colColours=['#E8F5E8', '#E8F5E8', '#E8F5E8'])
-                
-                table.auto_set_font_size(False)
-                table.set_fontsize(fontsize-2)
-                table.scale(1, 1.5)
-        
-        # Step 5: Create legend
-        if color_map:
-            legend_patches = []
-            items = list(color_map.items())
-            if preview_mode:
-                items = items[:5]  # Limit to 5 items for preview
-                
-            for habitat_type, color in items:
-                patch = mpatches.Patch(color=color, label=habitat_type, alpha=0.8)
-                legend_patches.append(patch)
-            
-            ax_map.legend(handles=legend_patches, 
-                         title='Habitat Types',
-                         loc='upper right',
-                         fontsize=fontsize-2,
-                         framealpha=0.9)
-        
-        # Step 6: Add Scale Bar and North Arrow
-        try:
-            add_scale_bar(ax_map, baseline_gdf)
-            add_north_arrow(ax_map)
-        except Exception as e:
-            print(f"⚠️ Map elements failed: {e}")
-        
-        # Step 7: Customize map appearance
-        ax_map.set_title('Biodiversity Loss Map', fontsize=fontsize+2, fontweight='bold', pad=20)
-        ax_table.set_title('Loss Summary', fontsize=fontsize, fontweight='bold', pad=20)
-        ax_table.axis('off')
-        
-        # Calculate and display totals
-        total_biodiversity_loss = intersection_gdf['Biodiversity units'].sum() if 'Biodiversity units' in intersection_gdf.columns else 0
-        total_area_loss = intersection_gdf['Loss area (ha)'].sum() if 'Loss area (ha)' in intersection_gdf.columns else 0
-        
-        stats_text = f"Total Biodiversity Loss: {total_biodiversity_loss:,.1f} units\nTotal Area Impacted: {total_area_loss:,.1f} ha"
-        
-        ax_map.text(0.02, 0.98, stats_text, 
-                   transform=ax_map.transAxes, 
-                   fontsize=fontsize, 
-                   fontweight='bold',
-                   verticalalignment='top',
-                   bbox=dict(boxstyle="round,pad=0.5", facecolor='white', alpha=0.9))
-        
-        # Remove axis ticks from map
-        ax_map.set_xticks([])
-        ax_map.set_yticks([])
-        
-        # Add grid for better spatial reference
-        ax_map.grid(True, alpha=0.3)
-        
-        # Save with appropriate quality
-        plt.tight_layout()
-        plt.savefig(output_png, dpi=dpi, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none',
-                   format='png', transparent=False)
-        plt.close('all')
-        gc.collect()
-        
-        print(f"✅ PNG saved successfully (preview_mode: {preview_mode})")
-        return True
-        
-    except Exception as e:
-        print(f"💥 Map creation error: {e}")
-        import traceback
-        traceback.print_exc()
-        plt.close('all')
-        return False
-
-def save_with_visualization(baseline_gdf, intersection_gdf, significance_score):
-    """Save shapefile and CSV, plus offer PNG map as extra"""
+def save_with_visualization(baseline_gdf, intersection_gdf, significance_score, habitats=None):
+    """Save shapefile and CSV, plus offer PNG map as extra (habitats: the run's LossResult.habitats)"""
+    from loss_engine import EXPORT_FILETYPES, RESULT_COLUMNS, export_layer, habitat_summary, habitat_summary_path
+
+    if habitats is None:
+        habitats = habitat_summary(intersection_gdf)
     
     # First, save shapefile and CSV
     shp_path = filedialog.asksaveasfilename(
-        title="Save intersection shapefile (choose .shp filename)", 
+        title="Save intersection layer (.shp, .parquet or .fgb)", 
         defaultextension=".shp", 
-        filetypes=[("Shapefile", "*.shp")]
+        filetypes=EXPORT_FILETYPES
     )
     if shp_path:
         try:
-            intersection_gdf.to_file(shp_path)
-            messagebox.showinfo("Saved", f"Intersection shapefile saved to: {shp_path}")
+            export_layer(intersection_gdf, shp_path)
+            messagebox.showinfo("Saved", f"Intersection layer saved to: {shp_path}")
         except Exception as e:
-            messagebox.showerror("Save error", f"Failed to save shapefile: {e}")
+            messagebox.showerror("Save error", f"Failed to save intersection layer: {e}")
 
     # CSV of results
     csv_path = filedialog.asksaveasfilename(
@@ -550,9 +152,10 @@ def save_with_visualization(baseline_gdf, intersection_gdf, significance_score):
     )
     if csv_path:
         try:
-            out_cols = ["Loss area (ha)", "Condition score", "Distinctiveness score", "Significance score", "Biodiversity units"]
-            intersection_gdf[out_cols].to_csv(csv_path, index=False)
-            messagebox.showinfo("Saved", f"CSV saved to: {csv_path}")
+            intersection_gdf[RESULT_COLUMNS].to_csv(csv_path, index=False)
+            habitat_csv = habitat_summary_path(csv_path)
+            habitats.to_csv(habitat_csv, index=False)
+            messagebox.showinfo("Saved", f"CSV saved to: {csv_path}\nLoss by habitat type: {habitat_csv}")
         except Exception as e:
             messagebox.showerror("Save error", f"Failed to save CSV: {e}")
     
@@ -573,7 +176,8 @@ def save_with_visualization(baseline_gdf, intersection_gdf, significance_score):
         if png_path:
             try:
                 # Use high-quality mode (preview_mode=False)
-                success = create_loss_map_as_png(baseline_gdf, intersection_gdf, png_path, preview_mode=False)
+                success = create_loss_map_as_png(baseline_gdf, intersection_gdf, png_path, preview_mode=False,
+                                                 summary=habitats)
                 
                 if success:
                     messagebox.showinfo("Success", f"High-quality map saved to:\n{png_path}")
@@ -610,47 +214,47 @@ class BiodiversityApp:
         self.root.title("Biodiversity Tool")
         # load logos
         self.logo_manager = LogoManager(LOGOS_DIR)
-        # load CSVs
-        self.habitats_df = self._load_habitats()
-        self.years_df = self._load_years()
+        # CSVs for the gain calculator, loaded by _ensure_gain_data once the window is up
+        self.habitats_df = None
+        self.years_df = None
+        self.gain_tables = None
         # saved results in-memory list
         self.saved_rows = []
         # map data storage
         self.current_baseline_gdf = None
         self.current_intersection_gdf = None
+        self.current_habitats = None
+        # loss runs (and their map previews) go to a background thread; _poll_loss_jobs drains its events
+        self.loss_worker = LossWorker()
+        self._loss_polling = False
+        self._loss_stage_text = ""
+        self._loss_jobs = {}
+        # last run's baseline and loss rows, for the incremental option (loss_incremental); made on the worker
+        self._incremental = None
+        # Map-tab redraws (canvas resized since the preview was drawn) go to their own thread;
+        # _map_generation goes up with each new result so a late drawing of an older one is dropped
+        self.map_preview_worker = PreviewWorker()
+        self._map_preview_polling = False
+        self._map_generation = 0
         # build UI
         self._build_ui()
+        self.root.after_idle(self._ensure_gain_data)
+
+    def _ensure_gain_data(self):
+        """Gain lookup tables (this is what pulls in pandas); fills the habitat and year lists on first call"""
+        if self.gain_tables is None:
+            self.habitats_df = self._load_habitats()
+            self.years_df = self._load_years()
+            self.gain_tables = GainTables(self.habitats_df, self.years_df)
+            self.cb_broad["values"] = sorted(self.habitats_df["Broad Habitat Type"].unique().tolist())
+            self.cb_year["values"] = [str(x) for x in self.years_df["Years"].tolist()]
+        return self.gain_tables
 
     def _load_habitats(self):
-        if HABITATS_CSV.exists():
-            try:
-                df = pd.read_csv(HABITATS_CSV, dtype=str).fillna("")
-                df["Distinctiveness Category"] = df.get("Distinctiveness Category", df.columns[-1])
-                df["Distinctiveness Score"] = df["Distinctiveness Category"].map(DISTINCTIVENESS_MAP).fillna(0).astype(float)
-                return df
-            except Exception as e:
-                print("Reading habitats failed:", e)
-        # fallback sample
-        sample = pd.DataFrame([
-            {"Broad Habitat Type": "Grassland", "Specific Habitat": "Improved grassland", "Distinctiveness Category": "Medium"},
-            {"Broad Habitat Type": "Woodland", "Specific Habitat": "Broadleaved woodland", "Distinctiveness Category": "High"},
-        ])
-        sample["Distinctiveness Score"] = sample["Distinctiveness Category"].map(DISTINCTIVENESS_MAP).fillna(0).astype(float)
-        return sample
+        return load_habitats(HABITATS_CSV)
 
     def _load_years(self):
-        if YEARS_CSV.exists():
-            try:
-                df = pd.read_csv(YEARS_CSV, dtype=str).fillna("")
-                if "Multiplier" in df.columns:
-                    df["Multiplier"] = pd.to_numeric(df["Multiplier"], errors="coerce").fillna(1.0)
-                else:
-                    df["Multiplier"] = 1.0
-                return df
-            except Exception as e:
-                print("Reading years failed:", e)
-        # fallback
-        return pd.DataFrame([{"Years": "5", "Multiplier": 1.05}, {"Years": "10", "Multiplier": 1.0}])
+        return load_years(YEARS_CSV)
 
     def _build_ui(self):
         # Notebook
@@ -721,10 +325,40 @@ class BiodiversityApp:
         self.loss_significance = tk.StringVar(value="1.0")
         ttk.Entry(sig_frame, textvariable=self.loss_significance, width=10).pack(side="left", padx=(0, 10))
         ttk.Label(sig_frame, text="(1.0 = Low, 1.15 = High)").pack(side="left")
+
+        # DXF plans are converted in memory; the shapefile copy is optional
+        self.loss_dxf_export = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_frame, text="Save converted DXF plan as <name>_conv.shp",
+                        variable=self.loss_dxf_export).pack(anchor="w", pady=5)
+        # re-run only the footprints that changed since the last run of the same baseline and settings
+        self.loss_incremental = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_frame, text="Reuse the last run for unchanged footprints (incremental)",
+                        variable=self.loss_incremental).pack(anchor="w", pady=(0, 5))
+        # nested / overlapping outlines (buildings drawn inside site boundaries) would count their overlap twice
+        self.loss_union_plan = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_frame, text="Merge overlapping plan outlines before intersecting",
+                        variable=self.loss_union_plan).pack(anchor="w", pady=(0, 5))
+        # CAD plans carry sub-millimetre noise; on a grid, near-coincident edges no longer leave slivers
+        grid_frame = ttk.Frame(file_frame)
+        grid_frame.pack(fill="x", pady=(0, 5))
+        ttk.Label(grid_frame, text="Precision grid:").pack(side="left", padx=(0, 10))
+        self.loss_grid = tk.StringVar(value="Off")
+        ttk.Combobox(grid_frame, textvariable=self.loss_grid, values=list(LOSS_GRID_SIZES), state="readonly",
+                     width=8).pack(side="left")
         
         # Process button
         ttk.Button(file_frame, text="Calculate Biodiversity Loss", 
                   command=self._process_and_export_loss, style="Accent.TButton").pack(pady=10)
+
+        # Progress of queued / running assessments
+        progress_frame = ttk.Frame(file_frame)
+        progress_frame.pack(fill="x", pady=(0, 5))
+        self.loss_progress = ttk.Progressbar(progress_frame, maximum=1.0, length=320)
+        self.loss_progress.pack(side="left", padx=(0, 10))
+        self.loss_cancel_btn = ttk.Button(progress_frame, text="Cancel", command=self._cancel_loss, state="disabled")
+        self.loss_cancel_btn.pack(side="left", padx=(0, 10))
+        self.loss_status = ttk.Label(progress_frame, text="")
+        self.loss_status.pack(side="left")
         
         # Results section
         results_frame = create_card(main_frame)
@@ -756,176 +390,133 @@ class BiodiversityApp:
             messagebox.showerror("Invalid significance", "Strategic significance must be numeric.")
             return
 
-        try:
-            # convert if needed
-            shp1 = convert_if_needed(base, is_baseline=True)
-            shp2 = convert_if_needed(plan, is_baseline=False)
-            gdf1 = load_and_fix(shp1)
-            gdf2 = load_and_fix(shp2)
-
-            # USE EPSG:31370 consistently
-            target_crs = "EPSG:31370"
-            
-            # Reproject both files to the same CRS
-            if gdf1.crs is not None and gdf1.crs != target_crs:
-                gdf1 = gdf1.to_crs(target_crs)
-            elif gdf1.crs is None:
-                gdf1.set_crs(target_crs, inplace=True)
-                
-            if gdf2.crs is not None and gdf2.crs != target_crs:
-                gdf2 = gdf2.to_crs(target_crs)
-            elif gdf2.crs is None:
-                gdf2.set_crs(target_crs, inplace=True)
-
-            print(f"Final CRS - Baseline: {gdf1.crs}, Planned: {gdf2.crs}")
-            print(f"Final bounds - Baseline: {gdf1.total_bounds}")
-            print(f"Final bounds - Planned: {gdf2.total_bounds}")
-
-            # Check if files overlap
-            baseline_center_x = (gdf1.total_bounds[0] + gdf1.total_bounds[2]) / 2
-            baseline_center_y = (gdf1.total_bounds[1] + gdf1.total_bounds[3]) / 2
-            planned_center_x = (gdf2.total_bounds[0] + gdf2.total_bounds[2]) / 2
-            planned_center_y = (gdf2.total_bounds[1] + gdf2.total_bounds[3]) / 2
-            
-            distance_x = abs(baseline_center_x - planned_center_x)
-            distance_y = abs(baseline_center_y - planned_center_y)
-            
-            print(f"Center distance - X: {distance_x:.0f}m, Y: {distance_y:.0f}m")
-            
-            # If centers are more than 10km apart, they're probably wrong
-            if distance_x > 10000 or distance_y > 10000:
-                messagebox.showerror(
-                    "Spatial Mismatch", 
-                    f"The selected files are in different locations!\n\n"
-                    f"Baseline center: ({baseline_center_x:.0f}, {baseline_center_y:.0f})\n"
-                    f"Planned center: ({planned_center_x:.0f}, {planned_center_y:.0f})\n"
-                    f"Distance: {max(distance_x, distance_y):.0f}m apart\n\n"
-                    "Please select files that cover the same geographic area."
-                )
-                return
-
-            # keep polygons only
-            gdf1 = gdf1[gdf1.geometry.type.isin(["Polygon", "MultiPolygon"])]
-            gdf2 = gdf2[gdf2.geometry.type.isin(["Polygon", "MultiPolygon"])]
-
-            if gdf1.empty:
-                messagebox.showerror("Error", "Baseline contains no polygons after cleaning.")
-                return
-            if gdf2.empty:
-                messagebox.showerror("Error", "Planned development contains no polygons after cleaning.")
-                return
-            
-            gdf1["area_m2"] = gdf1.geometry.area
-            total_baseline_ha = gdf1["area_m2"].sum() / 10000.0
-            
-            # compute totals and intersections
-            gdf1['Condition score'] = np.nan
-            gdf1['Distinctiveness score'] = np.nan
-            gdf1['Biodiversity units'] = np.nan
-            gdf1['Significance score'] = sig_val
-
-            # Check required columns
-            required_columns = ['Baseline Condition', 'Baseline Distinctiveness', 'Baseline Broad Habitat Type']
-            missing_cols = [col for col in required_columns if col not in gdf1.columns]
-            if missing_cols:
-                messagebox.showerror("Missing Data", f"Required columns missing:\n{', '.join(missing_cols)}")
-                return
+        # the map preview is drawn on the worker too, so the window never waits on matplotlib;
+        # it is drawn in memory at the map canvas' current size (Tk is only asked here, on the main thread)
+        preview_size = self._map_preview_size()
+        preview = {}
+
+        def render(result, progress):
+            preview["image"] = render_loss_map_preview(result.baseline, result.intersection, *preview_size,
+                                                       summary=result.habitats)
+
+        # the options are built on the worker as well: loss_map imports loss_engine, geopandas and pandas
+        settings = (sig_val, self.loss_dxf_export.get(), self.loss_union_plan.get(), LOSS_GRID_SIZES[self.loss_grid.get()])
+
+        def options():
+            from loss_map import loss_options
+
+            return loss_options(*settings)
+
+        runner = self._run_incremental if self.loss_incremental.get() else None
+        job = self.loss_worker.submit(base, plan, options, label=os.path.basename(plan), after=render, runner=runner)
+        self._loss_jobs[job] = (sig_val, preview)
+        self.loss_cancel_btn.config(state="normal")
+        self._set_loss_status()
+        if not self._loss_polling:
+            self._loss_polling = True
+            self._poll_loss_jobs()
+
+    def _run_incremental(self, baseline_path, planned_path, options, progress=None):
+        """IncrementalLoss.run, called on the loss worker (which also makes the IncrementalLoss)"""
+        if self._incremental is None:
+            from loss_incremental import IncrementalLoss
+
+            self._incremental = IncrementalLoss()
+        return self._incremental.run(baseline_path, planned_path, options, progress=progress)
+
+    def _poll_loss_jobs(self):
+        for ev in self.loss_worker.poll():
+            self._on_loss_event(ev)
+        if self.loss_worker.pending() or not self.loss_worker.events.empty():
+            self.root.after(100, self._poll_loss_jobs)
+        else:
+            self._loss_polling = False
+            self.loss_cancel_btn.config(state="disabled")
+
+    def _set_loss_status(self, text=None):
+        """Status line: the running job's stage (kept until it finishes) plus the queue length"""
+        if text is not None:
+            self._loss_stage_text = text
+        text = self._loss_stage_text
+        queued = self.loss_worker.pending() - (1 if text else 0)
+        if queued > 0:
+            text = f"{text} ({queued} queued)" if text else f"{queued} queued"
+        self.loss_status.config(text=text)
+
+    def _cancel_loss(self):
+        """Stop the running assessment and drop the queued ones"""
+        self.loss_worker.cancel()
+        self.loss_status.config(text="Cancelling...")
+
+    def _on_loss_event(self, ev):
+        if ev.kind == "progress":
+            self.loss_progress["value"] = ev.fraction
+            self._set_loss_status(f"{ev.label}: {ev.stage}...")
+            return
+        if ev.kind == "started":
+            self.loss_progress["value"] = 0
+            self._set_loss_status(f"{ev.label}: starting...")
+            return
+        sig_val, preview = self._loss_jobs.pop(ev.job_id, (1.0, {}))
+        if ev.kind == "cancelled":
+            self.loss_progress["value"] = 0
+            self._loss_stage_text = ""
+            self.loss_status.config(text=f"{ev.label}: cancelled")
+        elif ev.kind == "error":
+            self.loss_progress["value"] = 0
+            self._loss_stage_text = ""
+            self.loss_status.config(text=f"{ev.label}: failed")
+            from loss_engine import LossError
+
+            if isinstance(ev.payload, LossError):
+                messagebox.showerror(ev.payload.title, str(ev.payload))
+            else:
+                messagebox.showerror("Processing Error", f"An unexpected error occurred:\n{str(ev.payload)}")
+        elif ev.kind == "done":
+            self.loss_progress["value"] = 1.0
+            self._loss_stage_text = ""
+            self.loss_status.config(text=f"{ev.label}: done")
+            self._show_loss_result(ev.payload, sig_val, preview.get("image"))
 
-            # Map using flexible mapping functions
-            def flexible_condition_map(val):
-                if pd.isna(val):
-                    return np.nan
-                val_str = str(val).strip().lower()
-                
-                if any(x in val_str for x in ['good', '3']):
-                    return 3.0
-                elif any(x in val_str for x in ['fairly good', '2.5']):
-                    return 2.5
-                elif any(x in val_str for x in ['moderate', '2']):
-                    return 2.0
-                elif any(x in val_str for x in ['fairly poor', '1.5']):
-                    return 1.5
-                elif any(x in val_str for x in ['poor', '1']):
-                    return 1.0
-                else:
-                    print(f"Could not map condition value: '{val}'")
-                    return np.nan
-            
-            def flexible_distinctiveness_map(val):
-                if pd.isna(val):
-                    return np.nan
-                val_str = str(val).strip().lower()
-                
-                if any(x in val_str for x in ['v.high', 'very high', '8']):
-                    return 8
-                elif any(x in val_str for x in ['high', '6']):
-                    return 6
-                elif any(x in val_str for x in ['medium', '4']):
-                    return 4
-                elif any(x in val_str for x in ['low', '2']):
-                    return 2
-                elif any(x in val_str for x in ['v.low', 'very low', '0']):
-                    return 0
-                else:
-                    print(f"Could not map distinctiveness value: '{val}'")
-                    return np.nan
-            
-            gdf1['Condition score'] = gdf1['Baseline Condition'].apply(flexible_condition_map)
-            gdf1['Distinctiveness score'] = gdf1['Baseline Distinctiveness'].apply(flexible_distinctiveness_map)
-            gdf1 = gdf1[gdf1['Baseline Broad Habitat Type'] != 'Urban']
-            
-            # Check if mapping worked
-            nan_condition = gdf1['Condition score'].isna().sum()
-            nan_distinctiveness = gdf1['Distinctiveness score'].isna().sum()
-            
-            if nan_condition > 0 or nan_distinctiveness > 0:
-                messagebox.showwarning("Mapping Issues", 
-                                     f"Could not map all values:\n"
-                                     f"- {nan_condition} condition values\n"
-                                     f"- {nan_distinctiveness} distinctiveness values\n"
-                                     f"Check console for details.")
-
-            # Overlay intersection
-            intersection = gpd.overlay(gdf1, gdf2, how='intersection', keep_geom_type=True)
-            intersection = intersection[intersection.geometry.type.isin(['Polygon', 'MultiPolygon'])]
-
-            if intersection.empty:
-                messagebox.showerror("Error", "No overlapping areas found between the shapefiles")
-                return
+    def _show_loss_result(self, result, sig_val, preview_image=None):
+        from loss_engine import format_habitat_summary
 
-            # Calculate biodiversity loss
-            intersection['Loss area (ha)'] = round(intersection.geometry.area / 10000, 2)
-            intersection['Biodiversity units'] = round(
-                intersection['Loss area (ha)'] *
-                intersection['Condition score'] *
-                intersection['Significance score'] *
-                intersection['Distinctiveness score'], 2
-            )
+        try:
+            for w in result.warnings:
+                messagebox.showwarning("Mapping Issues", w + "\nCheck console for details.")
+            gdf1 = result.baseline
+            intersection = result.intersection
 
             # SUMMARIZE RESULTS
-            total_loss_ha = intersection["Loss area (ha)"].sum()
-            total_biodiv_units = intersection["Biodiversity units"].sum()
             txt = []
-            txt.append(f"Baseline total area (ha): {total_baseline_ha:,.3f}")
-            txt.append(f"Total overlap / loss area (ha): {total_loss_ha:,.3f}")
-            txt.append(f"Total biodiversity units (loss): {total_biodiv_units:,.3f}")
-            txt.append("\nTop 10 loss features (first columns):")
-            preview = intersection.head(10)[["Loss area (ha)", "Biodiversity units"]].copy()
-            txt.append(preview.to_string(index=False))
+            base_label = "Baseline area within plan extent" if result.baseline_clipped else "Baseline total area"
+            txt.append(f"{base_label} (ha): {result.total_baseline_ha:,.3f}")
+            txt.append(f"Total overlap / loss area (ha): {result.total_loss_ha:,.3f}")
+            txt.append(f"Total biodiversity units (loss): {result.total_units:,.3f}")
+            if result.plan_union is not None:
+                txt.append(f"Plan outlines merged: {result.plan_union.summary()}")
+            if result.slivers_removed is not None:
+                txt.append(f"Sliver fragments removed by the precision grid: {result.slivers_removed}")
+            txt.append("\nLoss by habitat type:")
+            txt.append(format_habitat_summary(result.habitats))
             self.loss_results_text.delete("1.0", "end")
             self.loss_results_text.insert("end", "\n".join(txt))
 
             # STORE DATA FOR MAP DISPLAY
             self.current_baseline_gdf = gdf1.copy()
             self.current_intersection_gdf = intersection.copy()
+            self.current_habitats = result.habitats
+            self._map_generation += 1
             
-            # Auto-switch to map tab and refresh
+            # Auto-switch to map tab and show the preview the worker drew
             self.notebook.select(3)  # Switch to map tab
-            self._refresh_map_display()
+            self._refresh_map_display(rendered=preview_image)
+            self._map_viewer_stale = True
+            self._sync_map_viewer()
 
             # Ask to save shapefile and CSV
             if messagebox.askyesno("Save results", "Do you want to save the intersection shapefile and CSV summary?"):
-                save_with_visualization(gdf1, intersection, sig_val)
+                save_with_visualization(gdf1, intersection, sig_val, result.habitats)
 
         except Exception as e:
             messagebox.showerror("Processing Error", f"An unexpected error occurred:\n{str(e)}")
@@ -956,6 +547,13 @@ class BiodiversityApp:
         ttk.Button(btn_frame, text="Clear Map", 
                   command=self._clear_map_display).pack(side="left")
         
+        # Summary map (static picture with table and legend) or the pan/zoom tile viewer
+        self.map_view_mode = tk.StringVar(value="summary")
+        ttk.Radiobutton(btn_frame, text="Summary map", variable=self.map_view_mode, value="summary",
+                        command=self._on_map_view_mode).pack(side="left", padx=(20, 5))
+        ttk.Radiobutton(btn_frame, text="Pan / zoom", variable=self.map_view_mode, value="explore",
+                        command=self._on_map_view_mode).pack(side="left")
+        
         # Map display area
         map_frame = create_card(main_frame)
         ttk.Label(map_frame, text="Biodiversity Loss Map", font=("Arial", 11, "bold")).pack(anchor="w", pady=(0, 10))
@@ -964,16 +562,56 @@ class BiodiversityApp:
         self.map_canvas = tk.Canvas(map_frame, bg="white", width=800, height=500, 
                                    relief="solid", bd=1)
         self.map_canvas.pack(fill="both", expand=True, pady=10)
+        # the pan/zoom viewer is built the first time it is picked (it loads the map modules)
+        self.map_frame = map_frame
+        self.map_viewer = None
+        self._map_viewer_stale = True
         
         # Map info panel
         info_frame = ttk.Frame(map_frame)
         info_frame.pack(fill="x", pady=5)
+        self.map_info_frame = info_frame
         
         self.map_info_label = ttk.Label(info_frame, text="", font=("Arial", 9))
         self.map_info_label.pack(anchor="w")
 
-    def _refresh_map_display(self):
-        """Refresh the map display with current data using preview mode"""
+    def _map_preview_size(self):
+        """Pixel size the preview is drawn at: the map canvas less its 10px margins"""
+        width = self.map_canvas.winfo_width()
+        height = self.map_canvas.winfo_height()
+        if width <= 1 or height <= 1:  # not laid out yet: the size it asked for
+            width, height = self.map_canvas.winfo_reqwidth(), self.map_canvas.winfo_reqheight()
+        return max(width - 20, 100), max(height - 20, 100)
+
+    def _on_map_view_mode(self):
+        """Swap the summary picture and the pan/zoom viewer"""
+        if self.map_view_mode.get() == "explore":
+            if self.current_baseline_gdf is None or self.current_intersection_gdf is None:
+                self.map_view_mode.set("summary")
+                self.map_status_label.config(text="No map data available. Run Loss Calculator first.", foreground="red")
+                return
+            if self.map_viewer is None:
+                from map_viewer import MapViewer
+
+                self.map_viewer = MapViewer(self.map_frame, width=800, height=500)
+            self.map_canvas.pack_forget()
+            self.map_viewer.canvas.pack(fill="both", expand=True, pady=10, before=self.map_info_frame)
+            self._sync_map_viewer()
+        else:
+            if self.map_viewer is not None:
+                self.map_viewer.canvas.pack_forget()
+            self.map_canvas.pack(fill="both", expand=True, pady=10, before=self.map_info_frame)
+
+    def _sync_map_viewer(self):
+        """Give the pan/zoom viewer the current result if it is showing and has an older one"""
+        if self.map_viewer is None or self.map_view_mode.get() != "explore" or not self._map_viewer_stale:
+            return
+        self._map_viewer_stale = False
+        self.root.update_idletasks()  # let the canvas take its size before fitting the map to it
+        self.map_viewer.show(self.current_baseline_gdf, self.current_intersection_gdf)
+
+    def _refresh_map_display(self, rendered=None):
+        """Refresh the map display with current data using preview mode (rendered: MapImage already drawn)"""
         if self.current_baseline_gdf is None or self.current_intersection_gdf is None:
             self.map_status_label.config(text="No map data available. Run Loss Calculator first.", foreground="red")
             self.map_canvas.delete("all")
@@ -982,29 +620,43 @@ class BiodiversityApp:
             self.map_info_label.config(text="")
             return
         
+        size = self._map_preview_size()
+        if rendered is None or (rendered.width, rendered.height) != size:
+            # no preview yet, or the canvas was resized since it was drawn: draw it off the Tk thread
+            self.map_status_label.config(text="Drawing map...", foreground="blue")
+            self.map_preview_worker.request(self._map_generation, render_loss_map_preview,
+                                            self.current_baseline_gdf, self.current_intersection_gdf, *size,
+                                            summary=self.current_habitats)
+            if not self._map_preview_polling:
+                self._map_preview_polling = True
+                self.root.after(100, self._poll_map_preview)
+            return
+        self._show_map_preview(rendered)
+
+    def _poll_map_preview(self):
+        """Show the newest preview the preview worker finished, unless a newer result came in since"""
+        finished = self.map_preview_worker.poll()
+        if self.map_preview_worker.busy():
+            self.root.after(100, self._poll_map_preview)
+        else:
+            self._map_preview_polling = False
+        if not finished:
+            return
+        generation, rendered = finished[-1]
+        if generation != self._map_generation:
+            return
+        if isinstance(rendered, Exception):
+            print(f"Error refreshing map: {rendered}")
+            self.map_status_label.config(text=f"Error displaying map: {str(rendered)}", foreground="red")
+        else:
+            self._show_map_preview(rendered)
+
+    def _show_map_preview(self, rendered):
+        """Put a MapImage (or None: drawing failed) on the map canvas"""
         try:
-            # Create a temporary PNG file
-            temp_dir = tempfile.gettempdir()
-            temp_png = os.path.join(temp_dir, "biodiversity_map_preview.png")
-            
-            # USE THE MAIN FUNCTION WITH PREVIEW MODE
-            success = create_loss_map_as_png(
-                self.current_baseline_gdf, 
-                self.current_intersection_gdf, 
-                temp_png, 
-                preview_mode=True  # Fast preview mode
-            )
-            
-            if success and os.path.exists(temp_png):
-                # Load and display the image
-                img = Image.open(temp_png)
-                # Resize to fit canvas while maintaining aspect ratio
-                canvas_width = self.map_canvas.winfo_width() - 20
-                canvas_height = self.map_canvas.winfo_height() - 20
-                
-                if canvas_width > 1 and canvas_height > 1:
-                    img.thumbnail((canvas_width, canvas_height), Image.Resampling.LANCZOS)
-                
+            if rendered is not None:
+                # the pixels are already at canvas size: hand them to Tk as they are
+                img = Image.frombuffer("RGBA", (rendered.width, rendered.height), rendered.rgba, "raw", "RGBA", 0, 1)
                 self.map_photo = ImageTk.PhotoImage(img)
                 
                 # Clear canvas and display image
@@ -1045,8 +697,9 @@ class BiodiversityApp:
                 success = create_loss_map_as_png(
                     self.current_baseline_gdf,
                     self.current_intersection_gdf, 
-                    png_path
+                    png_path,
                     # preview_mode=False by default = high quality
+                    summary=self.current_habitats
                 )
                 
                 if success:
@@ -1060,6 +713,10 @@ class BiodiversityApp:
 
     def _clear_map_display(self):
         """Clear the map display"""
+        if self.map_viewer is not None:
+            self.map_viewer.clear()
+            self._map_viewer_stale = True
+        self._map_generation += 1  # a preview still being drawn is not shown
         self.map_canvas.delete("all")
         self.map_canvas.create_text(400, 250, text="Map display cleared\nRun Loss Calculator to generate new map", 
                                    fill="gray", font=("Arial", 14), justify="center")
@@ -1101,9 +758,8 @@ class BiodiversityApp:
             r += 1
             return lbl, expl
 
-        # Broad habitat
-        broad_vals = sorted(self.habitats_df["Broad Habitat Type"].unique().tolist())
-        cb_broad = ttk.Combobox(frm, textvariable=self.var_broad, values=broad_vals, state="readonly", width=40)
+        # Broad habitat (values filled in by _ensure_gain_data)
+        cb_broad = self.cb_broad = ttk.Combobox(frm, textvariable=self.var_broad, values=[], state="readonly", width=40)
         add_row("Broad Habitat Type:", "Select the general habitat classification.", cb_broad)
 
         # Specific habitat (will be populated on broad change)
@@ -1111,8 +767,7 @@ class BiodiversityApp:
         add_row("Specific Habitat:", "Select the detailed habitat type (filtered by broad type).", cb_specific)
 
         # Target year
-        year_vals = [str(x) for x in self.years_df["Years"].tolist()]
-        cb_year = ttk.Combobox(frm, textvariable=self.var_year, values=year_vals, state="readonly", width=20)
+        cb_year = self.cb_year = ttk.Combobox(frm, textvariable=self.var_year, values=[], state="readonly", width=20)
         add_row("Time to target (years):", "How long until habitat reaches its target ecological value.", cb_year)
 
         # Baseline condition
@@ -1156,6 +811,7 @@ class BiodiversityApp:
         btn_frame.pack(fill="x", pady=10)
         ttk.Button(btn_frame, text="Calculate", command=self._calculate_gain).pack(side="left", padx=8)
         ttk.Button(btn_frame, text="Save selection (CSV & add to Saved Results)", command=self._save_gain_selection).pack(side="left", padx=8)
+        ttk.Button(btn_frame, text="Batch calculate from file...", command=self._batch_gain).pack(side="left", padx=8)
         self.gain_result = ttk.Label(card, text="Biodiversity Units: -", font=("Segoe UI", 12, "bold"))
         self.gain_result.pack(anchor="w", pady=(6,0), padx=6)
 
@@ -1178,9 +834,8 @@ class BiodiversityApp:
 
     def _on_specific_change(self):
         s = self.var_specific.get()
-        row = self.habitats_df[self.habitats_df["Specific Habitat"] == s]
-        if not row.empty:
-            score = row.iloc[0].get("Distinctiveness Score", 0.0)
+        if s in self.gain_tables.distinctiveness:
+            score = self.gain_tables.distinct_for(s)
             self.lbl_distinct.config(text=f"Distinctiveness: {score}")
         else:
             self.lbl_distinct.config(text="Distinctiveness: -")
@@ -1188,9 +843,8 @@ class BiodiversityApp:
 
     def _on_year_change(self):
         y = self.var_year.get()
-        row = self.years_df[self.years_df["Years"].astype(str) == str(y)]
-        if not row.empty:
-            mult = row.iloc[0]["Multiplier"]
+        if y and year_key(y) in self.gain_tables.year_multiplier:
+            mult = self.gain_tables.year_mult_for(y)
             self.lbl_yearmult.config(text=f"Year multiplier: {mult}")
         else:
             self.lbl_yearmult.config(text="Year multiplier: -")
@@ -1238,21 +892,15 @@ class BiodiversityApp:
             return
 
         # get numeric values
-        distinct = 0.0
-        row = self.habitats_df[self.habitats_df["Specific Habitat"] == self.var_specific.get()]
-        if not row.empty:
-            distinct = float(row.iloc[0].get("Distinctiveness Score", 0.0))
-        year_mult = 1.0
-        rowy = self.years_df[self.years_df["Years"].astype(str) == str(self.var_year.get())]
-        if not rowy.empty:
-            year_mult = float(rowy.iloc[0]["Multiplier"])
+        distinct = self.gain_tables.distinct_for(self.var_specific.get())
+        year_mult = self.gain_tables.year_mult_for(self.var_year.get())
         cond = float(CONDITION_MAPPING.get(self.var_condition.get(), 0.0))
         diff = float(DIFFICULTY_MAPPING.get(self.var_difficulty.get(), 0.0))
         spat = float(SPATIAL_MAPPING.get(self.var_spatial.get(), 0.0))
         strat = float(STRATEGIC_MAPPING.get(self.var_strategic.get(), 0.0))
         area = float(self.var_area.get())
 
-        units = distinct * cond * strat * area * spat * diff * year_mult
+        units = gain_units(distinct, cond, strat, area, spat, diff, year_mult)
         self.gain_result.config(text=f"Biodiversity Units: {units:.3f}")
 
     def _save_gain_selection(self):
@@ -1298,6 +946,33 @@ class BiodiversityApp:
         self.saved_rows.append(row)
         self._refresh_saved_table()
 
+    def _batch_gain(self):
+        """Score a CSV / GeoPackage / shapefile of parcels in one go and save the results."""
+        src = filedialog.askopenfilename(title="Parcels to score",
+                                         filetypes=[("Parcels", "*.csv *.gpkg *.shp"), ("All files", "*.*")])
+        if not src:
+            return
+        try:
+            result = calculate_gain_batch(read_gain_parcels(src), self._ensure_gain_data())
+        except Exception as e:
+            messagebox.showerror("Batch error", f"Could not read parcels: {e}")
+            return
+        default_name = f"gain_batch_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+        out = filedialog.asksaveasfilename(initialfile=default_name, defaultextension=".csv",
+                                           filetypes=[("CSV", "*.csv"), ("GeoPackage", "*.gpkg")])
+        if not out:
+            return
+        try:
+            write_gain_results(result, out)
+        except Exception as e:
+            messagebox.showerror("Save error", f"Failed to save results: {e}")
+            return
+        bad = int(result["Biodiversity Units"].isna().sum())
+        msg = f"{len(result)} parcels, {result['Biodiversity Units'].sum():.3f} units.\nSaved to: {out}"
+        if bad:
+            msg += f"\n{bad} parcel(s) skipped - see the 'Gain issues' column."
+        messagebox.showinfo("Batch complete", msg)
+
     # ---------- Saved Results tab ----------
     def _build_saved_tab(self):
         card = create_card(self.tab_saved)
@@ -19,12 +19,13 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 
-import pandas as pd
-import geopandas as gpd
-import numpy as np
-from shapely.validation import make_valid
-from shapely.geometry import Polygon, mapping
-import ezdxf
+# loss_engine / loss_batch (geopandas, shapely) are imported when a loss run starts and pandas once
+# the window is up (_ensure_gain_data), so the window paints without them; see benchmarks/bench_startup.py
+from loss_worker import LossWorker
+from baseline_cache import default_cache_dir
+from gain_engine import (CONDITION_MAPPING, DIFFICULTY_MAPPING, SPATIAL_MAPPING, STRATEGIC_MAPPING,
+                         GainTables, calculate_gain_batch, gain_units, load_habitats, load_years,
+                         read_gain_parcels, write_gain_results, year_key)
 
 # -------------------- Configuration & Paths --------------------
 def get_base_dir():
@@ -42,13 +43,6 @@ YEARS_CSV = DATA_DIR / "target_year.csv"
 # Use the more professional tint you preferred
 MAIN_BG = "#f0f0f0"   # change to '#f5f5f5' if you prefer neutral gray
 
-# Mappings
-CONDITION_MAPPING = {"Good": 3.0, "Fairly Good": 2.5, "Moderate": 2.0, "Fairly poor": 1.5, "Poor": 1.0}
-DIFFICULTY_MAPPING = {"Very high": 0.1, "High": 0.33, "Medium": 0.67, "Low": 1.0}
-SPATIAL_MAPPING = {"On-site": 1.0, "Within same city": 0.75, "Somewhere further": 0.5}
-STRATEGIC_MAPPING = {"High": 1.15, "Low": 1.0}
-DISTINCTIVENESS_MAP = {"V.High": 8, "High": 6, "Medium": 4, "Low": 2, "V.Low": 0}
-
 # -------------------- Logo Manager --------------------
 class LogoManager:
     def __init__(self, logos_dir: Path):
@@ -73,113 +67,6 @@ class LogoManager:
         self.cache[name] = None
         return None
 
-# -------------------- Geospatial helpers (robust) --------------------
-def force_polygon(geom):
-    if geom is None or geom.is_empty:
-        return None
-    try:
-        if geom.type in ["Polygon", "MultiPolygon"]:
-            return geom
-        if geom.type == "LineString":
-            coords = list(geom.coords)
-            if len(coords) >= 3:
-                if coords[0] != coords[-1]:
-                    coords.append(coords[0])
-                if len(coords) >= 4:
-                    poly = Polygon(coords)
-                    if poly.is_valid:
-                        return poly
-        if geom.type == "MultiLineString":
-            polys = []
-            for line in geom.geoms:
-                if line.type == "LineString":
-                    coords = list(line.coords)
-                    if len(coords) >= 3:
-                        if coords[0] != coords[-1]:
-                            coords.append(coords[0])
-                        if len(coords) >= 4:
-                            poly = Polygon(coords)
-                            if poly.is_valid:
-                                polys.append(poly)
-            if polys:
-                from shapely.geometry import MultiPolygon
-                mp = MultiPolygon(polys)
-                if mp.is_valid:
-                    return mp
-    except Exception as e:
-        print(f"Warning force_polygon: {e}")
-    return geom
-
-def load_and_fix(path):
-    """Load with geopandas and attempt to clean geometries robustly"""
-    gdf = gpd.read_file(path)
-    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
-    if gdf.empty:
-        raise RuntimeError("No valid geometries found")
-    try:
-        gdf["geometry"] = gdf.geometry.buffer(0)
-    except Exception:
-        pass
-    try:
-        gdf["geometry"] = gdf.geometry.apply(make_valid)
-    except Exception:
-        pass
-    try:
-        gdf["geometry"] = gdf.geometry.apply(force_polygon)
-    except Exception:
-        pass
-    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
-    if gdf.empty:
-        raise RuntimeError("All geometries invalid after cleaning")
-    return gdf
-
-def convert_dxf_layers(input_path, output_shp):
-    """Convert DXF to Shapefile using ezdxf (polylines -> polygons)."""
-    try:
-        doc = ezdxf.readfile(input_path)
-        all_geometries = []
-        for entity in doc.modelspace():
-            if not hasattr(entity, "dxftype"):
-                continue
-            if entity.dxftype() in ["LWPOLYLINE", "POLYLINE"]:
-                points = []
-                if entity.dxftype() == "LWPOLYLINE":
-                    pts = list(entity.get_points())
-                    points = [(p[0], p[1]) for p in pts]
-                else:
-                    for v in entity.vertices:
-                        points.append((v.dxf.location.x, v.dxf.location.y))
-                if len(points) >= 3:
-                    if points[0] != points[-1]:
-                        points.append(points[0])
-                    poly = Polygon(points)
-                    if poly.is_valid:
-                        all_geometries.append(poly)
-        if not all_geometries:
-            raise RuntimeError("No valid polyline geometries found in DXF")
-        # create geodataframe and save
-        gdf = gpd.GeoDataFrame(geometry=all_geometries)
-        # leave CRS unset - user must ensure consistent CRS for accurate areas
-        gdf.to_file(output_shp)
-        return output_shp
-    except Exception as e:
-        print(f"DXF conversion failed: {e}")
-        raise RuntimeError(f"DXF conversion failed: {e}")
-
-def convert_if_needed(input_path, is_baseline=False):
-    ext = os.path.splitext(input_path)[1].lower()
-    if is_baseline:
-        if ext in (".shp", ".gpkg"):
-            return input_path
-        raise RuntimeError("Baseline must be .shp or .gpkg")
-    else:
-        if ext == ".dxf":
-            out = os.path.splitext(input_path)[0] + "_conv.shp"
-            return convert_dxf_layers(input_path, out)
-        if ext == ".shp":
-            return input_path
-        raise RuntimeError("Planned development must be .shp or .dxf")
-
 # -------------------- App Class --------------------
 class BiodiversityApp:
     def __init__(self, root):
@@ -202,50 +89,40 @@ class BiodiversityApp:
 
         self.logo_manager = LogoManager(LOGOS_DIR)
 
-        # load CSVs for gain calculator
-        self.habitats_df = self._load_habitats()
-        self.years_df = self._load_years()
+        # CSVs for gain calculator, loaded by _ensure_gain_data once the window is up
+        self.habitats_df = None
+        self.years_df = None
+        self.gain_tables = None
 
         # saved results list
         self.saved_rows = []
 
+        # loss runs go to a background thread; _poll_loss_jobs drains its events
+        self.loss_worker = LossWorker()
+        self._loss_polling = False
+        self._loss_stage_text = ""
+        # unit raster of the last baseline for quick estimates (loss_estimate); made on first use
+        self._estimator = None
+
         # build UI
         self._build_ui()
+        self.root.after_idle(self._ensure_gain_data)
+
+    def _ensure_gain_data(self):
+        """Gain lookup tables (this is what pulls in pandas); fills the habitat and year lists on first call"""
+        if self.gain_tables is None:
+            self.habitats_df = self._load_habitats()
+            self.years_df = self._load_years()
+            self.gain_tables = GainTables(self.habitats_df, self.years_df)
+            self.cb_broad["values"] = sorted(self.habitats_df["Broad Habitat Type"].unique().tolist())
+            self.cb_year["values"] = [str(x) for x in self.years_df["Years"].tolist()]
+        return self.gain_tables
 
     def _load_habitats(self):
-        if HABITATS_CSV.exists():
-            try:
-                df = pd.read_csv(HABITATS_CSV, dtype=str).fillna("")
-                # Validate expected headers
-                if "Specific Habitat" not in df.columns or "Broad Habitat Type" not in df.columns:
-                    print("habitats.csv missing expected headers, using fallback sample")
-                    raise Exception("missing headers")
-                if "Distinctiveness Category" not in df.columns:
-                    df["Distinctiveness Category"] = ""
-                df["Distinctiveness Score"] = df["Distinctiveness Category"].map(DISTINCTIVENESS_MAP).fillna(0).astype(float)
-                return df
-            except Exception as e:
-                print("Reading habitats failed:", e)
-        # fallback
-        sample = pd.DataFrame([
-            {"Broad Habitat Type": "Grassland", "Specific Habitat": "Improved grassland", "Distinctiveness Category": "Medium"},
-            {"Broad Habitat Type": "Woodland", "Specific Habitat": "Broadleaved woodland", "Distinctiveness Category": "High"},
-        ])
-        sample["Distinctiveness Score"] = sample["Distinctiveness Category"].map(DISTINCTIVENESS_MAP).fillna(0).astype(float)
-        return sample
+        return load_habitats(HABITATS_CSV)
 
     def _load_years(self):
-        if YEARS_CSV.exists():
-            try:
-                df = pd.read_csv(YEARS_CSV, dtype=str).fillna("")
-                if "Multiplier" in df.columns:
-                    df["Multiplier"] = pd.to_numeric(df["Multiplier"], errors="coerce").fillna(1.0)
-                else:
-                    df["Multiplier"] = 1.0
-                return df
-            except Exception as e:
-                print("Reading years failed:", e)
-        return pd.DataFrame([{"Years": "5", "Multiplier": 1.05}, {"Years": "10", "Multiplier": 1.0}])
+        return load_years(YEARS_CSV)
 
     def _build_ui(self):
         # Notebook and tabs
@@ -325,8 +202,27 @@ class BiodiversityApp:
         ttk.Entry(sig_frame, textvariable=self.loss_significance, width=12).pack(side="left", padx=(0,8))
         ttk.Label(sig_frame, text="(1.0 = Low, 1.15 = High)").pack(side="left")
 
+        # DXF plans are converted in memory; the shapefile copy is optional
+        self.loss_dxf_export = tk.BooleanVar(value=False)
+        ttk.Checkbutton(card, text="Save converted DXF plan as <name>_conv.shp", variable=self.loss_dxf_export).pack(anchor="w", pady=4)
+        # nested / overlapping outlines (buildings drawn inside site boundaries) would count their overlap twice
+        self.loss_union_plan = tk.BooleanVar(value=False)
+        ttk.Checkbutton(card, text="Merge overlapping plan outlines before intersecting", variable=self.loss_union_plan).pack(anchor="w", pady=4)
+
         # Process button
-        ttk.Button(card, text="Calculate Biodiversity Loss", command=self._process_and_export_loss).pack(pady=10)
+        ttk.Button(card, text="Calculate Biodiversity Loss", command=self._process_and_export_loss).pack(pady=(10,4))
+        ttk.Button(card, text="Compare scenarios in folder...", command=self._compare_scenarios).pack(pady=(0,4))
+        ttk.Button(card, text="Quick estimate", command=self._quick_estimate).pack(pady=(0,10))
+
+        # Progress of queued / running assessments
+        progress_frame = ttk.Frame(card)
+        progress_frame.pack(fill="x", pady=(0,4))
+        self.loss_progress = ttk.Progressbar(progress_frame, maximum=1.0, length=320)
+        self.loss_progress.pack(side="left", padx=(0,8))
+        self.loss_cancel_btn = ttk.Button(progress_frame, text="Cancel", command=self._cancel_loss, state="disabled")
+        self.loss_cancel_btn.pack(side="left", padx=(0,8))
+        self.loss_status = ttk.Label(progress_frame, text="")
+        self.loss_status.pack(side="left")
 
         # Results card
         results_card = ttk.Frame(main, style="Card.TFrame", padding=12)
@@ -343,143 +239,211 @@ class BiodiversityApp:
         if fn:
             var.set(fn)
 
+    def _loss_options(self):
+        """LossOptions from the form, or None (after telling the user) when significance isn't a number"""
+        from loss_engine import LossOptions
+
+        sig = self.loss_significance.get().strip()
+        try:
+            sig_val = float(sig) if sig else 1.0
+        except Exception:
+            messagebox.showerror("Invalid significance", "Strategic significance must be numeric.")
+            return None
+        return LossOptions(significance=sig_val, cache_dir=str(default_cache_dir()),
+                           dxf_export=self.loss_dxf_export.get(), union_plan=self.loss_union_plan.get())
+
     def _process_and_export_loss(self):
         base = self.loss_baseline_path.get().strip()
         plan = self.loss_planned_path.get().strip()
-        sig = self.loss_significance.get().strip()
         if not base or not plan:
             messagebox.showerror("Missing files", "Please select both baseline and planned development files.")
             return
-        try:
-            sig_val = float(sig) if sig else 1.0
-        except Exception:
-            messagebox.showerror("Invalid significance", "Strategic significance must be numeric.")
+        options = self._loss_options()
+        if options is None:
             return
+        self.loss_worker.submit(base, plan, options, label=os.path.basename(plan))
+        self._start_loss_polling()
 
-        try:
-            shp1 = convert_if_needed(base, is_baseline=True)
-            shp2 = convert_if_needed(plan, is_baseline=False)
-            gdf1 = load_and_fix(shp1)
-            gdf2 = load_and_fix(shp2)
-
-            # CRS handling (clean, explicit)
-            if gdf1.crs is None:
-                # Warn user but continue
-                messagebox.showwarning(
-                    "CRS missing",
-                    "Baseline layer has no CRS. Proceeding, but areas may be wrong; ensure your layers use a projected CRS."
-                )
-
-            if gdf2.crs is None and gdf1.crs is not None:
-                # Assign baseline CRS to second layer
-                gdf2 = gdf2.set_crs(gdf1.crs, allow_override=True)
-
-            if gdf1.crs is not None and gdf1.crs != gdf2.crs:
-                # Reproject planned layer to baseline CRS
-                gdf2 = gdf2.to_crs(gdf1.crs)
-
-            # Keep polygon geometries only
-            gdf1 = gdf1[gdf1.geometry.type.isin(["Polygon", "MultiPolygon"])]
-            gdf2 = gdf2[gdf2.geometry.type.isin(["Polygon", "MultiPolygon"])]
-
-            if gdf1.empty:
-                messagebox.showerror("Error", "Baseline contains no polygons after cleaning.")
-                return
-            if gdf2.empty:
-                messagebox.showerror("Error", "Planned development contains no polygons after cleaning.")
-                return
+    def _compare_scenarios(self):
+        """Run every .shp / .dxf layout in a folder against the selected baseline in one job."""
+        base = self.loss_baseline_path.get().strip()
+        if not base:
+            messagebox.showerror("Missing files", "Please select a baseline file.")
+            return
+        folder = filedialog.askdirectory(title="Folder of planned development layouts (.shp / .dxf)")
+        if not folder:
+            return
+        options = self._loss_options()
+        if options is None:
+            return
+        from loss_batch import run_scenarios
 
-            # Calculate areas
-            gdf1["area_m2"] = gdf1.geometry.area
-            total_baseline_ha = gdf1["area_m2"].sum() / 10000.0
-
-            # Mapping functions (flexible)
-            def flexible_condition_map(val):
-                if pd.isna(val): return np.nan
-                s = str(val).strip().lower()
-                if "good" == s or "good" in s and "fairly" not in s: return 3.0
-                if "fairly good" in s or "2.5" in s: return 2.5
-                if "moderate" in s: return 2.0
-                if "fairly poor" in s or "fairly" in s and "poor" in s: return 1.5
-                if "poor" in s and "fairly" not in s: return 1.0
-                return np.nan
-
-            def flexible_distinct_map(val):
-                if pd.isna(val): return np.nan
-                s = str(val).strip().lower()
-                if "v.high" in s or "very high" in s or "8" in s: return 8
-                if "high" in s and "very" not in s: return 6
-                if "medium" in s: return 4
-                if "low" in s and "very" not in s: return 2
-                if "v.low" in s or "very low" in s: return 0
-                return np.nan
-
-            # Create required columns and map
-            gdf1["Condition score"] = gdf1.get("Baseline Condition", pd.Series([np.nan]*len(gdf1))).apply(flexible_condition_map)
-            gdf1["Distinctiveness score"] = gdf1.get("Baseline Distinctiveness", pd.Series([np.nan]*len(gdf1))).apply(flexible_distinct_map)
-            gdf1["Significance score"] = sig_val
-
-            # Filter out Urban if present
-            if "Baseline Broad Habitat Type" in gdf1.columns:
-                gdf1 = gdf1[gdf1["Baseline Broad Habitat Type"].astype(str).str.lower() != "urban"]
-
-            # Check mapping success
-            nan_cond = int(gdf1["Condition score"].isna().sum())
-            nan_dist = int(gdf1["Distinctiveness score"].isna().sum())
-            if nan_cond > 0 or nan_dist > 0:
-                messagebox.showwarning("Mapping issues",
-                    f"Some values couldn't be mapped:\nCondition unmapped: {nan_cond}\nDistinctiveness unmapped: {nan_dist}\nCheck console for details.")
-
-            # intersection
-            intersection = gpd.overlay(gdf1, gdf2, how="intersection", keep_geom_type=True)
-            intersection = intersection[intersection.geometry.type.isin(["Polygon", "MultiPolygon"])]
-            if intersection.empty:
-                messagebox.showerror("No overlap", "No overlap between baseline and planned development after cleaning.")
-                return
+        self.loss_worker.submit(base, folder, options, label=f"Scenarios in {os.path.basename(folder)}",
+                                runner=run_scenarios)
+        self._start_loss_polling()
 
-            intersection["Loss area (ha)"] = (intersection.geometry.area / 10000.0).round(4)
-            intersection["Biodiversity units"] = (
-                intersection["Loss area (ha)"] *
-                intersection.get("Condition score", 0).fillna(0) *
-                intersection.get("Significance score", sig_val).fillna(sig_val) *
-                intersection.get("Distinctiveness score", 0).fillna(0)
-            ).round(4)
+    def _quick_estimate(self):
+        """Approximate loss with an error bound from a unit raster of the baseline, for sketching layouts."""
+        base = self.loss_baseline_path.get().strip()
+        plan = self.loss_planned_path.get().strip()
+        if not base or not plan:
+            messagebox.showerror("Missing files", "Please select both baseline and planned development files.")
+            return
+        options = self._loss_options()
+        if options is None:
+            return
+        if self._estimator is None:
+            from loss_estimate import LossEstimator
+
+            self._estimator = LossEstimator()
+        self.loss_worker.submit(base, plan, options, label=f"Estimate for {os.path.basename(plan)}",
+                                runner=self._estimator.run)
+        self._start_loss_polling()
+
+    def _start_loss_polling(self):
+        self.loss_cancel_btn.config(state="normal")
+        self._set_loss_status()
+        if not self._loss_polling:
+            self._loss_polling = True
+            self._poll_loss_jobs()
+
+    def _poll_loss_jobs(self):
+        for ev in self.loss_worker.poll():
+            self._on_loss_event(ev)
+        if self.loss_worker.pending() or not self.loss_worker.events.empty():
+            self.root.after(100, self._poll_loss_jobs)
+        else:
+            self._loss_polling = False
+            self.loss_cancel_btn.config(state="disabled")
+
+    def _set_loss_status(self, text=None):
+        """Status line: the running job's stage (kept until it finishes) plus the queue length"""
+        if text is not None:
+            self._loss_stage_text = text
+        text = self._loss_stage_text
+        queued = self.loss_worker.pending() - (1 if text else 0)
+        if queued > 0:
+            text = f"{text} ({queued} queued)" if text else f"{queued} queued"
+        self.loss_status.config(text=text)
+
+    def _cancel_loss(self):
+        self.loss_worker.cancel()
+        self.loss_status.config(text="Cancelling...")
+
+    def _on_loss_event(self, ev):
+        if ev.kind == "progress":
+            self.loss_progress["value"] = ev.fraction
+            self._set_loss_status(f"{ev.label}: {ev.stage}...")
+        elif ev.kind == "started":
+            self.loss_progress["value"] = 0
+            self._set_loss_status(f"{ev.label}: starting...")
+        elif ev.kind == "cancelled":
+            self.loss_progress["value"] = 0
+            self._loss_stage_text = ""
+            self.loss_status.config(text=f"{ev.label}: cancelled")
+        elif ev.kind == "error":
+            self.loss_progress["value"] = 0
+            self._loss_stage_text = ""
+            self.loss_status.config(text=f"{ev.label}: failed")
+            from loss_engine import LossError
+
+            if isinstance(ev.payload, LossError):
+                messagebox.showerror(ev.payload.title, str(ev.payload))
+            else:
+                messagebox.showerror("Processing Error", f"An unexpected error occurred:\n{str(ev.payload)}")
+        elif ev.kind == "done":
+            self.loss_progress["value"] = 1.0
+            self._loss_stage_text = ""
+            self.loss_status.config(text=f"{ev.label}: done")
+            from loss_batch import ScenarioResults
+            from loss_estimate import LossEstimate
+
+            if isinstance(ev.payload, ScenarioResults):
+                self._show_scenario_results(ev.payload)
+            elif isinstance(ev.payload, LossEstimate):
+                self._show_loss_estimate(ev.payload)
+            else:
+                self._show_loss_result(ev.payload)
+
+    def _show_scenario_results(self, batch):
+        """Comparison table of a scenario batch, most units lost first, with an optional CSV copy."""
+        table = batch.summary
+        base_label = "Baseline area within the layouts' extents" if batch.baseline_clipped else "Baseline total area"
+        lines = [
+            f"Scenarios: {len(table)}",
+            f"{base_label}: {batch.total_baseline_ha:.4f} ha",
+            "",
+            table.drop(columns=["Plan file"]).to_string(index=False, float_format=lambda v: f"{v:.4f}"),
+        ]
+        self.loss_results_text.delete("1.0", "end")
+        self.loss_results_text.insert("end", "\n".join(lines))
+
+        if messagebox.askyesno("Save results", "Save the scenario comparison as CSV?"):
+            default_name = f"loss_scenarios_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+            csv_path = filedialog.asksaveasfilename(initialfile=default_name, defaultextension=".csv",
+                                                    filetypes=[("CSV", "*.csv")], title="Scenario comparison")
+            if csv_path:
+                try:
+                    table.to_csv(csv_path, index=False)
+                    messagebox.showinfo("Saved", f"CSV saved to: {csv_path}")
+                except Exception as e:
+                    messagebox.showerror("Save error", f"Failed to save CSV: {e}")
+
+    def _show_loss_estimate(self, estimate):
+        lines = [
+            f"Quick estimate ({estimate.cell:g} m raster, {estimate.features} plan features)",
+            f"Loss area (ha): {estimate.loss_ha:,.3f} +/- {estimate.loss_ha_error:,.3f}",
+            f"Biodiversity units (loss): {estimate.units:,.3f} +/- {estimate.units_error:,.3f}",
+            "",
+            "Run Calculate Biodiversity Loss for the exact figures and the result layer.",
+        ]
+        self.loss_results_text.delete("1.0", "end")
+        self.loss_results_text.insert("end", "\n".join(lines))
+
+    def _show_loss_result(self, result):
+        from loss_engine import (EXPORT_FILETYPES, RESULT_COLUMNS, export_layer, format_habitat_summary,
+                                 habitat_summary_path)
 
-            total_loss_ha = float(intersection["Loss area (ha)"].sum())
-            total_biodiv = float(intersection["Biodiversity units"].sum())
+        try:
+            for w in result.warnings:
+                messagebox.showwarning("Loss calculation", w)
+            intersection = result.intersection
 
             # show summary
+            base_label = "Baseline area within plan extent" if result.baseline_clipped else "Baseline total area"
             lines = [
-                f"Baseline total area (ha): {total_baseline_ha:,.3f}",
-                f"Total overlap / loss area (ha): {total_loss_ha:,.3f}",
-                f"Total biodiversity units (loss): {total_biodiv:,.3f}",
+                f"{base_label} (ha): {result.total_baseline_ha:,.3f}",
+                f"Total overlap / loss area (ha): {result.total_loss_ha:,.3f}",
+                f"Total biodiversity units (loss): {result.total_units:,.3f}",
+                *([f"Plan outlines merged: {result.plan_union.summary()}"] if result.plan_union else []),
                 "",
-                "Top 10 loss features (Loss area, Biodiversity units):",
-                intersection[["Loss area (ha)", "Biodiversity units"]].head(10).to_string(index=False)
+                "Loss by habitat type:",
+                format_habitat_summary(result.habitats),
             ]
             self.loss_results_text.delete("1.0", "end")
             self.loss_results_text.insert("end", "\n".join(lines))
 
             # Ask to save shapefile and CSV
-            if messagebox.askyesno("Save results", "Save intersection shapefile and CSV of results?"):
-                # Shapefile
-                shp_path = filedialog.asksaveasfilename(defaultextension=".shp", filetypes=[("Shapefile", "*.shp")],
-                                                        title="Intersection shapefile (choose .shp filename)")
+            if messagebox.askyesno("Save results", "Save intersection layer and CSV of results?"):
+                # Layer: shapefile, or GeoParquet / FlatGeobuf to keep the full column names
+                shp_path = filedialog.asksaveasfilename(defaultextension=".shp", filetypes=EXPORT_FILETYPES,
+                                                        title="Intersection layer (.shp, .parquet or .fgb)")
                 if shp_path:
                     try:
-                        intersection.to_file(shp_path)
-                        messagebox.showinfo("Saved", f"Intersection shapefile saved to: {shp_path}")
+                        export_layer(intersection, shp_path)
+                        messagebox.showinfo("Saved", f"Intersection layer saved to: {shp_path}")
                     except Exception as e:
-                        messagebox.showerror("Save error", f"Failed to save shapefile: {e}")
+                        messagebox.showerror("Save error", f"Failed to save intersection layer: {e}")
 
                 # CSV
                 csv_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")],
                                                         title="CSV of loss results")
                 if csv_path:
                     try:
-                        cols = ["Loss area (ha)", "Condition score", "Distinctiveness score", "Significance score", "Biodiversity units"]
-                        intersection[cols].to_csv(csv_path, index=False)
-                        messagebox.showinfo("Saved", f"CSV saved to: {csv_path}")
+                        intersection[RESULT_COLUMNS].to_csv(csv_path, index=False)
+                        habitat_csv = habitat_summary_path(csv_path)
+                        result.habitats.to_csv(habitat_csv, index=False)
+                        messagebox.showinfo("Saved", f"CSV saved to: {csv_path}\nLoss by habitat type: {habitat_csv}")
                     except Exception as e:
                         messagebox.showerror("Save error", f"Failed to save CSV: {e}")
 
@@ -520,9 +484,8 @@ class BiodiversityApp:
             r += 1
             return this_row
 
-        # Broad
-        broad_vals = sorted(self.habitats_df["Broad Habitat Type"].unique().tolist())
-        cb_broad = ttk.Combobox(frm, textvariable=self.var_broad, values=broad_vals, state="readonly", width=44)
+        # Broad (values filled in by _ensure_gain_data)
+        cb_broad = self.cb_broad = ttk.Combobox(frm, textvariable=self.var_broad, values=[], state="readonly", width=44)
         row_b = add_row("Broad Habitat Type:", "General habitat classification.", cb_broad)
 
         # Specific
@@ -530,8 +493,7 @@ class BiodiversityApp:
         row_s = add_row("Specific Habitat:", "Detailed habitat type (filtered by broad type).", cb_specific)
 
         # Year
-        year_vals = [str(x) for x in self.years_df["Years"].tolist()]
-        cb_year = ttk.Combobox(frm, textvariable=self.var_year, values=year_vals, state="readonly", width=20)
+        cb_year = self.cb_year = ttk.Combobox(frm, textvariable=self.var_year, values=[], state="readonly", width=20)
         row_y = add_row("Time to target (years):", "How long until habitat reaches target ecological value.", cb_year)
 
         # Condition
@@ -575,6 +537,7 @@ class BiodiversityApp:
         btn_frame.pack(fill="x", pady=10)
         ttk.Button(btn_frame, text="Calculate", command=self._calculate_gain).pack(side="left", padx=8)
         ttk.Button(btn_frame, text="Save selection (CSV & saved results)", command=self._save_gain_selection).pack(side="left", padx=8)
+        ttk.Button(btn_frame, text="Batch calculate from file...", command=self._batch_gain).pack(side="left", padx=8)
         self.gain_result = ttk.Label(card, text="Biodiversity Units: -", font=("Segoe UI", 12, "bold"))
         self.gain_result.pack(anchor="w", pady=(6,0), padx=6)
 
@@ -597,9 +560,8 @@ class BiodiversityApp:
 
     def _on_specific_change(self):
         s = self.var_specific.get()
-        row = self.habitats_df[self.habitats_df["Specific Habitat"] == s]
-        if not row.empty:
-            score = float(row.iloc[0].get("Distinctiveness Score", 0.0))
+        if s in self.gain_tables.distinctiveness:
+            score = self.gain_tables.distinct_for(s)
             self.lbl_distinct.config(text=f"Distinctiveness: {score}")
         else:
             self.lbl_distinct.config(text="Distinctiveness: -")
@@ -607,9 +569,8 @@ class BiodiversityApp:
 
     def _on_year_change(self):
         y = self.var_year.get()
-        row = self.years_df[self.years_df["Years"].astype(str) == str(y)]
-        if not row.empty:
-            mult = float(row.iloc[0]["Multiplier"])
+        if y and year_key(y) in self.gain_tables.year_multiplier:
+            mult = self.gain_tables.year_mult_for(y)
             self.lbl_yearmult.config(text=f"Year multiplier: {mult}")
         else:
             self.lbl_yearmult.config(text="Year multiplier: -")
@@ -654,20 +615,14 @@ class BiodiversityApp:
             messagebox.showwarning("Missing fields", "Please complete: " + ", ".join(missing))
             return
         # numeric values
-        distinct = 0.0
-        row = self.habitats_df[self.habitats_df["Specific Habitat"] == self.var_specific.get()]
-        if not row.empty:
-            distinct = float(row.iloc[0].get("Distinctiveness Score", 0.0))
-        year_mult = 1.0
-        rowy = self.years_df[self.years_df["Years"].astype(str) == str(self.var_year.get())]
-        if not rowy.empty:
-            year_mult = float(rowy.iloc[0]["Multiplier"])
+        distinct = self.gain_tables.distinct_for(self.var_specific.get())
+        year_mult = self.gain_tables.year_mult_for(self.var_year.get())
         cond = float(CONDITION_MAPPING.get(self.var_condition.get(), 0.0))
         diff = float(DIFFICULTY_MAPPING.get(self.var_difficulty.get(), 0.0))
         spat = float(SPATIAL_MAPPING.get(self.var_spatial.get(), 0.0))
         strat = float(STRATEGIC_MAPPING.get(self.var_strategic.get(), 0.0))
         area = float(self.var_area.get())
-        units = distinct * cond * strat * area * spat * diff * year_mult
+        units = gain_units(distinct, cond, strat, area, spat, diff, year_mult)
         self.gain_result.config(text=f"Biodiversity Units: {units:.3f}")
 
     def _save_gain_selection(self):
@@ -724,6 +679,33 @@ class BiodiversityApp:
         self.saved_rows.append(row)
         self._refresh_saved_table()
 
+    def _batch_gain(self):
+        """Score a CSV / GeoPackage / shapefile of parcels in one go and save the results."""
+        src = filedialog.askopenfilename(title="Parcels to score",
+                                         filetypes=[("Parcels", "*.csv *.gpkg *.shp"), ("All files", "*.*")])
+        if not src:
+            return
+        try:
+            result = calculate_gain_batch(read_gain_parcels(src), self._ensure_gain_data())
+        except Exception as e:
+            messagebox.showerror("Batch error", f"Could not read parcels: {e}")
+            return
+        default_name = f"gain_batch_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+        out = filedialog.asksaveasfilename(initialfile=default_name, defaultextension=".csv",
+                                           filetypes=[("CSV", "*.csv"), ("GeoPackage", "*.gpkg")])
+        if not out:
+            return
+        try:
+            write_gain_results(result, out)
+        except Exception as e:
+            messagebox.showerror("Save error", f"Failed to save results: {e}")
+            return
+        bad = int(result["Biodiversity Units"].isna().sum())
+        msg = f"{len(result)} parcels, {result['Biodiversity Units'].sum():.3f} units.\nSaved to: {out}"
+        if bad:
+            msg += f"\n{bad} parcel(s) skipped - see the 'Gain issues' column."
+        messagebox.showinfo("Batch complete", msg)
+
     # ---------------- Saved Results ----------------
     def _build_saved_tab(self):
         card = ttk.Frame(self.tab_saved, padding=12)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of cleaned, scored baseline layers (and converted DXF plans).
+
+A campus baseline rarely changes between Loss runs, so the output of
+load_and_fix + score_baseline is stored as GeoParquet (with a per-row bbox
+covering column, so readers can filter spatially without decoding geometry)
+next to a small JSON sidecar. DXF drawings go through the same store, so a
+drawing that has not changed is not parsed again. Entries are keyed by a SHA-256 of the source
+files (all shapefile sidecars included) and of the scoring rules, and are
+evicted once unused for longer than the age limit, then least recently
+used first while the total size is over budget.
+
+GeoParquet needs pyarrow; without it the cache quietly does nothing.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+CACHE_VERSION = 1
+SHAPEFILE_SIDECARS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+
+def default_cache_dir():
+    """Per-user cache folder (LOCALAPPDATA on Windows, XDG cache elsewhere)."""
+    if sys.platform == "win32":
+        root = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local"))
+    else:
+        root = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    return root / "BiodiversityTool" / "cache"
+
+
+def source_files(path):
+    """All files that make up a layer: the shapefile and its sidecars, or the single file."""
+    path = Path(path)
+    if path.suffix.lower() == ".shp":
+        return [p for p in (path.with_suffix(ext) for ext in SHAPEFILE_SIDECARS) if p.exists()]
+    return [path]
+
+
+def hash_files(paths, extra="", chunk=1 << 20):
+    h = hashlib.sha256(f"v{CACHE_VERSION}|{extra}".encode("utf-8"))
+    for p in paths:
+        h.update(Path(p).suffix.lower().encode("utf-8"))
+        with open(p, "rb") as f:
+            for block in iter(lambda: f.read(chunk), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+class BaselineCache:
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, max_age_days=30):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_days * 86400
+        try:
+            import pyarrow  # noqa: F401
+            self.enabled = True
+        except ImportError:
+            print("pyarrow not installed - baseline cache disabled")
+            self.enabled = False
+
+    def key_for(self, path, fingerprint=""):
+        return hash_files(source_files(path), extra=fingerprint)
+
+    def _paths(self, key):
+        return self.cache_dir / f"{key}.parquet", self.cache_dir / f"{key}.json"
+
+    def get(self, key, bbox=None):
+        """Cached GeoDataFrame for key, or None on a miss. bbox reads only rows whose bbox intersects it."""
+        if not self.enabled:
+            return None
+        data, meta = self._paths(key)
+        if not (data.exists() and meta.exists()):
+            return None
+        try:
+            import geopandas as gpd
+
+            gdf = gpd.read_parquet(data, bbox=bbox)
+            gdf = gdf.drop(columns=["bbox"], errors="ignore")
+            info = json.loads(meta.read_text(encoding="utf-8"))
+            gdf.attrs = {"repair": info.get("repair")}
+            now = time.time()
+            os.utime(data, (now, now))  # mark as recently used
+            print(f"Cache hit: {key[:12]}")
+            return gdf
+        except Exception as e:
+            print(f"Cache read failed ({e}), rebuilding")
+            return None
+
+    def put(self, key, gdf):
+        if not self.enabled:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            data, meta = self._paths(key)
+            tmp = data.with_suffix(".parquet.tmp")
+            gdf.to_parquet(tmp, index=False, write_covering_bbox=True)
+            os.replace(tmp, data)
+            meta.write_text(json.dumps({
+                "version": CACHE_VERSION,
+                "created": time.time(),
+                "features": len(gdf),
+                "repair": gdf.attrs.get("repair"),
+            }), encoding="utf-8")
+            self.evict()
+        except Exception as e:
+            print(f"Cache write failed: {e}")
+
+    def evict(self):
+        """Drop entries older than max_age, then least recently used until under max_bytes."""
+        now = time.time()
+        entries = []
+        for data in self.cache_dir.glob("*.parquet"):
+            meta = data.with_suffix(".json")
+            st = data.stat()
+            size = st.st_size + (meta.stat().st_size if meta.exists() else 0)
+            if now - st.st_mtime > self.max_age_s:
+                self._remove(data, meta)
+            else:
+                entries.append((st.st_mtime, size, data, meta))
+        total = sum(e[1] for e in entries)
+        for _, size, data, meta in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            self._remove(data, meta)
+            total -= size
+
+    @staticmethod
+    def _remove(*paths):
+        for p in paths:
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: plan-extent baseline reads with and without the baseline cache.
+
+Writes the synthetic baseline of bench_overlay to a GeoPackage, with
+self-crossing ("bowtie") polygons scattered around the plan's extent: their
+raw outlines pass the read filter while the repaired geometry may not touch
+the plan. For each LossOptions.clip_baseline mode run_loss is timed without
+the cache, with a cold cache and with a warm one, and the baseline total,
+baseline features and loss figures are checked to be the same in all three.
+
+    python benchmarks/bench_baseline_read.py --grid 300 --bowties 2000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench_overlay import make_layers  # noqa: E402
+from loss_engine import LossOptions, run_loss  # noqa: E402
+
+
+def add_bowties(baseline, bounds, count, seed=0):
+    """baseline plus count bowtie copies of its first rows, spread over bounds grown by 10%."""
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = bounds
+    pad = 0.1 * max(maxx - minx, maxy - miny)
+    x = rng.uniform(minx - pad, maxx + pad, count)
+    y = rng.uniform(miny - pad, maxy + pad, count)
+    d = rng.uniform(5, 40, count)
+    rings = np.stack([np.c_[x, y], np.c_[x + d, y + d], np.c_[x + d, y], np.c_[x, y + d]], axis=1)
+    bowties = baseline.iloc[np.arange(count) % len(baseline)].set_geometry(shapely.polygons(rings))
+    return pd.concat([baseline, bowties], ignore_index=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--grid", type=int, default=200, help="baseline is grid x grid squares")
+    ap.add_argument("--plans", type=int, default=30, help="number of planned footprints")
+    ap.add_argument("--bowties", type=int, default=1000, help="self-crossing polygons around the plan")
+    args = ap.parse_args()
+
+    baseline, planned = make_layers(args.grid, args.plans)
+    baseline = add_bowties(baseline, planned.total_bounds, args.bowties)
+    with tempfile.TemporaryDirectory() as tmp:
+        base_path, plan_path = str(Path(tmp) / "baseline.gpkg"), str(Path(tmp) / "plan.shp")
+        baseline.to_file(base_path)
+        planned.to_file(plan_path)
+        print(f"baseline features: {len(baseline):,} ({args.bowties} bowties)  planned features: {len(planned)}")
+
+        for clip in ("bbox", "mask", None):
+            cache_dir = str(Path(tmp) / f"cache_{clip}")
+            figures = {}
+            for name, options in (("no cache", LossOptions(clip_baseline=clip)),
+                                  ("cold cache", LossOptions(clip_baseline=clip, cache_dir=cache_dir)),
+                                  ("warm cache", LossOptions(clip_baseline=clip, cache_dir=cache_dir))):
+                t0 = time.perf_counter()
+                r = run_loss(base_path, plan_path, options)
+                t = time.perf_counter() - t0
+                figures[name] = (r.total_baseline_ha, len(r.baseline), len(r.intersection), r.total_units)
+                print(f"clip={str(clip):<5} {name:<11} {t:6.2f} s  baseline ha={r.total_baseline_ha:.4f} "
+                      f"({len(r.baseline):,} features)  rows={len(r.intersection):,}  units={r.total_units:.4f}")
+            assert len(set(figures.values())) == 1, f"clip={clip}: figures differ with and without the cache"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: ezdxf.readfile + per-entity Polygon() vs the streaming read_dxf.
+
+Writes a synthetic site drawing with closed footprints (LWPOLYLINE and
+POLYLINE) buried among many LINE / TEXT / CIRCLE entities, then converts it
+with the legacy converter (the old convert_dxf_layers body) and with
+loss_engine.read_dxf in both modes. Each converter runs twice: once timed,
+once under tracemalloc for the peak of Python-side allocations (tracing
+slows things down too much to time the same run).
+
+    python benchmarks/bench_dxf.py --polylines 20000 --noise 300000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import Polygon
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from loss_engine import read_dxf  # noqa: E402
+
+
+def legacy_read_dxf(input_path):
+    import ezdxf
+
+    doc = ezdxf.readfile(input_path)
+    all_geometries = []
+    for entity in doc.modelspace():
+        if not hasattr(entity, "dxftype"):
+            continue
+        if entity.dxftype() in ["LWPOLYLINE", "POLYLINE"]:
+            points = []
+            if entity.dxftype() == "LWPOLYLINE":
+                pts = list(entity.get_points())
+                points = [(p[0], p[1]) for p in pts]
+            else:
+                for v in entity.vertices:
+                    points.append((v.dxf.location.x, v.dxf.location.y))
+            if len(points) >= 3:
+                if points[0] != points[-1]:
+                    points.append(points[0])
+                poly = Polygon(points)
+                if poly.is_valid:
+                    all_geometries.append(poly)
+    return gpd.GeoDataFrame(geometry=all_geometries)
+
+
+def make_drawing(path, polylines, noise, seed=0):
+    import ezdxf
+
+    rng = np.random.default_rng(seed)
+    doc = ezdxf.new("R2010")
+    msp = doc.modelspace()
+    side = int(np.ceil(np.sqrt(polylines)))
+    for k in range(polylines):
+        x, y = (k % side) * 40.0, (k // side) * 40.0
+        n = int(rng.integers(4, 12))
+        ang = np.sort(rng.uniform(0, 2 * np.pi, n))
+        pts = np.column_stack([x + 15 + 12 * np.cos(ang), y + 15 + 12 * np.sin(ang)]).tolist()
+        layer = "Buildings" if k % 3 else "Hardstanding"
+        if k % 10 == 0:
+            msp.add_polyline2d(pts, close=True, dxfattribs={"layer": layer})
+        else:
+            msp.add_lwpolyline(pts, close=True, dxfattribs={"layer": layer})
+    xs = rng.uniform(0, side * 40.0, (noise, 2))
+    for k in range(noise):
+        x, y = xs[k]
+        kind = k % 3
+        if kind == 0:
+            msp.add_line((x, y), (x + 5, y + 3), dxfattribs={"layer": "Services"})
+        elif kind == 1:
+            msp.add_text(f"T{k}", dxfattribs={"layer": "Annotation", "insert": (x, y)})
+        else:
+            msp.add_circle((x, y), 1.5, dxfattribs={"layer": "Trees"})
+    doc.saveas(path)
+
+
+def measure(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--polylines", type=int, default=20_000)
+    ap.add_argument("--noise", type=int, default=100_000, help="non-polyline entities")
+    ap.add_argument("--dxf", help="use this drawing instead of generating one")
+    args = ap.parse_args()
+
+    path = args.dxf
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), f"bench_{args.polylines}_{args.noise}.dxf")
+        if not os.path.exists(path):
+            make_drawing(path, args.polylines, args.noise)
+    print(f"drawing: {path} ({os.path.getsize(path) / 2 ** 20:.0f} MB)")
+
+    runs = [
+        ("legacy readfile + Polygon()", lambda: legacy_read_dxf(path)),
+        ("read_dxf(streaming=False)", lambda: read_dxf(path, streaming=False)),
+        ("read_dxf(streaming=True)", lambda: read_dxf(path, streaming=True)),
+        ("  + layers=['Buildings']", lambda: read_dxf(path, layers=["Buildings"])),
+    ]
+    results = []
+    for name, fn in runs:
+        t, peak, gdf = measure(fn)
+        results.append((t, peak, gdf))
+        print(f"{name:<30} {t:8.2f} s  peak {peak:8.1f} MB  polygons={len(gdf):,}")
+
+    legacy, streamed = results[0][2], results[2][2]
+    assert len(legacy) == len(streamed)
+    assert legacy.geometry.geom_equals_exact(streamed.geometry, 0).all()
+    print(f"streaming vs legacy: {results[0][0] / results[2][0]:.1f}x faster, "
+          f"{results[0][1] / results[2][1]:.1f}x less peak memory")
+
+
+if __name__ == "__main__":
+    main()
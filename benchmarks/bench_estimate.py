@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: quick loss estimates from the unit raster vs the exact intersection.
+
+Builds the synthetic baseline of bench_overlay (grid x grid habitat squares of
+50 m) and a set of circular footprints, then for each raster cell size times
+building the UnitRaster once and estimating the plan, and compares the
+estimate and its error bound with the exact figures of intersect_loss. Cell
+sizes that divide 50 m line up with the habitat squares and are nearly
+exact; the others show the bound at work.
+
+    python benchmarks/bench_estimate.py --grid 600 --plans 200 --cells 7.5 10 25
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench_overlay import make_layers, timed  # noqa: E402
+from loss_engine import LossOptions, intersect_loss, prepare_baseline, score_baseline  # noqa: E402
+from loss_estimate import UnitRaster  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--grid", type=int, default=300, help="baseline is grid x grid squares")
+    ap.add_argument("--plans", type=int, default=60, help="number of planned footprints")
+    ap.add_argument("--cells", type=float, nargs="+", default=[7.5, 10.0, 25.0], help="raster cell sizes (m)")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    options = LossOptions()
+    baseline, planned = make_layers(args.grid, args.plans)
+    base = prepare_baseline(score_baseline(baseline, options), options, baseline_scored=True)
+    geoms = np.asarray(planned.geometry.array)
+    print(f"baseline features: {len(base.gdf):,}  planned footprints: {len(planned)}")
+
+    t0 = time.perf_counter()
+    exact = intersect_loss(base.gdf, planned, options)
+    t_exact = time.perf_counter() - t0
+    units, loss_ha = exact["Biodiversity units"].sum(), exact["Loss area (ha)"].sum()
+    print(f"exact        {t_exact * 1000:9.1f} ms  loss ha={loss_ha:.4f}  units={units:.4f}")
+
+    for cell in args.cells:
+        t0 = time.perf_counter()
+        raster = UnitRaster(base.gdf, options, cell)
+        t_build = time.perf_counter() - t0
+        t_est, est = timed(lambda: raster.estimate(geoms), args.repeat)
+        print(f"cell {cell:<6g}  build {t_build:6.2f} s ({raster.nbytes / 1024 ** 2:.0f} MB)  "
+              f"estimate {t_est * 1000:7.1f} ms  loss ha={est.loss_ha:.4f} +/- {est.loss_ha_error:.4f}  "
+              f"units={est.units:.4f} +/- {est.units_error:.4f}  "
+              f"within bound: {abs(units - est.units) <= est.units_error + 1e-3}")
+
+
+if __name__ == "__main__":
+    main()
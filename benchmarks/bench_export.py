@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: writing a loss intersection as Shapefile vs GeoParquet vs FlatGeobuf.
+
+The result layer is a synthetic baseline grid intersected with one plan that
+covers all of it, so every square becomes a loss row with the full set of
+result columns. Each format is written with loss_engine.export_layer (plus the
+old plain gdf.to_file for the shapefile), then read back to check which
+column names survived.
+
+    python benchmarks/bench_export.py --grid 700
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import geopandas as gpd
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from baseline_cache import source_files  # noqa: E402
+from bench_overlay import make_layers  # noqa: E402
+from loss_engine import RESULT_COLUMNS, LossOptions, export_layer, intersect_loss, score_baseline  # noqa: E402
+
+
+def read_back(path):
+    return gpd.read_parquet(path) if path.endswith(".parquet") else gpd.read_file(path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--grid", type=int, default=500, help="result has grid x grid rows")
+    args = ap.parse_args()
+
+    baseline, _ = make_layers(args.grid, 1)
+    plan = gpd.GeoDataFrame({"name": ["site"]}, geometry=[shapely.box(*baseline.total_bounds)], crs=baseline.crs)
+    result = intersect_loss(score_baseline(baseline, LossOptions()), plan, LossOptions())
+    print(f"result rows: {len(result):,}  columns: {len(result.columns)}")
+
+    out_dir = tempfile.mkdtemp(prefix="bench_export_")
+    runs = [
+        ("shapefile (gdf.to_file)", "legacy.shp", lambda p: result.to_file(p)),
+        ("shapefile (export_layer)", "loss.shp", lambda p: export_layer(result, p)),
+        ("GeoParquet", "loss.parquet", lambda p: export_layer(result, p)),
+        ("FlatGeobuf", "loss.fgb", lambda p: export_layer(result, p)),
+    ]
+    try:
+        for name, filename, write in runs:
+            path = os.path.join(out_dir, filename)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # shapefile field-name truncation
+                t0 = time.perf_counter()
+                write(path)
+                elapsed = time.perf_counter() - t0
+            files = source_files(path)
+            size = sum(os.path.getsize(f) for f in files) / 2 ** 20
+            kept = [c for c in RESULT_COLUMNS if c in read_back(path).columns]
+            print(f"{name:<26} {elapsed:7.2f} s  {size:8.1f} MB in {len(files)} file(s)  "
+                  f"result columns kept: {len(kept)}/{len(RESULT_COLUMNS)}")
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: drawing the loss map layers - per-habitat GeoDataFrame.plot vs one collection per layer.
+
+The baseline is a synthetic grid of habitat squares whose edges are densified
+(--vertices per edge) to stand in for digitised outlines; the loss layer is
+that grid intersected with a cluster of planned footprints. Both ways of
+drawing the two layers are timed up to a rendered figure, at the preview and
+the save settings of loss_map.
+
+    python benchmarks/bench_map_render.py --grid 450 --vertices 20
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import shapely  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench_overlay import make_layers  # noqa: E402
+from loss_engine import LossOptions, intersect_loss, score_baseline  # noqa: E402
+from loss_map import add_polygon_layer, pixel_size  # noqa: E402
+
+COLORS = {"Grassland": "#9ACD32", "Woodland": "#228B22", "Cropland": "#8B4513",
+          "Wetland": "#20B2AA", "Heathland and shrub": "#DAA520"}
+SETTINGS = {"preview": ((14, 8), 100), "save": ((20, 12), 300)}
+
+
+def per_habitat_plot(ax, baseline, loss):
+    """How the map used to be drawn: one GeoDataFrame.plot per habitat, then the loss layer."""
+    habitat = baseline["Baseline Broad Habitat Type"]
+    for name, color in COLORS.items():
+        baseline[habitat == name].plot(ax=ax, color=color, alpha=0.3, edgecolor="gray", linewidth=0.5)
+    loss.plot(ax=ax, color=loss["Baseline Broad Habitat Type"].map(COLORS), alpha=0.8, edgecolor="black",
+              linewidth=1.0)
+
+
+def one_collection(ax, baseline, loss):
+    tolerance = pixel_size(ax, baseline.total_bounds) / 2
+    add_polygon_layer(ax, baseline, baseline["Baseline Broad Habitat Type"].map(COLORS), tolerance,
+                      alpha=0.3, edgecolor="gray", linewidth=0.5)
+    add_polygon_layer(ax, loss, loss["Baseline Broad Habitat Type"].map(COLORS), tolerance,
+                      alpha=0.8, edgecolor="black", linewidth=1.0)
+
+
+def render(draw, baseline, loss, figsize, dpi):
+    t0 = time.perf_counter()
+    fig, ax = plt.subplots(figsize=figsize, dpi=dpi)
+    draw(ax, baseline, loss)
+    fig.canvas.draw()
+    elapsed = time.perf_counter() - t0
+    plt.close(fig)
+    return elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--grid", type=int, default=300, help="baseline is grid x grid squares")
+    ap.add_argument("--vertices", type=int, default=20, help="vertices per square edge")
+    ap.add_argument("--plans", type=int, default=40, help="number of planned footprints")
+    ap.add_argument("--skip-plot", action="store_true", help="time only the collection renderer")
+    args = ap.parse_args()
+
+    baseline, planned = make_layers(args.grid, args.plans)
+    baseline = score_baseline(baseline, LossOptions())
+    loss = intersect_loss(baseline, planned, LossOptions())
+    baseline = baseline.set_geometry(shapely.segmentize(baseline.geometry.values, 50.0 / args.vertices))
+    vertices = shapely.get_num_coordinates(baseline.geometry.values).sum()
+    print(f"baseline features: {len(baseline):,} ({vertices:,} vertices)  loss features: {len(loss):,}")
+
+    for setting, (figsize, dpi) in SETTINGS.items():
+        t_new = render(one_collection, baseline, loss, figsize, dpi)
+        line = f"{setting:<8} one collection {t_new:7.2f} s"
+        if not args.skip_plot:
+            t_old = render(per_habitat_plot, baseline, loss, figsize, dpi)
+            line += f"   per-habitat plot {t_old:7.2f} s   speedup {t_old / t_new:.1f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
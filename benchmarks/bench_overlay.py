@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: gpd.overlay vs STRtree-prefiltered intersection (loss_engine.sindex_intersection).
+
+Builds a synthetic regional baseline (grid of habitat squares) and a small
+planned development, then times both intersection paths including the unit
+formula and checks that they give the same totals.
+
+    python benchmarks/bench_overlay.py --grid 700 --plans 40
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from loss_engine import LossOptions, intersect_loss, score_baseline  # noqa: E402
+
+CONDITIONS = ["Good", "Fairly Good", "Moderate", "Fairly poor", "Poor"]
+DISTINCT = ["V.Low", "Low", "Medium", "High", "V.High"]
+HABITATS = ["Grassland", "Woodland", "Cropland", "Wetland", "Heathland and shrub"]
+
+
+def make_layers(grid, plans, cell=50.0, seed=0):
+    rng = np.random.default_rng(seed)
+    x0, y0 = 150000.0, 170000.0
+    ii, jj = np.meshgrid(np.arange(grid), np.arange(grid))
+    xs = x0 + ii.ravel() * cell
+    ys = y0 + jj.ravel() * cell
+    n = xs.size
+    baseline = gpd.GeoDataFrame({
+        "Baseline Condition": rng.choice(CONDITIONS, n),
+        "Baseline Distinctiveness": rng.choice(DISTINCT, n),
+        "Baseline Broad Habitat Type": rng.choice(HABITATS, n),
+    }, geometry=shapely.box(xs, ys, xs + cell, ys + cell), crs="EPSG:31370")
+
+    # a few dozen footprints clustered in one corner of the region
+    site = grid * cell * 0.05
+    cx = x0 + rng.uniform(0, site, plans)
+    cy = y0 + rng.uniform(0, site, plans)
+    planned = gpd.GeoDataFrame(geometry=shapely.buffer(shapely.points(cx, cy), rng.uniform(20, 120, plans)),
+                               crs="EPSG:31370")
+    return baseline, planned
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--grid", type=int, default=500, help="baseline is grid x grid squares")
+    ap.add_argument("--plans", type=int, default=40, help="number of planned footprints")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    baseline, planned = make_layers(args.grid, args.plans)
+    baseline = score_baseline(baseline, LossOptions())
+    print(f"baseline features: {len(baseline):,}  planned features: {len(planned)}")
+
+    t_overlay, r_overlay = timed(lambda: intersect_loss(baseline, planned, LossOptions(use_sindex=False)), args.repeat)
+    t_sindex, r_sindex = timed(lambda: intersect_loss(baseline, planned, LossOptions(use_sindex=True)), args.repeat)
+
+    for name, t, r in (("gpd.overlay", t_overlay, r_overlay), ("sindex", t_sindex, r_sindex)):
+        print(f"{name:<12} {t:8.3f} s  rows={len(r):,}  loss ha={r['Loss area (ha)'].sum():.4f}  "
+              f"units={r['Biodiversity units'].sum():.4f}")
+    print(f"speedup: {t_overlay / t_sindex:.1f}x")
+
+    assert len(r_overlay) == len(r_sindex)
+    assert r_overlay["Biodiversity units"].sum() == r_sindex["Biodiversity units"].sum()
+
+
+if __name__ == "__main__":
+    main()
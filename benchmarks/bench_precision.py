@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: loss intersection of noisy CAD-like layers at full precision vs on a precision grid.
+
+The baseline is a synthetic grid of habitat squares and the plan a set of
+blocks drawn along the same grid lines, as when a layout is digitised over
+the habitat map. Both layers are densified (--step) and every vertex is
+moved by up to --noise map units, independently per feature, so shared
+edges no longer coincide: the full-precision intersection is littered with
+sliver fragments along every block edge. Each intersection path is timed
+without and with LossOptions.grid_size (snapping included) and the fragment
+counts, slivers and totals are compared.
+
+    python benchmarks/bench_precision.py --grid 300 --blocks 400 --noise 0.0004
+"""
+
+import argparse
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bench_overlay import make_layers  # noqa: E402
+from loss_engine import LossOptions, intersect_loss, score_baseline  # noqa: E402
+
+# fragments smaller than this (m2) are counted as slivers in the full-precision output
+SLIVER_M2 = 0.01
+
+
+def jitter(geoms, step, noise, seed):
+    """geoms densified to step, each vertex moved by up to noise; a ring's closing vertex moves with its first."""
+    geoms = shapely.segmentize(geoms, step)
+    coords, index = shapely.get_coordinates(geoms, return_index=True)
+    h = np.sin((coords[:, 0] * 12.9898 + coords[:, 1] * 78.233)[:, None]
+               + (index[:, None] + seed) * np.array([1.7, 3.1])) * 43758.5453
+    return shapely.set_coordinates(geoms.copy(), coords + noise * (2 * (h - np.floor(h)) - 1))
+
+
+def make_noisy_layers(grid, blocks, step, noise, cell=50.0, seed=0):
+    baseline, _ = make_layers(grid, 1, cell, seed)
+    baseline = baseline.set_geometry(jitter(np.asarray(baseline.geometry.array), step, noise, 0))
+    rng = np.random.default_rng(seed)
+    x0, y0 = 150000.0, 170000.0
+    i, j = rng.integers(0, grid - 6, (2, blocks))
+    w, h = rng.integers(1, 5, (2, blocks))
+    outlines = shapely.box(x0 + i * cell, y0 + j * cell, x0 + (i + w) * cell, y0 + (j + h) * cell)
+    planned = gpd.GeoDataFrame(geometry=jitter(outlines, step / 2, noise, 1), crs=baseline.crs)
+    return baseline, planned
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--grid", type=int, default=200, help="baseline is grid x grid squares")
+    ap.add_argument("--blocks", type=int, default=300, help="number of planned blocks")
+    ap.add_argument("--step", type=float, default=2.0, help="baseline vertex spacing (plan: half of it)")
+    ap.add_argument("--noise", type=float, default=0.0004, help="largest vertex displacement (map units)")
+    ap.add_argument("--grid-sizes", type=float, nargs="+", default=[0.001, 0.01])
+    ap.add_argument("--skip-overlay", action="store_true", help="time only the STRtree path")
+    args = ap.parse_args()
+
+    baseline, planned = make_noisy_layers(args.grid, args.blocks, args.step, args.noise)
+    baseline = score_baseline(baseline, LossOptions())
+    vertices = shapely.get_num_coordinates(baseline.geometry.values).sum()
+    print(f"baseline features: {len(baseline):,} ({vertices:,} vertices)  planned blocks: {len(planned)}  "
+          f"noise: {args.noise:g}")
+
+    paths = [("sindex", LossOptions())] + ([] if args.skip_overlay else [("gpd.overlay", LossOptions(use_sindex=False))])
+    for name, options in paths:
+        t0 = time.perf_counter()
+        full = intersect_loss(baseline, planned, options)
+        t_full = time.perf_counter() - t0
+        print(f"{name:<12} full precision {t_full:7.2f} s  rows={len(full):,}  "
+              f"slivers(<{SLIVER_M2:g} m2)={int((full.area < SLIVER_M2).sum()):,}  "
+              f"loss ha={full['Loss area (ha)'].sum():.4f}  units={full['Biodiversity units'].sum():.4f}")
+        for grid_size in args.grid_sizes:
+            t0 = time.perf_counter()
+            snapped = intersect_loss(baseline, planned, replace(options, grid_size=grid_size))
+            t_grid = time.perf_counter() - t0
+            removed = snapped.attrs.get("slivers")
+            print(f"{'':<12} grid {grid_size:<9g} {t_grid:7.2f} s  rows={len(snapped):,}  "
+                  f"slivers(<{SLIVER_M2:g} m2)={int((snapped.area < SLIVER_M2).sum()):,}  "
+                  f"loss ha={snapped['Loss area (ha)'].sum():.4f}  units={snapped['Biodiversity units'].sum():.4f}  "
+                  f"removed={'-' if removed is None else f'{removed:,}'}  speedup {t_full / t_grid:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: row-wise geometry cleaning vs loss_engine.repair_geometries.
+
+The legacy path is the old load_and_fix body (buffer(0) on everything, then
+make_valid and force_polygon through .apply). The layer is mostly valid
+squares with a share of self-intersecting "bowties" and open polylines.
+
+    python benchmarks/bench_repair.py --features 1000000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import geopandas as gpd
+import shapely
+from shapely.validation import make_valid
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from loss_engine import repair_geometries  # noqa: E402
+
+
+def legacy_fix(gdf):
+    def force_polygon(geom):
+        if geom is None or geom.is_empty:
+            return None
+        if geom.geom_type in ["Polygon", "MultiPolygon"]:
+            return geom
+        if geom.geom_type == "LineString":
+            coords = list(geom.coords)
+            if len(coords) >= 3:
+                if coords[0] != coords[-1]:
+                    coords.append(coords[0])
+                if len(coords) >= 4:
+                    poly = shapely.Polygon(coords)
+                    if poly.is_valid:
+                        return poly
+        return geom
+
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+    gdf["geometry"] = gdf.geometry.buffer(0)
+    gdf["geometry"] = gdf.geometry.apply(make_valid)
+    gdf["geometry"] = gdf.geometry.apply(force_polygon)
+    return gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+
+
+def make_layer(n, invalid_share, line_share, seed=0):
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n)))
+    k = np.arange(n)
+    x = (k % side) * 10.0
+    y = (k // side) * 10.0
+    geoms = shapely.box(x, y, x + 10, y + 10)
+
+    kind = rng.random(n)
+    bow = np.flatnonzero(kind < invalid_share)
+    line = np.flatnonzero((kind >= invalid_share) & (kind < invalid_share + line_share))
+    bx, by = x[bow], y[bow]
+    geoms[bow] = shapely.polygons(np.stack([
+        np.stack([bx, by], 1), np.stack([bx + 10, by + 10], 1),
+        np.stack([bx + 10, by], 1), np.stack([bx, by + 10], 1)], 1))
+    lx, ly = x[line], y[line]
+    geoms[line] = shapely.linestrings(np.stack([
+        np.stack([lx, ly], 1), np.stack([lx + 10, ly], 1), np.stack([lx + 10, ly + 10], 1)], 1))
+    return gpd.GeoDataFrame({"id": k}, geometry=geoms, crs="EPSG:31370")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--features", type=int, default=1_000_000)
+    ap.add_argument("--invalid", type=float, default=0.01, help="share of self-intersecting polygons")
+    ap.add_argument("--lines", type=float, default=0.005, help="share of open polylines")
+    args = ap.parse_args()
+
+    gdf = make_layer(args.features, args.invalid, args.lines)
+    print(f"features: {len(gdf):,}")
+
+    t0 = time.perf_counter()
+    old = legacy_fix(gdf.copy())
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    new, report = repair_geometries(gdf)
+    t_new = time.perf_counter() - t0
+
+    print(f"legacy load_and_fix  {t_old:8.2f} s  kept={len(old):,}")
+    print(f"repair_geometries    {t_new:8.2f} s  kept={len(new):,}  ({report.summary()})")
+    print(f"speedup: {t_old / t_new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
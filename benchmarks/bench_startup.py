@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: desktop app start-up - import time per module and time to first paint.
+
+Each app is imported in a fresh interpreter under python -X importtime; the
+report lists the slowest modules (cumulative time, nested imports included)
+and which heavy libraries were loaded before the window could appear. With a
+display, the app is also built in a real Tk root and timed up to the first
+root.update() (window painted, gain lists still loading). Exits 1 when an app
+goes over --budget seconds.
+
+    python benchmarks/bench_startup.py --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+APPS = ("BiodiversityTool_Nov2025", "29Oct_map")
+# libraries that should only load on first use
+HEAVY = ("pandas", "numpy", "geopandas", "shapely", "pyogrio", "pyproj", "ezdxf", "matplotlib", "pyarrow")
+
+PAINT_SCRIPT = """
+import importlib, time, tkinter as tk
+t0 = time.perf_counter()
+app = importlib.import_module({module!r})
+root = tk.Tk()
+app.BiodiversityApp(root)
+root.update()
+print(time.perf_counter() - t0)
+root.destroy()
+"""
+
+
+def import_profile(module=None):
+    """(seconds to import module, {module: cumulative seconds}) in a fresh interpreter.
+
+    Without a module this profiles bare interpreter start-up (site, encodings, ...).
+    """
+    stmt = f"importlib.import_module({module!r})" if module else "pass"
+    code = f"import importlib, time; t0 = time.perf_counter(); {stmt}; print(time.perf_counter() - t0)"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO,
+                          capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    seconds = float(proc.stdout.strip().splitlines()[-1])
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cum) / 1e6
+    return seconds, cumulative
+
+
+def paint_time(module):
+    """Seconds from the app import to its first paint, or None without a display."""
+    proc = subprocess.run([sys.executable, "-c", PAINT_SCRIPT.format(module=module)], cwd=REPO,
+                          capture_output=True, text=True)
+    if proc.returncode:
+        return None
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--top", type=int, default=10, help="slowest modules to list per app")
+    ap.add_argument("--repeat", type=int, default=3, help="fresh interpreters per app (best one is kept)")
+    ap.add_argument("--budget", type=float, default=1.0, help="seconds allowed to first paint (import if no display)")
+    ap.add_argument("apps", nargs="*", default=APPS)
+    args = ap.parse_args()
+
+    interpreter = import_profile()[1]
+    over = False
+    for module in args.apps:
+        seconds, cumulative = min((import_profile(module) for _ in range(args.repeat)), key=lambda r: r[0])
+        top_level = {name: t for name, t in cumulative.items() if "." not in name and name not in interpreter}
+        print(f"\n{module}: import {seconds:.3f} s (importtime adds its own overhead to the figures below)")
+        for name, t in sorted(top_level.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"  {t:7.3f} s  {name}")
+        heavy = [name for name in HEAVY if name in cumulative]
+        print(f"  heavy libraries loaded at start: {', '.join(heavy) or 'none'}")
+
+        paints = []
+        if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+            paints = [p for p in (paint_time(module) for _ in range(args.repeat)) if p is not None]
+        if paints:
+            total = min(paints)
+            print(f"  window painted after {total:.3f} s (from first import)")
+        else:
+            total = seconds
+            print("  no display: first paint not measured, budget applies to the import")
+        if total > args.budget:
+            print(f"  OVER BUDGET ({args.budget:.2f} s)")
+            over = True
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Command-line entry point: loss, gain and map runs from a manifest, no GUI.
+
+    python biodiversity_cli.py loss sites.yaml
+    python biodiversity_cli.py gain parcels.json --output gain_results.jsonl
+    python biodiversity_cli.py map sites.yaml
+    python biodiversity_cli.py estimate sites.yaml
+
+A manifest is JSON or YAML (YAML needs PyYAML) with a list of runs and
+optional defaults merged into each run; relative paths are taken from the
+manifest's folder:
+
+    defaults:
+      significance: 1.0
+      profile: nov            # scoring of BiodiversityTool_Nov2025 ("map": 29Oct_map's)
+    runs:
+      - id: campus-a
+        baseline: baseline/campus_a.gpkg
+        plan: plans/campus_a.dxf    # a folder of .shp/.dxf layouts runs them as scenarios
+        layer: out/campus_a_loss.parquet
+        csv: out/campus_a_loss.csv  # plus out/campus_a_loss_by_habitat.csv
+      - id: campus-b
+        baseline: baseline/campus_b.shp
+        plan: plans/campus_b.shp
+        significance: 1.15
+        png: out/campus_b.png       # map subcommand only
+        cell: 10                    # estimate subcommand only: raster cell size (m)
+
+Gain runs take parcels / output (and optionally habitats / years CSVs),
+see gain_engine.run_gain_batch. Any other run key that names a LossOptions
+field (target_crs, clip_baseline, workers, dxf_layers, cache_dir, ...) is
+passed through to the loss engine. "estimate" gives quick loss figures with
+error bounds from a unit raster of each baseline (loss_estimate) instead of
+the exact overlay; runs sharing a baseline and cell size reuse the raster.
+
+Each run prints one JSON object per line on stdout (or to --output); engine
+diagnostics go to stderr. The exit status is 1 when any run failed.
+Nothing here imports tkinter or PIL, and matplotlib is only loaded by "map".
+"""
+
+import argparse
+import contextlib
+import dataclasses
+import json
+import math
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+# run keys that are not LossOptions fields
+LOSS_RUN_KEYS = {"id", "baseline", "plan", "profile", "layer", "csv", "png", "preview", "cell"}
+GAIN_RUN_KEYS = {"id", "parcels", "output", "habitats", "years"}
+PATH_KEYS = {"baseline", "plan", "layer", "csv", "png", "parcels", "output", "habitats", "years", "cache_dir"}
+
+
+class ManifestError(ValueError):
+    pass
+
+
+# -------------------- Manifest --------------------
+def load_manifest(path):
+    """Runs of a JSON / YAML manifest with defaults merged in and paths resolved."""
+    text = Path(path).read_text(encoding="utf-8-sig")
+    if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ManifestError("YAML manifests need PyYAML (pip install pyyaml); JSON works without it")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if isinstance(data, list):
+        data = {"runs": data}
+    if not isinstance(data, dict) or not isinstance(data.get("runs"), list):
+        raise ManifestError(f"{path}: expected a list of runs or a mapping with a 'runs' list")
+
+    root = os.path.dirname(os.path.abspath(path))
+    defaults = data.get("defaults") or {}
+    runs = []
+    for n, run in enumerate(data["runs"], 1):
+        if not isinstance(run, dict):
+            raise ManifestError(f"{path}: run {n} is not a mapping")
+        run = {**defaults, **run}
+        run.setdefault("id", str(n))
+        for key in PATH_KEYS & run.keys():
+            if run[key] is not None:
+                run[key] = os.path.join(root, os.path.expanduser(str(run[key])))
+        runs.append(run)
+    return runs
+
+
+def _require(run, *keys):
+    missing = [k for k in keys if not run.get(k)]
+    if missing:
+        raise ManifestError(f"run {run['id']}: missing {', '.join(missing)}")
+
+
+def loss_options_for(run):
+    """LossOptions for a run: the profile's settings, then any LossOptions fields the run sets."""
+    from loss_engine import LossOptions
+
+    fields = {f.name for f in dataclasses.fields(LossOptions)}
+    unknown = set(run) - fields - LOSS_RUN_KEYS
+    if unknown:
+        raise ManifestError(f"run {run['id']}: unknown keys {', '.join(sorted(unknown))}")
+    significance = float(run.get("significance", 1.0))
+    profile = run.get("profile", "nov")
+    if profile == "map":
+        from loss_map import loss_options
+
+        options = loss_options(significance)
+    elif profile == "nov":
+        from baseline_cache import default_cache_dir
+
+        options = LossOptions(significance=significance, cache_dir=str(default_cache_dir()))
+    else:
+        raise ManifestError(f"run {run['id']}: profile must be 'nov' or 'map', not {profile!r}")
+    overrides = {k: tuple(v) if isinstance(v, list) else v for k, v in run.items() if k in fields}
+    overrides["significance"] = significance
+    return dataclasses.replace(options, **overrides)
+
+
+# -------------------- Runs --------------------
+def _loss_record(result):
+    return {
+        "total_loss_ha": result.total_loss_ha,
+        "total_units": result.total_units,
+        "total_baseline_ha": result.total_baseline_ha,
+        "baseline_clipped": result.baseline_clipped,
+        "loss_features": len(result.intersection),
+        "habitat_types": len(result.habitats),
+        "unmapped_condition": result.unmapped_condition,
+        "unmapped_distinctiveness": result.unmapped_distinctiveness,
+        "warnings": result.warnings,
+        "plan_union": dataclasses.asdict(result.plan_union) if result.plan_union else None,
+        "slivers_removed": result.slivers_removed,
+    }
+
+
+def run_loss_entry(run, render=False):
+    """One manifest run of the loss (or, with render, map) subcommand; returns its result record."""
+    _require(run, "baseline", "plan", *(("png",) if render else ()))
+    options = loss_options_for(run)
+    if os.path.isdir(run["plan"]):
+        if render or run.get("layer"):
+            raise ManifestError(f"run {run['id']}: a folder of scenarios gives a table only (csv), "
+                                f"not a layer or map")
+        from loss_batch import run_scenarios
+
+        batch = run_scenarios(run["baseline"], run["plan"], options)
+        if run.get("csv"):
+            batch.summary.to_csv(run["csv"], index=False)
+        return {"total_baseline_ha": batch.total_baseline_ha, "baseline_clipped": batch.baseline_clipped,
+                "scenarios": batch.summary.to_dict(orient="records"), "csv": run.get("csv")}
+
+    from loss_engine import RESULT_COLUMNS, export_layer, figures_only, habitat_summary_path, run_loss
+
+    # every baseline attribute only when the intersection layer is written
+    result = run_loss(run["baseline"], run["plan"], options if run.get("layer") else figures_only(options))
+    record = _loss_record(result)
+    if run.get("layer"):
+        record["layer"] = export_layer(result.intersection, run["layer"])
+    if run.get("csv"):
+        result.intersection[RESULT_COLUMNS].to_csv(run["csv"], index=False)
+        record["csv"] = run["csv"]
+        record["habitat_csv"] = habitat_summary_path(run["csv"])
+        result.habitats.to_csv(record["habitat_csv"], index=False)
+    if render:
+        from loss_map import create_loss_map_as_png
+
+        if not create_loss_map_as_png(result.baseline, result.intersection, run["png"],
+                                      preview_mode=bool(run.get("preview", False)), summary=result.habitats):
+            raise RuntimeError(f"Map rendering failed for {run['png']}")
+        record["png"] = run["png"]
+    return record
+
+
+def run_estimate_entry(run, estimators):
+    """One manifest run of the estimate subcommand; estimators keeps one LossEstimator per cell size."""
+    _require(run, "baseline", "plan")
+    if run.get("layer") or run.get("csv"):
+        raise ManifestError(f"run {run['id']}: an estimate gives totals only, not a layer or csv")
+    from loss_estimate import DEFAULT_CELL, LossEstimator
+
+    options = loss_options_for(run)
+    cell = float(run.get("cell", DEFAULT_CELL))
+    if cell not in estimators:
+        estimators[cell] = LossEstimator(cell)
+    if os.path.isdir(run["plan"]):
+        from loss_batch import scenario_files, scenario_name
+
+        return {"scenarios": [{"Scenario": scenario_name(path), "Plan file": path,
+                               **dataclasses.asdict(estimators[cell].run(run["baseline"], path, options))}
+                              for path in scenario_files(run["plan"])]}
+    return dataclasses.asdict(estimators[cell].run(run["baseline"], run["plan"], options))
+
+
+def run_gain_entry(run):
+    """One manifest run of the gain subcommand."""
+    unknown = set(run) - GAIN_RUN_KEYS
+    if unknown:
+        raise ManifestError(f"run {run['id']}: unknown keys {', '.join(sorted(unknown))}")
+    _require(run, "parcels", "output")
+    from gain_engine import run_gain_batch
+
+    result = run_gain_batch(run["parcels"], run["output"],
+                            run.get("habitats") or _lookup_csv("all_habitats.csv"),
+                            run.get("years") or _lookup_csv("target_year.csv"))
+    units = result["Biodiversity Units"]
+    return {"parcels": len(result), "scored": int(units.notna().sum()), "skipped": int(units.isna().sum()),
+            "total_units": float(units.sum()), "output": run["output"]}
+
+
+def _lookup_csv(name):
+    """The apps' data/ copy of a lookup CSV, else the one shipped next to this script."""
+    path = BASE_DIR / "data" / name
+    return str(path if path.exists() else BASE_DIR / name)
+
+
+def _json_safe(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if hasattr(value, "item"):  # numpy scalars
+        return _json_safe(value.item())
+    return value
+
+
+# -------------------- Main --------------------
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = ap.add_subparsers(dest="command", required=True)
+    for name, text in (("loss", "biodiversity loss of planned developments"),
+                       ("gain", "biodiversity gain of proposed parcels"),
+                       ("map", "loss runs rendered to PNG maps"),
+                       ("estimate", "quick loss estimates with error bounds")):
+        p = sub.add_parser(name, help=text)
+        p.add_argument("manifest", help="JSON or YAML manifest of runs")
+        p.add_argument("--output", help="write the JSON-lines results here instead of stdout")
+        p.add_argument("--only", action="append", metavar="ID", help="run only these ids (repeatable)")
+    args = ap.parse_args(argv)
+
+    try:
+        runs = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        ap.exit(2, f"{ap.prog}: {e}\n")
+    if args.only:
+        runs = [r for r in runs if str(r["id"]) in args.only]
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failed = 0
+    estimators = {}
+    try:
+        for run in runs:
+            t0 = time.perf_counter()
+            record = {"id": run["id"], "command": args.command}
+            try:
+                # the engines report with print(); keep stdout for the results
+                with contextlib.redirect_stdout(sys.stderr):
+                    if args.command == "gain":
+                        record.update(run_gain_entry(run))
+                    elif args.command == "estimate":
+                        record.update(run_estimate_entry(run, estimators))
+                    else:
+                        record.update(run_loss_entry(run, render=args.command == "map"))
+                record["status"] = "ok"
+            except Exception as e:
+                failed += 1
+                record["status"] = "error"
+                record["error"] = str(e)
+                record["error_type"] = type(e).__name__
+            record["seconds"] = round(time.perf_counter() - t0, 3)
+            out.write(json.dumps(_json_safe(record), default=str) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
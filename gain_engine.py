@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Headless biodiversity gain calculator.
+
+Holds the gain multipliers, the all_habitats.csv / target_year.csv loaders and
+the unit formula
+
+    distinctiveness x condition x strategic x area x spatial x difficulty x year multiplier
+
+for a single parcel (the Gain tab) or a whole table / polygon layer of
+proposed parcels in one vectorized pass. pandas is imported by the functions
+that need it, so the single-parcel path costs the desktop apps nothing at start.
+"""
+
+import os
+import re
+
+# Mappings
+CONDITION_MAPPING = {"Good": 3.0, "Fairly Good": 2.5, "Moderate": 2.0, "Fairly poor": 1.5, "Poor": 1.0}
+DIFFICULTY_MAPPING = {"Very high": 0.1, "High": 0.33, "Medium": 0.67, "Low": 1.0}
+SPATIAL_MAPPING = {"On-site": 1.0, "Within same city": 0.75, "Somewhere further": 0.5}
+STRATEGIC_MAPPING = {"High": 1.15, "Low": 1.0}
+DISTINCTIVENESS_MAP = {"V.High": 8, "High": 6, "Medium": 4, "Low": 2, "V.Low": 0}
+
+# Input columns of a batch, named like the Gain tab's saved selections so those CSVs can be fed back in
+GAIN_INPUT_COLUMNS = ["Specific Habitat", "Years", "Condition", "Difficulty", "Spatial Risk",
+                      "Strategic Significance", "Area (ha)"]
+
+
+# -------------------- Lookup tables --------------------
+def load_habitats(csv_path):
+    """all_habitats.csv with a numeric "Distinctiveness Score"; small built-in sample if unreadable."""
+    import pandas as pd
+
+    if os.path.exists(csv_path):
+        try:
+            df = pd.read_csv(csv_path, dtype=str).fillna("")
+            # Validate expected headers
+            if "Specific Habitat" not in df.columns or "Broad Habitat Type" not in df.columns:
+                print("habitats.csv missing expected headers, using fallback sample")
+                raise Exception("missing headers")
+            if "Distinctiveness Category" not in df.columns:
+                df["Distinctiveness Category"] = ""
+            df["Distinctiveness Score"] = df["Distinctiveness Category"].map(DISTINCTIVENESS_MAP).fillna(0).astype(float)
+            return df
+        except Exception as e:
+            print("Reading habitats failed:", e)
+    # fallback
+    sample = pd.DataFrame([
+        {"Broad Habitat Type": "Grassland", "Specific Habitat": "Improved grassland", "Distinctiveness Category": "Medium"},
+        {"Broad Habitat Type": "Woodland", "Specific Habitat": "Broadleaved woodland", "Distinctiveness Category": "High"},
+    ])
+    sample["Distinctiveness Score"] = sample["Distinctiveness Category"].map(DISTINCTIVENESS_MAP).fillna(0).astype(float)
+    return sample
+
+
+def load_years(csv_path):
+    """target_year.csv with a numeric "Multiplier"; small built-in table if unreadable."""
+    import pandas as pd
+
+    if os.path.exists(csv_path):
+        try:
+            df = pd.read_csv(csv_path, dtype=str).fillna("")
+            if "Multiplier" in df.columns:
+                df["Multiplier"] = pd.to_numeric(df["Multiplier"], errors="coerce").fillna(1.0)
+            else:
+                df["Multiplier"] = 1.0
+            return df
+        except Exception as e:
+            print("Reading years failed:", e)
+    return pd.DataFrame([{"Years": "5", "Multiplier": 1.05}, {"Years": "10", "Multiplier": 1.0}])
+
+
+def year_key(value):
+    """Normalise a "Years" entry so 5, "5", 5.0 and " 5 " all match the "5" row."""
+    s = str(value).strip()
+    if re.fullmatch(r"\d+\.0*", s):
+        s = s.split(".")[0]
+    return s
+
+
+class GainTables:
+    """Specific habitat -> distinctiveness and years -> multiplier lookups, built once."""
+
+    def __init__(self, habitats_df, years_df):
+        first = habitats_df.drop_duplicates("Specific Habitat")
+        self.distinctiveness = dict(zip(first["Specific Habitat"], first["Distinctiveness Score"].astype(float)))
+        self.year_multiplier = {}
+        for y, m in zip(years_df["Years"], years_df["Multiplier"]):
+            self.year_multiplier.setdefault(year_key(y), float(m))
+
+    def distinct_for(self, specific):
+        return self.distinctiveness.get(specific, 0.0)
+
+    def year_mult_for(self, years):
+        return self.year_multiplier.get(year_key(years), 1.0)
+
+
+# -------------------- Unit formula --------------------
+def gain_units(distinct, cond, strat, area, spat, diff, year_mult):
+    """Biodiversity units gained; works on scalars and on numpy/pandas arrays alike."""
+    return distinct * cond * strat * area * spat * diff * year_mult
+
+
+def calculate_gain_batch(parcels, tables):
+    """Score a table (or GeoDataFrame) of proposed parcels in one pass.
+
+    Expects the GAIN_INPUT_COLUMNS; a polygon layer without "Area (ha)" uses the
+    geometry area. Rows with missing or unknown inputs get NaN units and the
+    reason in "Gain issues". Returns a copy with the looked-up multipliers and
+    "Biodiversity Units" added.
+    """
+    import numpy as np
+    import pandas as pd
+
+    out = parcels.copy()
+    for col in GAIN_INPUT_COLUMNS:
+        if col not in out.columns:
+            if col == "Area (ha)" and hasattr(out, "set_geometry"):
+                out[col] = out.geometry.area / 10000.0
+            else:
+                out[col] = np.nan
+
+    def text(col):
+        return out[col].astype("string").str.strip()
+
+    distinct = text("Specific Habitat").map(tables.distinctiveness)
+    years = out["Years"].map(year_key, na_action="ignore")
+    year_mult = years.map(tables.year_multiplier)
+    cond = text("Condition").map(CONDITION_MAPPING)
+    diff = text("Difficulty").map(DIFFICULTY_MAPPING)
+    spat = text("Spatial Risk").map(SPATIAL_MAPPING)
+    strat = text("Strategic Significance").map(STRATEGIC_MAPPING)
+    area = pd.to_numeric(out["Area (ha)"], errors="coerce")
+
+    checks = [
+        ("Specific habitat", distinct), ("Target year", year_mult), ("Condition", cond),
+        ("Difficulty", diff), ("Spatial risk", spat), ("Strategic significance", strat),
+    ]
+    issues = pd.Series("", index=out.index, dtype=object)
+    for label, values in checks:
+        issues = issues.where(values.notna(), issues + label + "; ")
+    issues = issues.where(area > 0, issues + "Area (positive number); ")
+    ok = issues == ""
+
+    out["Distinctiveness"] = distinct.astype(float)
+    out["Year Multiplier"] = year_mult.astype(float)
+    out["Condition Score"] = cond.astype(float)
+    out["Difficulty Score"] = diff.astype(float)
+    out["Spatial Multiplier"] = spat.astype(float)
+    out["Strategic Multiplier"] = strat.astype(float)
+    units = gain_units(out["Distinctiveness"], out["Condition Score"], out["Strategic Multiplier"], area,
+                       out["Spatial Multiplier"], out["Difficulty Score"], out["Year Multiplier"])
+    out["Biodiversity Units"] = units.where(ok).round(3)
+    out["Gain issues"] = issues.str.rstrip("; ")
+    return out
+
+
+# -------------------- Batch I/O --------------------
+def read_gain_parcels(path):
+    """CSV table or any vector layer geopandas can read (GeoPackage, shapefile, ...)."""
+    if os.path.splitext(path)[1].lower() == ".csv":
+        import pandas as pd
+
+        return pd.read_csv(path, dtype=str)
+    import geopandas as gpd
+
+    return gpd.read_file(path)
+
+
+def write_gain_results(df, path):
+    """Write batch results in one go: .csv (geometry dropped) or a GeoPackage layer "gain".
+
+    Parcels read from a CSV have no geometry; in a GeoPackage they become an
+    attribute table.
+    """
+    import pandas as pd
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".gpkg":
+        import geopandas as gpd
+
+        if isinstance(df, gpd.GeoDataFrame):
+            df.to_file(path, driver="GPKG", layer="gain")
+        else:
+            import pyogrio
+
+            pyogrio.write_dataframe(df, path, layer="gain", driver="GPKG")
+    elif ext == ".csv":
+        pd.DataFrame(df).drop(columns=["geometry"], errors="ignore").to_csv(path, index=False)
+    else:
+        raise ValueError(f"{os.path.basename(path)}: gain results are written as .csv or .gpkg")
+    return path
+
+
+def run_gain_batch(input_path, output_path, habitats_csv, years_csv):
+    """Read parcels, score them against the lookup CSVs and write the results; returns the table."""
+    tables = GainTables(load_habitats(habitats_csv), load_years(years_csv))
+    result = calculate_gain_batch(read_gain_parcels(input_path), tables)
+    write_gain_results(result, output_path)
+    return result
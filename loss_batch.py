@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-scenario loss runs: many planned developments against one baseline.
+
+Design teams produce a stack of alternative site layouts (DXF or SHP) per
+campus. run_scenarios reads, cleans, scores and spatially indexes the
+baseline once - limited to the combined extent of all the layouts - and then
+intersects every layout with it on a thread pool (shapely and pyogrio release
+the GIL). Layouts go through the same load_plan / scoring rules as a single
+Loss tab run, so each scenario's figures match what the tab reports for it.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from typing import Dict
+
+import pandas as pd
+import shapely
+
+from loss_engine import (LossCancelled, LossError, LossOptions, LossResult, Progress, RepairReport, align_crs,
+                         baseline_region, check_file_distance, convert_if_needed, figures_only, load_baseline,
+                         load_plan, loss_against, plan_polygons, prepare_baseline)
+
+SCENARIO_EXTENSIONS = (".shp", ".dxf")
+SUMMARY_COLUMNS = ["Scenario", "Plan file", "Loss area (ha)", "Biodiversity units", "Loss features", "Note"]
+
+
+@dataclass
+class ScenarioResults:
+    """Comparison table (one row per scenario, SUMMARY_COLUMNS) plus each scenario's LossResult by plan file name.
+
+    The baseline is read with figures_only, so the results' layers carry the scoring columns only unless
+    LossOptions.baseline_columns names more.
+    """
+    summary: pd.DataFrame
+    results: Dict[str, LossResult] = field(default_factory=dict)
+    total_baseline_ha: float = 0.0
+    baseline_clipped: bool = False
+
+
+def scenario_files(directory):
+    """Plan files in directory, sorted by name.
+
+    <name>_conv.shp next to <name>.dxf is the DXF's own export (LossOptions.dxf_export)
+    and is skipped so the drawing is not counted twice.
+    """
+    names = sorted(n for n in os.listdir(directory) if os.path.splitext(n)[1].lower() in SCENARIO_EXTENSIONS)
+    drawings = {os.path.splitext(n)[0].lower() for n in names if n.lower().endswith(".dxf")}
+    out = []
+    for n in names:
+        stem, ext = os.path.splitext(n)
+        if ext.lower() == ".shp" and stem.lower().endswith("_conv") and stem[:-5].lower() in drawings:
+            continue
+        out.append(os.path.join(directory, n))
+    return out
+
+
+def scenario_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _load_plans(paths, options, workers, progress):
+    """{scenario: cleaned plan or the exception} - one bad file doesn't sink the batch."""
+    def load(path):
+        try:
+            return load_plan(path, options, Progress(cancel=progress.cancel))
+        except LossCancelled:
+            raise
+        except Exception as e:
+            return e
+
+    plans = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(load, p): p for p in paths}
+        for fut in as_completed(futures):
+            plans[futures[fut]] = fut.result()
+    return {p: plans[p] for p in paths}
+
+
+def run_scenarios(baseline_path, plans, options=None, progress=None, workers=None):
+    """Loss of every plan in plans (a directory or a list of .shp/.dxf paths) against one baseline.
+
+    Returns a ScenarioResults whose summary is sorted by biodiversity units lost.
+    A scenario that cannot be run (unreadable file, no polygons) keeps its row
+    with NaN figures and the reason in "Note"; one clear of the baseline shows
+    zero loss. progress sees the baseline load as the usual
+    read/repair/score stages and the scenarios as "intersect".
+    """
+    options = options or LossOptions()
+    progress = progress or Progress()
+    workers = workers or min(8, os.cpu_count() or 1)
+    paths = scenario_files(plans) if isinstance(plans, str) and os.path.isdir(plans) else list(plans)
+    if not paths:
+        raise LossError("No scenarios", "No .shp or .dxf planned development files were found.")
+
+    progress.stage("read")
+    shp1 = convert_if_needed(baseline_path, is_baseline=True)
+    loaded = _load_plans(paths, options, workers, progress)
+    gdf2s = {p: g for p, g in loaded.items() if not isinstance(g, Exception)}
+    if not gdf2s:
+        raise LossError("No scenarios", "None of the planned development files could be read.")
+    # layouts in the wrong place, against the whole baseline file: the clipped read below sits where they are
+    misplaced = {}
+    if options.max_center_distance is not None:
+        for path, gdf2 in list(gdf2s.items()):
+            try:
+                check_file_distance(shp1, gdf2, options)
+            except LossError as e:
+                misplaced[path] = e
+                del gdf2s[path]
+        if not gdf2s:
+            raise next(iter(misplaced.values()))
+
+    # one baseline read covering every layout; layouts can sit far apart, so the
+    # union of their extents is read as a mask rather than one box around them all
+    region, load_options = None, figures_only(options)
+    if options.clip_baseline is not None:
+        region = shapely.union_all([baseline_region(shp1, g, options) for g in gdf2s.values()])
+        load_options = replace(load_options, clip_baseline="mask")
+    gdf1 = load_baseline(shp1, load_options, progress, region)
+    repair = RepairReport(**gdf1.attrs["repair"]) if gdf1.attrs.get("repair") else None
+    if options.target_crs is not None and gdf1.crs != options.target_crs:
+        gdf1 = gdf1.set_crs(options.target_crs) if gdf1.crs is None else gdf1.to_crs(options.target_crs)
+    base = prepare_baseline(gdf1, options, baseline_scored=True, progress=progress).build_tree()
+    print(f"Indexed {len(base.gdf)} baseline features for {len(paths)} scenarios")
+
+    def run_one(path):
+        _, gdf2, warnings = align_crs(base.gdf, gdf2s[path], options)
+        result = loss_against(base, plan_polygons(gdf2), options, Progress(cancel=progress.cancel), warnings)
+        result.baseline_clipped = region is not None
+        result.baseline_repair = repair
+        if gdf2.attrs.get("repair"):
+            result.planned_repair = RepairReport(**gdf2.attrs["repair"])
+        return result
+
+    nan = float("nan")
+    rows = {p: (nan, nan, 0, f"Could not read: {loaded[p]}") for p in paths if p not in gdf2s and p not in misplaced}
+    rows.update({p: (nan, nan, 0, str(e).replace("\n", " ")) for p, e in misplaced.items()})
+    results = {}
+    progress.stage("intersect")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_one, p): p for p in gdf2s}
+        try:
+            for n, fut in enumerate(as_completed(futures)):
+                path = futures[fut]
+                try:
+                    r = fut.result()
+                except LossCancelled:
+                    raise
+                except LossError as e:
+                    # a layout clear of the baseline loses nothing; anything else has no figures
+                    lost = 0.0 if e.title == "No overlap" else nan
+                    rows[path] = (lost, lost, 0, str(e).replace("\n", " "))
+                else:
+                    results[os.path.basename(path)] = r
+                    rows[path] = (r.total_loss_ha, r.total_units, len(r.intersection), "")
+                progress.stage("intersect", (n + 1) / len(futures))
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+    progress.stage("aggregate")
+    summary = pd.DataFrame(
+        [(scenario_name(p), os.path.basename(p), *rows[p]) for p in paths], columns=SUMMARY_COLUMNS)
+    summary = summary.sort_values("Biodiversity units", ascending=False, kind="stable").reset_index(drop=True)
+    return ScenarioResults(summary, results, base.total_baseline_ha, region is not None)
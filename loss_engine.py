@@ -0,0 +1,1246 @@
+# -*- coding: utf-8 -*-
+"""
+Headless biodiversity loss engine.
+
+Everything the Loss tab does between "Calculate Biodiversity Loss" and the
+results text lives here: input conversion, geometry cleaning, CRS handling,
+condition/distinctiveness scoring, the overlay and the unit formula.
+Nothing in this module imports tkinter, PIL or matplotlib, so it can be used
+from batch workers and scripts without a display.
+"""
+
+import os
+from dataclasses import asdict, dataclass, field, replace
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+POLYGON_TYPES = ["Polygon", "MultiPolygon"]
+REQUIRED_COLUMNS = ["Baseline Condition", "Baseline Distinctiveness", "Baseline Broad Habitat Type"]
+RESULT_COLUMNS = ["Loss area (ha)", "Condition score", "Distinctiveness score", "Significance score", "Biodiversity units"]
+HABITAT_COLUMN = "Baseline Broad Habitat Type"
+HABITAT_SUMMARY_COLUMNS = ["Habitat type", "Features", "Loss area (ha)", "Biodiversity units", "Share of units (%)",
+                           "Loss area by condition (ha)", "Loss area by distinctiveness (ha)"]
+
+
+class LossError(RuntimeError):
+    """A loss run that cannot produce a result. `title` is suitable for a dialog caption."""
+
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+
+
+class LossCancelled(LossError):
+    """Raised at the next cancellation point once a run's cancel event is set."""
+
+    def __init__(self):
+        super().__init__("Cancelled", "Loss calculation cancelled.")
+
+
+# -------------------- Progress & cancellation --------------------
+LOSS_STAGES = ("read", "repair", "score", "intersect", "aggregate")
+# pairs per shapely.intersection call in sindex_intersection; each chunk is a cancellation point
+INTERSECT_CHUNK = 50_000
+
+
+class Progress:
+    """Stage reporting and cooperative cancellation for one loss run.
+
+    callback(stage, overall) receives the stage name and the run's overall
+    progress in 0..1, which never goes backwards even though baseline and plan
+    pass through read/repair one after the other. cancel is anything with
+    is_set() (a threading.Event); every stage() call is a cancellation point.
+    """
+
+    def __init__(self, callback=None, cancel=None, stages=LOSS_STAGES):
+        self.callback = callback
+        self.cancel = cancel
+        self.stages = tuple(stages)
+        self.overall = 0.0
+
+    def check(self):
+        if self.cancel is not None and self.cancel.is_set():
+            raise LossCancelled()
+
+    def stage(self, name, fraction=0.0):
+        self.check()
+        if self.callback is None:
+            return
+        done = (self.stages.index(name) + min(max(fraction, 0.0), 1.0)) / len(self.stages)
+        self.overall = max(self.overall, done)
+        self.callback(name, self.overall)
+
+
+# -------------------- Geospatial helpers (robust) --------------------
+@dataclass
+class RepairReport:
+    """What repair_geometries did to a layer."""
+    total: int = 0
+    repaired: int = 0   # invalid polygons fixed with buffer(0) + make_valid
+    rebuilt: int = 0    # closed (Multi)LineStrings turned into polygons
+    dropped: int = 0    # null/empty features and anything that did not yield a polygon
+
+    def summary(self):
+        return (f"{self.total} features: {self.repaired} repaired, {self.rebuilt} rebuilt from lines, "
+                f"{self.dropped} dropped")
+
+
+@dataclass
+class PlanUnionReport:
+    """What union_plan did to a planned-development layer."""
+    features: int = 0        # plan polygons going in
+    merged: int = 0          # of those, folded into an overlapping or enclosing outline
+    overlap_ha: float = 0.0  # plan area drawn more than once, counted once after the union
+    pairs_before: int = 0    # baseline/plan pairs to intersect without and with the union
+    pairs_after: int = 0
+
+    def summary(self):
+        return (f"{self.features} features: {self.merged} merged into overlapping outlines, "
+                f"{self.overlap_ha:,.3f} ha of overlap removed, {self.pairs_before} -> {self.pairs_after} "
+                f"baseline pairs")
+
+
+def lines_to_polygons(lines):
+    """Rebuild polygons from an array of LineString/MultiLineString geometries in bulk.
+
+    Every part needs at least 3 distinct vertices once closed; a LineString gives
+    a Polygon and a MultiLineString a MultiPolygon of its valid parts. Entries
+    that cannot be rebuilt come back as None.
+    """
+    out = np.full(len(lines), None, dtype=object)
+    if not len(lines):
+        return out
+    parts, part_idx = shapely.get_parts(lines, return_index=True)
+    coords, coord_idx = shapely.get_coordinates(parts, return_index=True)
+    n = shapely.get_num_coordinates(parts)
+    starts = np.concatenate([[0], np.cumsum(n)[:-1]])
+    has = n > 0
+    closed = np.zeros(len(parts), dtype=bool)
+    closed[has] = (coords[starts[has]] == coords[starts[has] + n[has] - 1]).all(axis=1)
+    ok = (n >= 3) & (n + ~closed >= 4)
+
+    polys = np.full(len(parts), None, dtype=object)
+    take = np.isin(coord_idx, np.flatnonzero(ok))
+    if take.any():
+        # linearrings() closes open rings itself
+        rings = shapely.linearrings(coords[take], indices=np.unique(coord_idx[take], return_inverse=True)[1])
+        polys[ok] = shapely.polygons(rings)
+    ok &= pd.notna(polys)
+    ok[ok] = shapely.is_valid(polys[ok])
+
+    single = shapely.get_type_id(lines) == 1
+    sel = ok & single[part_idx]
+    out[part_idx[sel]] = polys[sel]
+    sel = ok & ~single[part_idx]
+    if sel.any():
+        multi = shapely.multipolygons(polys[sel], indices=part_idx[sel], out=np.full(len(lines), None, dtype=object))
+        good = pd.notna(multi) & ~single
+        good[good] = shapely.is_valid(multi[good])
+        out[good] = multi[good]
+    return out
+
+
+def repair_geometries(gdf):
+    """Vectorized clean-up of a layer; returns (gdf, RepairReport).
+
+    Only features that need work are touched: invalid polygons get buffer(0) +
+    make_valid, line work is rebuilt into polygons, other geometry types keep
+    their polygonal part. Valid polygons pass through unchanged.
+    """
+    report = RepairReport(total=len(gdf))
+    geoms = np.asarray(gdf.geometry.array).copy()
+    type_ids = shapely.get_type_id(geoms)  # -1 for missing
+    present = (type_ids >= 0) & ~shapely.is_empty(geoms)
+
+    polygonal = present & np.isin(type_ids, [3, 6])
+    invalid = np.flatnonzero(polygonal & ~shapely.is_valid(geoms))
+    if len(invalid):
+        geoms[invalid] = shapely.make_valid(shapely.buffer(geoms[invalid], 0))
+        report.repaired = len(invalid)
+
+    linear = np.flatnonzero(present & np.isin(type_ids, [1, 5]))
+    if len(linear):
+        rebuilt = lines_to_polygons(geoms[linear])
+        geoms[linear] = rebuilt
+        report.rebuilt = int(pd.notna(rebuilt).sum())
+
+    other = np.flatnonzero(present & ~np.isin(type_ids, [1, 3, 5, 6]))
+    if len(other):
+        geoms[other] = shapely.make_valid(shapely.buffer(geoms[other], 0))
+
+    geoms = _polygonal(geoms)
+    keep = pd.notna(geoms)
+    keep[keep] = ~shapely.is_empty(geoms[keep])
+    report.dropped = int((~keep).sum())
+
+    gdf = gdf[keep].copy()
+    gdf[gdf.geometry.name] = gpd.GeoSeries(geoms[keep], index=gdf.index, crs=gdf.crs)
+    return gdf, report
+
+
+def read_layer(path, columns=None, region=None, mask=False):
+    """gpd.read_file on the Arrow path (when pyarrow is installed) with pushed-down filters.
+
+    columns: attributes to read besides the geometry (names missing from the
+    file are skipped); None reads them all. region: only features intersecting
+    this geometry, given in the file's CRS - its bounding box, or the geometry
+    itself with mask=True.
+    """
+    import pyogrio
+
+    kwargs = {}
+    if columns is not None:
+        fields = set(pyogrio.read_info(path)["fields"])
+        kwargs["columns"] = [c for c in columns if c in fields]
+    if region is not None:
+        if mask:
+            kwargs["mask"] = region
+        else:
+            kwargs["bbox"] = tuple(region.bounds)
+        # spatially filtered reads come back in spatial-index order; sort on the FID to keep file order
+        kwargs["fid_as_index"] = True
+    try:
+        import pyarrow  # noqa: F401
+        kwargs["use_arrow"] = True
+    except ImportError:
+        pass
+    gdf = gpd.read_file(path, **kwargs)
+    if region is not None:
+        gdf = gdf.sort_index().reset_index(drop=True)
+    return gdf
+
+
+def load_and_fix(path, progress=None, columns=None):
+    """Load file through geopandas and clean geometries (see repair_geometries)."""
+    progress = progress or Progress()
+    progress.stage("read")
+    return fix_layer(read_layer(path, columns), path, progress)
+
+
+def fix_layer(gdf, path, progress=None):
+    """Clean an already-loaded layer; path is only used in messages."""
+    progress = progress or Progress()
+    if gdf.empty or not (gdf.geometry.notna() & ~gdf.geometry.is_empty).any():
+        raise RuntimeError("No valid geometries found")
+    progress.stage("repair")
+    gdf, report = repair_geometries(gdf)
+    print(f"Cleaned {os.path.basename(str(path))}: {report.summary()}")
+    if gdf.empty:
+        raise RuntimeError("All geometries invalid after cleaning")
+    gdf.attrs["repair"] = asdict(report)
+    return gdf
+
+
+DXF_POLYLINE_TYPES = ("LWPOLYLINE", "POLYLINE")
+
+
+def _layer_filter(layers=None, exclude_layers=None):
+    """Predicate on DXF layer names (case-insensitive, like CAD): whitelist, then blacklist."""
+    keep = {name.lower() for name in layers} if layers else None
+    drop = {name.lower() for name in exclude_layers or ()}
+    return lambda name: (keep is None or name.lower() in keep) and name.lower() not in drop
+
+
+def _dxf_polylines(input_path, streaming):
+    """(LW)POLYLINE entities of the modelspace.
+
+    streaming=True reads them in one pass with ezdxf's iterdxf add-on, which
+    skips every other entity without building it and never holds the whole
+    document; False loads the document with ezdxf.readfile first.
+    """
+    import ezdxf  # only needed for DXF input
+
+    if streaming:
+        from ezdxf.addons import iterdxf
+
+        return iterdxf.modelspace(input_path, types=DXF_POLYLINE_TYPES)
+    return ezdxf.readfile(input_path).modelspace().query(" ".join(DXF_POLYLINE_TYPES))
+
+
+def _vertex_array(entity):
+    """XY vertices of an LWPOLYLINE / POLYLINE as an (n, 2) float array."""
+    if entity.dxftype() == "LWPOLYLINE":
+        return np.asarray(entity.lwpoints.values, dtype=float).reshape(-1, 5)[:, :2]
+    return np.array([(v.dxf.location.x, v.dxf.location.y) for v in entity.vertices], dtype=float).reshape(-1, 2)
+
+
+def rings_to_polygons(parts):
+    """Close each (n, 2) vertex array into a ring and build all polygons in one shapely call.
+
+    Same rules as the old per-entity Polygon(points): at least 3 vertices, closed
+    if open, and only valid polygons are kept.
+    """
+    parts = [p for p in parts if len(p) >= 3]
+    if not parts:
+        return np.array([], dtype=object)
+    counts = np.array([len(p) for p in parts])
+    coords = np.concatenate(parts)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    closed = (coords[starts] == coords[ends - 1]).all(axis=1)
+    ok = counts + ~closed >= 4  # a ring needs 4 coordinates including the closing one
+    ring_ids = np.repeat(np.arange(len(parts)), counts)
+    take = ok[ring_ids]
+    rings = shapely.linearrings(coords[take], indices=np.repeat(np.arange(int(ok.sum())), counts[ok]))
+    polys = shapely.polygons(rings)
+    return polys[shapely.is_valid(polys)]
+
+
+def read_dxf(input_path, crs=None, layers=None, exclude_layers=None, streaming=True):
+    """Polygons from the (LW)POLYLINEs of a DXF modelspace, as an in-memory GeoDataFrame.
+
+    layers / exclude_layers restrict the conversion to (or away from) the
+    named CAD layers. Vertices are collected as numpy arrays and turned into
+    polygons in bulk (rings_to_polygons).
+    """
+    try:
+        wanted = _layer_filter(layers, exclude_layers)
+        parts = [_vertex_array(e) for e in _dxf_polylines(input_path, streaming) if wanted(e.dxf.layer)]
+        all_geometries = rings_to_polygons(parts)
+        if not len(all_geometries):
+            raise RuntimeError("No valid polyline geometries found in DXF")
+        # with crs=None the CRS is left unset - caller must ensure consistent CRS for accurate areas
+        gdf = gpd.GeoDataFrame(geometry=all_geometries, crs=crs)
+        print(f"Converted {len(all_geometries)} polygons from {os.path.basename(str(input_path))}")
+        return gdf
+    except Exception as e:
+        print(f"DXF conversion failed: {e}")
+        raise RuntimeError(f"DXF conversion failed: {e}")
+
+
+def dxf_export_path(input_path):
+    return os.path.splitext(input_path)[0] + "_conv.shp"
+
+
+def convert_dxf_layers(input_path, output_shp, crs=None):
+    """Convert DXF to Shapefile using ezdxf (closed polylines -> polygons)."""
+    read_dxf(input_path, crs=crs).to_file(output_shp)
+    print(f"Wrote {output_shp}")
+    return output_shp
+
+
+def convert_if_needed(input_path, is_baseline=False, dxf_crs=None):
+    ext = os.path.splitext(input_path)[1].lower()
+    if is_baseline:
+        if ext in (".shp", ".gpkg"):
+            return input_path
+        raise RuntimeError("Baseline must be .shp or .gpkg")
+    else:
+        if ext == ".dxf":
+            return convert_dxf_layers(input_path, dxf_export_path(input_path), crs=dxf_crs)
+        if ext == ".shp":
+            return input_path
+        raise RuntimeError("Planned development must be .shp or .dxf")
+
+
+# -------------------- Scoring --------------------
+class Rule(NamedTuple):
+    """Label matches when it contains any of any_of (if given), all of all_of and none of none_of."""
+    score: float
+    any_of: Tuple[str, ...] = ()
+    all_of: Tuple[str, ...] = ()
+    none_of: Tuple[str, ...] = ()
+
+    def matches(self, s):
+        return ((not self.any_of or any(x in s for x in self.any_of))
+                and all(x in s for x in self.all_of)
+                and not any(x in s for x in self.none_of))
+
+
+class ScoringRules:
+    """Ordered substring rules over stripped, lower-cased labels; the first matching rule wins.
+
+    score() evaluates the rules once per distinct raw label and broadcasts the
+    result through factorized codes, so cost follows the vocabulary size rather
+    than the feature count.
+    """
+
+    def __init__(self, name, rules):
+        self.name = name
+        self.rules = tuple(r if isinstance(r, Rule) else Rule(*r) for r in rules)
+
+    def __repr__(self):
+        return f"ScoringRules({self.name!r}, {list(self.rules)!r})"
+
+    def score_value(self, val):
+        if pd.isna(val):
+            return np.nan
+        s = str(val).strip().lower()
+        for rule in self.rules:
+            if rule.matches(s):
+                return rule.score
+        return np.nan
+
+    def score(self, values):
+        codes, uniques = pd.factorize(values)  # missing values get code -1
+        table = np.array([self.score_value(u) for u in uniques] + [np.nan], dtype=float)
+        return pd.Series(table[codes], index=values.index)
+
+
+CONDITION_RULES = ScoringRules("condition", [
+    Rule(3.0, ("good",), none_of=("fairly",)),
+    Rule(2.5, ("fairly good", "2.5")),
+    Rule(2.0, ("moderate",)),
+    Rule(1.5, all_of=("fairly", "poor")),
+    Rule(1.0, ("poor",), none_of=("fairly",)),
+])
+
+DISTINCT_RULES = ScoringRules("distinctiveness", [
+    Rule(8, ("v.high", "very high", "8")),
+    Rule(6, ("high",), none_of=("very",)),
+    Rule(4, ("medium",)),
+    Rule(2, ("low",), none_of=("very",)),
+    Rule(0, ("v.low", "very low")),
+])
+
+
+def unmapped_labels(gdf1, label_col, score_col):
+    """Raw labels whose score came out NaN, with feature counts (missing labels included)."""
+    if label_col not in gdf1.columns:
+        return {}
+    return gdf1.loc[gdf1[score_col].isna(), label_col].value_counts(dropna=False).to_dict()
+
+
+# -------------------- Options & result --------------------
+@dataclass
+class LossOptions:
+    """Knobs for a loss run. Defaults reproduce the loss figures and exported attributes of BiodiversityTool_Nov2025's
+    Loss tab; unlike the original tab, total_baseline_ha covers only the plan's extent unless clip_baseline=None."""
+    significance: float = 1.0
+    # None: keep the baseline CRS and bring the plan onto it; otherwise force both layers to this CRS
+    target_crs: Optional[str] = None
+    # reject runs whose layer centres are further apart than this (map units); None disables the check
+    max_center_distance: Optional[float] = None
+    require_columns: bool = False
+    decimals: int = 4
+    # treat unmapped condition/distinctiveness scores as 0 in the unit formula (NaN otherwise)
+    fill_unscored: bool = True
+    condition_rules: ScoringRules = CONDITION_RULES
+    distinct_rules: ScoringRules = DISTINCT_RULES
+    # STRtree-prefiltered intersection (sindex_intersection) instead of gpd.overlay; same output
+    use_sindex: bool = True
+    # > 1 runs the intersection tile by tile in a process pool (tiled_intersection)
+    workers: int = 0
+    # tiles per side for the tiled mode; None picks about 4 tiles per worker
+    tiles: Optional[int] = None
+    # write the converted DXF plan next to the drawing as <name>_conv.shp (runs work from memory either way)
+    dxf_export: bool = False
+    # only convert polylines on these CAD layers / skip these layers (names are case-insensitive)
+    dxf_layers: Optional[Tuple[str, ...]] = None
+    dxf_exclude_layers: Optional[Tuple[str, ...]] = None
+    # single-pass DXF reader that never loads the whole drawing (read_dxf); False uses ezdxf.readfile
+    dxf_streaming: bool = True
+    # baseline attributes to read besides the geometry; None reads every column, all of which the
+    # intersection layer carries. Runs that never export that layer can read fewer (figures_only)
+    baseline_columns: Optional[Tuple[str, ...]] = None
+    # read only baseline features touching the plan: "bbox" (plan extent), "mask" (plan footprint) or None;
+    # loss figures are unchanged but the baseline total then covers that area only
+    clip_baseline: Optional[str] = "bbox"
+    # on-disk cache of cleaned + scored baselines and converted DXF plans (baseline_cache); None disables it
+    cache_dir: Optional[str] = None
+    cache_max_bytes: int = 2 * 1024 ** 3
+    cache_max_age_days: float = 30
+    # merge overlapping / nested plan outlines before intersecting (union_plan), so no area is lost twice
+    union_plan: bool = False
+    # snap both layers to this precision grid (map units: 0.001 = 1 mm, 0.01 = 1 cm) before intersecting,
+    # see snap_to_grid; None intersects at full precision
+    grid_size: Optional[float] = None
+
+
+def figures_only(options):
+    """options for a run whose intersection layer is not exported: when baseline_columns is None, only the
+    columns the figures, habitat summary and maps use are read."""
+    if options.baseline_columns is not None:
+        return options
+    return replace(options, baseline_columns=tuple(REQUIRED_COLUMNS))
+
+
+@dataclass
+class LossResult:
+    """Outcome of one loss assessment."""
+    baseline: gpd.GeoDataFrame
+    intersection: gpd.GeoDataFrame
+    total_baseline_ha: float
+    total_loss_ha: float
+    total_units: float
+    unmapped_condition: int = 0
+    unmapped_distinctiveness: int = 0
+    warnings: List[str] = field(default_factory=list)
+    baseline_repair: Optional[RepairReport] = None
+    planned_repair: Optional[RepairReport] = None
+    # baseline (and total_baseline_ha) restricted to the plan's extent, see LossOptions.clip_baseline
+    baseline_clipped: bool = False
+    # loss per baseline habitat type (habitat_summary), filled at the aggregate stage
+    habitats: Optional[pd.DataFrame] = None
+    # what union_plan merged, with LossOptions.union_plan
+    plan_union: Optional[PlanUnionReport] = None
+    # with LossOptions.grid_size: fragments thinner than the grid that snapping removed (None when not counted)
+    slivers_removed: Optional[int] = None
+
+
+# -------------------- Pipeline stages --------------------
+def align_crs(gdf1, gdf2, options):
+    """Put baseline (gdf1) and plan (gdf2) in one CRS. Returns (gdf1, gdf2, warnings)."""
+    warnings = []
+    if options.target_crs is not None:
+        if gdf1.crs is None:
+            gdf1 = gdf1.set_crs(options.target_crs)
+        elif gdf1.crs != options.target_crs:
+            gdf1 = gdf1.to_crs(options.target_crs)
+        if gdf2.crs is None:
+            gdf2 = gdf2.set_crs(options.target_crs)
+        elif gdf2.crs != options.target_crs:
+            gdf2 = gdf2.to_crs(options.target_crs)
+        return gdf1, gdf2, warnings
+
+    if gdf1.crs is None:
+        warnings.append("Baseline layer has no CRS. Proceeding, but areas may be wrong; "
+                        "ensure your layers use a projected CRS.")
+    if gdf2.crs is None and gdf1.crs is not None:
+        # Assign baseline CRS to second layer
+        gdf2 = gdf2.set_crs(gdf1.crs, allow_override=True)
+    if gdf1.crs is not None and gdf1.crs != gdf2.crs:
+        # Reproject planned layer to baseline CRS
+        gdf2 = gdf2.to_crs(gdf1.crs)
+    return gdf1, gdf2, warnings
+
+
+def check_center_distance(gdf1, gdf2, max_distance):
+    """Raise LossError when the two layers are obviously in different places."""
+    b = gdf1.total_bounds
+    p = gdf2.total_bounds
+    baseline_center_x, baseline_center_y = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+    planned_center_x, planned_center_y = (p[0] + p[2]) / 2, (p[1] + p[3]) / 2
+    distance_x = abs(baseline_center_x - planned_center_x)
+    distance_y = abs(baseline_center_y - planned_center_y)
+    if distance_x > max_distance or distance_y > max_distance:
+        raise LossError(
+            "Spatial Mismatch",
+            f"The selected files are in different locations!\n\n"
+            f"Baseline center: ({baseline_center_x:.0f}, {baseline_center_y:.0f})\n"
+            f"Planned center: ({planned_center_x:.0f}, {planned_center_y:.0f})\n"
+            f"Distance: {max(distance_x, distance_y):.0f}m apart\n\n"
+            "Please select files that cover the same geographic area."
+        )
+
+
+def check_file_distance(path, gdf2, options):
+    """check_center_distance between a baseline file's whole extent (from its header) and the plan.
+
+    Runs that read the baseline clipped to the plan (clip_baseline) check
+    this before reading: the clipped layer always sits where the plan is.
+    """
+    import pyogrio
+
+    info = pyogrio.read_info(path, force_total_bounds=True)
+    extent = gpd.GeoDataFrame(geometry=[shapely.box(*info["total_bounds"])], crs=info["crs"])
+    extent, gdf2, _ = align_crs(extent, gdf2, options)
+    check_center_distance(extent, gdf2, options.max_center_distance)
+
+
+def check_required_columns(gdf1):
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in gdf1.columns]
+    if missing_cols:
+        raise LossError("Missing Data", f"Required columns missing:\n{', '.join(missing_cols)}")
+
+
+def score_baseline(gdf1, options):
+    """Add condition/distinctiveness/significance scores to the baseline."""
+    empty = pd.Series([np.nan] * len(gdf1), index=gdf1.index)
+    gdf1 = gdf1.copy()
+    gdf1["Condition score"] = options.condition_rules.score(gdf1.get("Baseline Condition", empty))
+    gdf1["Distinctiveness score"] = options.distinct_rules.score(gdf1.get("Baseline Distinctiveness", empty))
+    gdf1["Significance score"] = options.significance
+    return gdf1
+
+
+def drop_urban(gdf1):
+    """Filter out Urban if present"""
+    if "Baseline Broad Habitat Type" in gdf1.columns:
+        gdf1 = gdf1[gdf1["Baseline Broad Habitat Type"].astype(str).str.lower() != "urban"]
+    return gdf1
+
+
+def scoring_fingerprint(options):
+    """Stable description of the scoring rules, used to key cached scored baselines."""
+    return f"{options.condition_rules!r}|{options.distinct_rules!r}"
+
+
+def _unit_values(area_m2, cond, dist, sig, significance, decimals, fill_unscored):
+    """Loss area (ha) and biodiversity units as arrays; the one place the unit formula lives."""
+    loss_ha = np.round(np.asarray(area_m2, dtype=float) / 10000.0, decimals)
+    cond = np.asarray(cond, dtype=float)
+    dist = np.asarray(dist, dtype=float)
+    sig = np.asarray(sig, dtype=float)
+    sig = np.where(np.isnan(sig), significance, sig)
+    if fill_unscored:
+        cond = np.where(np.isnan(cond), 0, cond)
+        dist = np.where(np.isnan(dist), 0, dist)
+    return loss_ha, np.round(loss_ha * cond * sig * dist, decimals)
+
+
+def compute_units(intersection, options):
+    """Fill "Loss area (ha)" and "Biodiversity units" on an intersection layer."""
+    loss_ha, units = _unit_values(
+        intersection.geometry.area, intersection["Condition score"], intersection["Distinctiveness score"],
+        intersection["Significance score"], options.significance, options.decimals, options.fill_unscored)
+    intersection["Loss area (ha)"] = loss_ha
+    intersection["Biodiversity units"] = units
+    return intersection
+
+
+def _polygonal(geoms):
+    """Reduce an array of intersection results to their polygonal part (None when there is none)."""
+    type_ids = shapely.get_type_id(geoms)
+    out = np.where(np.isin(type_ids, [3, 6]), geoms, None)
+    # Collections (polygon + touching line/point) are rare; merge their polygon parts like overlay does
+    for k in np.flatnonzero(type_ids == 7):
+        parts = shapely.get_parts(geoms[k])
+        parts = parts[np.isin(shapely.get_type_id(parts), [3, 6])]
+        if len(parts):
+            out[k] = shapely.union_all(parts)
+    return out
+
+
+def _intersection_pairs(base_geoms, plan_geoms, base_tree=None):
+    """Candidate pairs (i, j) of intersecting baseline/plan geometries, sorted like overlay.
+
+    base_tree, an STRtree over base_geoms, is queried with the plan instead of
+    indexing the plan; worth it when one baseline meets many plans.
+    """
+    if base_tree is not None:
+        j, i = base_tree.query(plan_geoms, predicate="intersects")
+        order = np.lexsort((j, i))
+        return i[order], j[order]
+    # cheap bbox prefilter against the plan extent before touching the tree
+    xmin, ymin = shapely.bounds(plan_geoms)[:, :2].min(axis=0)
+    xmax, ymax = shapely.bounds(plan_geoms)[:, 2:].max(axis=0)
+    b = shapely.bounds(base_geoms)
+    near = np.flatnonzero((b[:, 0] <= xmax) & (b[:, 2] >= xmin) & (b[:, 1] <= ymax) & (b[:, 3] >= ymin))
+
+    tree = shapely.STRtree(plan_geoms)
+    i_near, j = tree.query(base_geoms[near], predicate="intersects")
+    i = near[i_near]
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
+
+def _intersect_pairs(base_geoms, plan_geoms, i, j):
+    """Polygonal intersections of the given pairs; returns (kept pair positions, geometries)."""
+    geoms = shapely.intersection(base_geoms[i], plan_geoms[j])
+    invalid = ~shapely.is_valid(geoms)
+    if invalid.any():
+        geoms[invalid] = shapely.make_valid(geoms[invalid])
+    geoms = _polygonal(geoms)
+    # snapped inputs (snap_to_grid) can meet in nothing at all
+    keep = np.flatnonzero(pd.notna(geoms) & ~shapely.is_empty(geoms))
+    return keep, geoms[keep]
+
+
+# -------------------- Precision grid --------------------
+def snap_to_grid(geoms, grid_size):
+    """Copy of geoms on a grid_size precision grid, for intersecting.
+
+    Vertices closer than half a grid cell to the line through their neighbours
+    carry only digitising noise at that precision and are dropped first
+    (Douglas-Peucker), then every coordinate is rounded to the grid. Edges that
+    nearly coincide in the two layers then coincide exactly, so they meet in a
+    line instead of a sliver polygon. The few rings rounding folds are repaired;
+    features thinner than the grid collapse to None.
+    """
+    simple = shapely.simplify(geoms, grid_size / 2, preserve_topology=False)
+    snapped = shapely.set_precision(simple, grid_size, mode="pointwise")
+    invalid = ~shapely.is_valid(snapped)
+    if invalid.any():
+        snapped[invalid] = _polygonal(shapely.make_valid(snapped[invalid]))
+    snapped[shapely.is_empty(snapped)] = None
+    return snapped
+
+
+def _snap_pairs(base_geoms, plan_geoms, i, grid_size):
+    """snap_to_grid of the plan and of the baseline rows in i (the only ones intersected)."""
+    base_snapped = base_geoms.copy()
+    rows = np.unique(i)
+    base_snapped[rows] = snap_to_grid(base_geoms[rows], grid_size)
+    return base_snapped, snap_to_grid(plan_geoms, grid_size)
+
+
+def _slivers(base_geoms, plan_geoms, i, j, keep):
+    """Plan position of each pair dropped on the grid (not in keep) whose input outlines did overlap in area."""
+    lost = np.setdiff1d(np.arange(len(i)), keep)
+    if not len(lost):
+        return np.array([], dtype=int)
+    return j[lost][shapely.relate_pattern(base_geoms[i[lost]], plan_geoms[j[lost]], "2********")]
+
+
+def _intersection_frame(gdf1, gdf2, i, j, geoms):
+    """Join baseline row i and plan row j attributes onto each intersection geometry."""
+    geom_col = gdf1.geometry.name
+    left = gdf1.drop(columns=geom_col).iloc[i].reset_index(drop=True)
+    right = gdf2.drop(columns=gdf2.geometry.name).iloc[j].reset_index(drop=True)
+    common = left.columns.intersection(right.columns)
+    left = left.rename(columns={c: f"{c}_1" for c in common})
+    right = right.rename(columns={c: f"{c}_2" for c in common})
+    data = pd.concat([left, right], axis=1)
+    data[geom_col] = geoms
+    return gpd.GeoDataFrame(data, geometry=geom_col, crs=gdf1.crs)
+
+
+def sindex_intersection(gdf1, gdf2, progress=None, base_tree=None, return_pairs=False, grid_size=None):
+    """Intersect polygon layers gdf1 and gdf2 through an STRtree bulk query.
+
+    Gives the rows, columns and geometries of
+    gpd.overlay(gdf1, gdf2, how="intersection", keep_geom_type=True), but only
+    baseline features inside the plan extent are queried and shapely.intersection
+    runs on candidate pairs alone. Inputs are assumed valid (see load_and_fix).
+    base_tree: a prebuilt STRtree over gdf1's geometries (PreparedBaseline.tree).
+    return_pairs=True also returns each row's gdf1 and gdf2 positions: (frame, i, j).
+    grid_size intersects the layers on that precision grid (snap_to_grid); the
+    number of slivers it removed is left in frame.attrs["slivers"] (and, with
+    return_pairs, the count per gdf2 row in frame.attrs["slivers_by_plan"]).
+    """
+    progress = progress or Progress()
+    base_geoms = np.asarray(gdf1.geometry.array)
+    plan_geoms = np.asarray(gdf2.geometry.array)
+    i, j = _intersection_pairs(base_geoms, plan_geoms, base_tree)
+    slivers = [np.array([], dtype=int)]
+    snapped = _snap_pairs(base_geoms, plan_geoms, i, grid_size) if grid_size else (base_geoms, plan_geoms)
+    keep, geoms = [np.array([], dtype=int)], [np.array([], dtype=object)]
+    for start in range(0, len(i), INTERSECT_CHUNK):
+        progress.stage("intersect", start / len(i))
+        stop = start + INTERSECT_CHUNK
+        k, g = _intersect_pairs(*snapped, i[start:stop], j[start:stop])
+        if grid_size:
+            slivers.append(_slivers(base_geoms, plan_geoms, i[start:stop], j[start:stop], k))
+        keep.append(k + start)
+        geoms.append(g)
+    keep, geoms = np.concatenate(keep), np.concatenate(geoms)
+    frame = _intersection_frame(gdf1, gdf2, i[keep], j[keep], geoms)
+    if grid_size:
+        slivers = np.concatenate(slivers)
+        frame.attrs["slivers"] = len(slivers)
+        if return_pairs:
+            frame.attrs["slivers_by_plan"] = np.bincount(slivers, minlength=len(plan_geoms)).tolist()
+    return (frame, i[keep], j[keep]) if return_pairs else frame
+
+
+# -------------------- Tiled / multi-process execution --------------------
+def _tile_grid(bounds, tiles):
+    """Split bounds into tiles x tiles cells; returns (x edges, y edges)."""
+    xmin, ymin, xmax, ymax = bounds
+    return np.linspace(xmin, xmax, tiles + 1), np.linspace(ymin, ymax, tiles + 1)
+
+
+def _tile_of(x, y, xs, ys):
+    """Tile (col, row) owning each point; cells are half-open except the last one."""
+    col = np.clip(np.searchsorted(xs, x, side="right") - 1, 0, len(xs) - 2)
+    row = np.clip(np.searchsorted(ys, y, side="right") - 1, 0, len(ys) - 2)
+    return col, row
+
+
+def _loss_tile(task):
+    """Worker: intersections and units for the pairs owned by one tile.
+
+    A pair belongs to the tile holding the lower-left corner of the overlap of
+    the two bounding boxes, so features crossing tile borders are intersected
+    in full exactly once and per-row rounding matches the serial path.
+    """
+    (tile_col, tile_row, xs, ys, base_idx, base_geoms, plan_idx, plan_geoms,
+     cond, dist, sig, significance, decimals, fill_unscored, grid_size) = task
+    i, j = _intersection_pairs(base_geoms, plan_geoms)
+    bb = shapely.bounds(base_geoms[i])
+    pb = shapely.bounds(plan_geoms[j])
+    col, row = _tile_of(np.maximum(bb[:, 0], pb[:, 0]), np.maximum(bb[:, 1], pb[:, 1]), xs, ys)
+    own = (col == tile_col) & (row == tile_row)
+    i, j = i[own], j[own]
+    slivers = 0
+    snapped = _snap_pairs(base_geoms, plan_geoms, i, grid_size) if grid_size else (base_geoms, plan_geoms)
+    keep, geoms = _intersect_pairs(*snapped, i, j)
+    if grid_size:
+        slivers = len(_slivers(base_geoms, plan_geoms, i, j, keep))
+    i, j = i[keep], j[keep]
+    loss_ha, units = _unit_values(shapely.area(geoms), cond[i], dist[i], sig[i],
+                                  significance, decimals, fill_unscored)
+    return base_idx[i], plan_idx[j], geoms, loss_ha, units, slivers
+
+
+def tiled_intersection(gdf1, gdf2, options, progress=None):
+    """Loss intersection split over a grid of tiles and run in a process pool.
+
+    Same rows, geometries and unit values as sindex_intersection + compute_units.
+    options.tiles sets the grid (tiles x tiles, default about 4 tiles per worker)
+    and options.workers the pool size. A cancel drops the tiles not yet started.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    progress = progress or Progress()
+    base_geoms = np.asarray(gdf1.geometry.array)
+    plan_geoms = np.asarray(gdf2.geometry.array)
+    workers = max(1, options.workers)
+    tiles = options.tiles or int(np.ceil(np.sqrt(4 * workers)))
+    xs, ys = _tile_grid(gdf2.total_bounds, tiles)
+
+    cond = gdf1["Condition score"].to_numpy(dtype=float)
+    dist = gdf1["Distinctiveness score"].to_numpy(dtype=float)
+    sig = gdf1["Significance score"].to_numpy(dtype=float)
+    bb = shapely.bounds(base_geoms)
+    pb = shapely.bounds(plan_geoms)
+
+    tasks = []
+    for c in range(tiles):
+        for r in range(tiles):
+            x0, x1, y0, y1 = xs[c], xs[c + 1], ys[r], ys[r + 1]
+            p_idx = np.flatnonzero((pb[:, 0] <= x1) & (pb[:, 2] >= x0) & (pb[:, 1] <= y1) & (pb[:, 3] >= y0))
+            if not len(p_idx):
+                continue
+            b_idx = np.flatnonzero((bb[:, 0] <= x1) & (bb[:, 2] >= x0) & (bb[:, 1] <= y1) & (bb[:, 3] >= y0))
+            if not len(b_idx):
+                continue
+            tasks.append((c, r, xs, ys, b_idx, base_geoms[b_idx], p_idx, plan_geoms[p_idx],
+                          cond[b_idx], dist[b_idx], sig[b_idx],
+                          options.significance, options.decimals, options.fill_unscored, options.grid_size))
+
+    if workers == 1:
+        parts = []
+        for n, t in enumerate(tasks):
+            progress.stage("intersect", n / len(tasks))
+            parts.append(_loss_tile(t))
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [pool.submit(_loss_tile, t) for t in tasks]
+            for n, _ in enumerate(as_completed(futures)):
+                progress.stage("intersect", (n + 1) / len(tasks))
+            parts = [f.result() for f in futures]
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    slivers = sum(p[5] for p in parts)
+    if parts:
+        i, j, geoms, loss_ha, units = (np.concatenate(x) for x in list(zip(*parts))[:5])
+    else:
+        i = j = np.array([], dtype=int)
+        geoms = np.array([], dtype=object)
+        loss_ha = units = np.array([], dtype=float)
+    order = np.lexsort((j, i))
+    intersection = _intersection_frame(gdf1, gdf2, i[order], j[order], geoms[order])
+    intersection["Loss area (ha)"] = loss_ha[order]
+    intersection["Biodiversity units"] = units[order]
+    if options.grid_size:
+        intersection.attrs["slivers"] = slivers
+    return intersection
+
+
+def intersect_loss(gdf1, gdf2, options, progress=None, base_tree=None):
+    """Overlay scored baseline with the plan and apply the unit formula."""
+    progress = progress or Progress()
+    progress.stage("intersect")
+    if options.workers > 1:
+        intersection = tiled_intersection(gdf1, gdf2, options, progress)
+    elif options.use_sindex:
+        intersection = compute_units(sindex_intersection(gdf1, gdf2, progress, base_tree,
+                                                         grid_size=options.grid_size), options)
+    else:
+        if options.grid_size:
+            # whole layers on the grid; slivers are not counted on this path
+            gdf1 = gdf1.set_geometry(snap_to_grid(np.asarray(gdf1.geometry.array), options.grid_size))
+            gdf2 = gdf2.set_geometry(snap_to_grid(np.asarray(gdf2.geometry.array), options.grid_size))
+            gdf1, gdf2 = gdf1[gdf1.geometry.notna()], gdf2[gdf2.geometry.notna()]
+        intersection = gpd.overlay(gdf1, gdf2, how="intersection", keep_geom_type=True)
+        intersection = intersection[intersection.geometry.type.isin(POLYGON_TYPES)]
+        intersection = compute_units(intersection, options)
+    if intersection.empty:
+        raise LossError("No overlap", "No overlap between baseline and planned development after cleaning.")
+    return intersection
+
+
+@dataclass
+class PreparedBaseline:
+    """A baseline cleaned down to scored, non-urban polygons (prepare_baseline), reusable across plans."""
+    gdf: gpd.GeoDataFrame
+    total_baseline_ha: float
+    unmapped_condition: int = 0
+    unmapped_distinctiveness: int = 0
+    warnings: List[str] = field(default_factory=list)
+    # STRtree over gdf's geometries for sindex_intersection; build_tree() fills it in
+    tree: Optional[shapely.STRtree] = None
+
+    def build_tree(self):
+        if self.tree is None:
+            self.tree = shapely.STRtree(np.asarray(self.gdf.geometry.array))
+        return self
+
+
+def prepare_baseline(gdf1, options, baseline_scored=False, progress=None):
+    """Polygons, area, scores and the unmapped-label report for an aligned baseline.
+
+    baseline_scored=True means gdf1 already carries condition/distinctiveness
+    scores for options (e.g. it came from the baseline cache).
+    """
+    progress = progress or Progress()
+    gdf1 = gdf1[gdf1.geometry.type.isin(POLYGON_TYPES)]
+    if gdf1.empty:
+        raise LossError("Error", "Baseline contains no polygons after cleaning.")
+
+    gdf1 = gdf1.copy()
+    gdf1["area_m2"] = gdf1.geometry.area
+    total_baseline_ha = float(gdf1["area_m2"].sum() / 10000.0)
+
+    progress.stage("score")
+    if options.require_columns:
+        check_required_columns(gdf1)
+    if baseline_scored:
+        gdf1["Significance score"] = options.significance
+    else:
+        gdf1 = score_baseline(gdf1, options)
+    gdf1 = drop_urban(gdf1)
+    warnings = []
+    nan_cond = int(gdf1["Condition score"].isna().sum())
+    nan_dist = int(gdf1["Distinctiveness score"].isna().sum())
+    if nan_cond > 0 or nan_dist > 0:
+        vocab = []
+        # per column: a label such as 'N/A' can be unmapped in both, with different counts
+        for name, label_col, score_col in (("condition", "Baseline Condition", "Condition score"),
+                                           ("distinctiveness", "Baseline Distinctiveness", "Distinctiveness score")):
+            for label, n in unmapped_labels(gdf1, label_col, score_col).items():
+                print(f"Could not map {name} value: {label!r} ({n} features)")
+                vocab.append(label)
+        vocab = pd.Series(vocab, dtype=object).drop_duplicates().tolist()  # NaN-safe
+        labels = ", ".join(repr(v) for v in vocab[:10]) + (" ..." if len(vocab) > 10 else "")
+        warnings.append(f"Some values couldn't be mapped:\nCondition unmapped: {nan_cond}\n"
+                        f"Distinctiveness unmapped: {nan_dist}\nUnmapped labels: {labels}")
+    return PreparedBaseline(gdf1, total_baseline_ha, nan_cond, nan_dist, warnings)
+
+
+def plan_polygons(gdf2):
+    gdf2 = gdf2[gdf2.geometry.type.isin(POLYGON_TYPES)]
+    if gdf2.empty:
+        raise LossError("Error", "Planned development contains no polygons after cleaning.")
+    return gdf2
+
+
+def _overlap_groups(geoms):
+    """Group label per geometry (its group's first position); features whose interiors overlap share a group."""
+    a, b = shapely.STRtree(geoms).query(geoms, predicate="intersects")
+    pair = a < b
+    a, b = a[pair], b[pair]
+    # touching outlines (a coverage, e.g. adjacent plots) stay apart; only shared interior counts
+    inner = shapely.relate_pattern(geoms[a], geoms[b], "T********")
+    parent = list(range(len(geoms)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for x, y in zip(a[inner].tolist(), b[inner].tolist()):
+        rx, ry = find(x), find(y)
+        if rx != ry:
+            parent[max(rx, ry)] = min(rx, ry)
+    return np.array([find(x) for x in range(len(geoms))], dtype=int)
+
+
+def union_plan(gdf2, base=None):
+    """Merge plan polygons whose interiors overlap (building outlines inside site boundaries, redrawn plots).
+
+    Each group of overlapping features becomes one feature carrying the first
+    member's attributes and the union of their outlines; features that stand
+    alone or only touch others are kept as they are. Without this, every
+    baseline polygon under an overlap is cut and counted once per outline.
+    base (a PreparedBaseline in the same CRS) adds the baseline/plan pair
+    counts to the report. Returns (gdf2, PlanUnionReport).
+    """
+    geoms = np.asarray(gdf2.geometry.array)
+    labels = _overlap_groups(geoms)
+    first = labels == np.arange(len(geoms))
+    report = PlanUnionReport(features=len(geoms), merged=int((~first).sum()))
+    merged = geoms[first]
+    if report.merged:
+        merged = merged.copy()
+        slot = np.cumsum(first) - 1  # row of each group in the merged layer
+        for root, members in pd.Series(np.arange(len(geoms))).groupby(labels).indices.items():
+            if len(members) > 1:
+                merged[slot[root]] = shapely.union_all(geoms[members])
+        report.overlap_ha = float((shapely.area(geoms).sum() - shapely.area(merged).sum()) / 10000.0)
+        gdf2 = gdf2[first].set_geometry(merged)
+    if base is not None:
+        base_geoms = np.asarray(base.gdf.geometry.array)
+        report.pairs_before = len(_intersection_pairs(base_geoms, geoms, base.tree)[0])
+        report.pairs_after = (len(_intersection_pairs(base_geoms, merged, base.tree)[0]) if report.merged
+                              else report.pairs_before)
+    print(f"Plan union: {report.summary()}")
+    return gdf2, report
+
+
+def habitat_summary(intersection):
+    """Loss per baseline habitat type as HABITAT_SUMMARY_COLUMNS, most units first.
+
+    One groupby over habitat x condition score x distinctiveness score; the
+    per-habitat totals and the score breakdowns ("3: 1.20; 2: 0.45") come from
+    that small table, so thousands of habitat types cost no extra passes.
+    """
+    if intersection.empty:
+        return pd.DataFrame(columns=HABITAT_SUMMARY_COLUMNS)
+    if HABITAT_COLUMN in intersection.columns:
+        habitat = intersection[HABITAT_COLUMN]
+        habitat = habitat.where(habitat.notna(), "(not given)").astype(str)
+    else:
+        habitat = pd.Series("(not given)", index=intersection.index)
+    cells = (pd.DataFrame({
+        "habitat": habitat,
+        "condition": intersection["Condition score"],
+        "distinctiveness": intersection["Distinctiveness score"],
+        "area": intersection["Loss area (ha)"],
+        "units": intersection["Biodiversity units"],
+    }).groupby(["habitat", "condition", "distinctiveness"], dropna=False, sort=False)
+      .agg(features=("area", "size"), area=("area", "sum"), units=("units", "sum"))
+      .reset_index())
+
+    summary = cells.groupby("habitat", sort=False)[["features", "area", "units"]].sum()
+    total_units = summary["units"].sum()
+    summary["share"] = summary["units"] / total_units * 100 if total_units else 0.0
+    for score in ("condition", "distinctiveness"):
+        part = (cells.groupby(["habitat", score], dropna=False, sort=False)["area"].sum().reset_index()
+                .sort_values(["habitat", score], ascending=[True, False], na_position="last"))
+        # few distinct scores: format each once; the per-habitat join is a groupby string sum
+        labels = {v: "unscored" if pd.isna(v) else f"{v:g}" for v in part[score].unique()}
+        text = part[score].map(labels) + ": " + pd.Series(np.char.mod("%.2f", part["area"].to_numpy()),
+                                                          index=part.index) + "; "
+        summary[score] = text.groupby(part["habitat"], sort=False).sum().str[:-2]
+    summary = summary.reset_index()
+    summary.columns = HABITAT_SUMMARY_COLUMNS
+    return summary.sort_values(["Biodiversity units", "Loss area (ha)"], ascending=False,
+                               kind="stable").reset_index(drop=True)
+
+
+def format_habitat_summary(summary, limit=100):
+    """Text table of a habitat_summary for the results panel (main columns, first limit habitat types)."""
+    if summary is None or summary.empty:
+        return "(no loss)"
+    text = summary.head(limit)[HABITAT_SUMMARY_COLUMNS[:5]].to_string(index=False, float_format="{:,.3f}".format)
+    if len(summary) > limit:
+        text += f"\n... and {len(summary) - limit:,} more habitat types (all of them are in the CSV export)"
+    return text
+
+
+def habitat_summary_path(csv_path):
+    """Where the per-habitat CSV goes next to a results CSV: <name>_by_habitat.csv."""
+    root, ext = os.path.splitext(csv_path)
+    return f"{root}_by_habitat{ext or '.csv'}"
+
+
+def _report_slivers(intersection, options):
+    """Slivers the precision grid removed (sindex_intersection's count), printed for the console."""
+    slivers = intersection.attrs.get("slivers")
+    if options.grid_size and slivers is not None:
+        print(f"Precision grid {options.grid_size:g}: {slivers} sliver fragments removed")
+    return slivers
+
+
+def loss_against(base, gdf2, options, progress=None, warnings=()):
+    """LossResult for one plan, already in the baseline's CRS and polygon-only, against a PreparedBaseline."""
+    progress = progress or Progress()
+    plan_union = None
+    if options.union_plan:
+        progress.stage("intersect")
+        gdf2, plan_union = union_plan(gdf2, base)
+    intersection = intersect_loss(base.gdf, gdf2, options, progress, base.tree)
+    progress.stage("aggregate")
+    return LossResult(
+        baseline=base.gdf,
+        intersection=intersection,
+        total_baseline_ha=base.total_baseline_ha,
+        total_loss_ha=float(intersection["Loss area (ha)"].sum()),
+        total_units=float(intersection["Biodiversity units"].sum()),
+        unmapped_condition=base.unmapped_condition,
+        unmapped_distinctiveness=base.unmapped_distinctiveness,
+        warnings=list(warnings) + base.warnings,
+        habitats=habitat_summary(intersection),
+        plan_union=plan_union,
+        slivers_removed=_report_slivers(intersection, options),
+    )
+
+
+def compute_loss(gdf1, gdf2, options=None, baseline_scored=False, progress=None):
+    """Run the loss calculation on already-loaded baseline (gdf1) and plan (gdf2) layers.
+
+    baseline_scored=True means gdf1 already carries condition/distinctiveness
+    scores for options (e.g. it came from the baseline cache).
+    """
+    options = options or LossOptions()
+    progress = progress or Progress()
+    gdf1, gdf2, warnings = align_crs(gdf1, gdf2, options)
+
+    if options.max_center_distance is not None:
+        check_center_distance(gdf1, gdf2, options.max_center_distance)
+
+    # Keep polygon geometries only
+    base = prepare_baseline(gdf1, options, baseline_scored, progress)
+    gdf2 = plan_polygons(gdf2)
+    return loss_against(base, gdf2, options, progress, warnings)
+
+
+def baseline_region(path, gdf2, options):
+    """Plan extent (box) or footprint (options.clip_baseline) in the baseline file's CRS; None when not clipping."""
+    if options.clip_baseline is None:
+        return None
+    import pyogrio
+
+    base_crs = pyogrio.read_info(path)["crs"] or options.target_crs
+    plan = gdf2.geometry
+    if plan.crs is None and (options.target_crs or base_crs):
+        plan = plan.set_crs(options.target_crs or base_crs)
+    if plan.crs is not None and base_crs is not None and plan.crs != base_crs:
+        plan = plan.to_crs(base_crs)
+    if options.clip_baseline == "mask":
+        return shapely.union_all(np.asarray(plan.array))
+    return shapely.box(*plan.total_bounds)
+
+
+def _in_region(gdf, region):
+    """Rows whose geometry intersects region - the test pyogrio's bbox/mask filters apply."""
+    shapely.prepare(region)
+    return gdf[shapely.intersects(np.asarray(gdf.geometry.array), region)]
+
+
+def _require_features(gdf):
+    if gdf.empty:
+        raise LossError("No overlap", "No baseline features inside the planned development's extent.\n"
+                                      "Check that both files cover the same site and use the right CRS.")
+    return gdf
+
+
+def load_baseline(path, options, progress=None, region=None):
+    """Cleaned and scored baseline, served from the on-disk cache when options.cache_dir is set.
+
+    region (see baseline_region) limits it to features touching the plan: the
+    read itself is filtered without the cache; with it, the whole
+    column-pruned baseline is cached and filtered through the GeoParquet bbox
+    column.
+    """
+    progress = progress or Progress()
+    mask = options.clip_baseline == "mask"
+
+    def build(region=None):
+        progress.stage("read")
+        gdf = read_layer(path, options.baseline_columns, region, mask)
+        if region is not None:
+            _require_features(gdf)
+        gdf = fix_layer(gdf, path, progress)
+        if region is not None:
+            # the filtered read tests the raw geometry (its envelope, for bbox); keep the rows the cached
+            # path keeps, by the same test on the repaired geometry
+            gdf = _require_features(_in_region(gdf, region))
+        progress.stage("score")
+        return score_baseline(gdf, options)
+
+    if not options.cache_dir:
+        return build(region)
+    from baseline_cache import BaselineCache
+
+    progress.stage("read")
+    cache = BaselineCache(options.cache_dir, options.cache_max_bytes, options.cache_max_age_days)
+    key = cache.key_for(path, f"{scoring_fingerprint(options)}|{options.baseline_columns}")
+    gdf1 = cache.get(key, bbox=None if region is None else region.bounds)
+    if gdf1 is None:
+        gdf1 = build()
+        cache.put(key, gdf1)
+    if region is not None:
+        gdf1 = _require_features(_in_region(gdf1, region))
+    return gdf1
+
+
+def load_plan(path, options, progress=None):
+    """Cleaned planned-development layer. DXF drawings are converted in memory,
+    cached by content hash when options.cache_dir is set, and only written out
+    as <name>_conv.shp with options.dxf_export."""
+    progress = progress or Progress()
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".shp":
+        return load_and_fix(path, progress)
+    if ext != ".dxf":
+        raise RuntimeError("Planned development must be .shp or .dxf")
+
+    def build():
+        progress.stage("read")
+        gdf = read_dxf(path, crs=options.target_crs, layers=options.dxf_layers,
+                       exclude_layers=options.dxf_exclude_layers, streaming=options.dxf_streaming)
+        return fix_layer(gdf, path, progress)
+
+    if options.cache_dir:
+        from baseline_cache import BaselineCache
+
+        progress.stage("read")
+        cache = BaselineCache(options.cache_dir, options.cache_max_bytes, options.cache_max_age_days)
+        key = cache.key_for(path, f"dxf|{options.target_crs}|{options.dxf_layers}|{options.dxf_exclude_layers}")
+        gdf2 = cache.get(key)
+        if gdf2 is None:
+            gdf2 = build()
+            cache.put(key, gdf2)
+    else:
+        gdf2 = build()
+    if options.dxf_export:
+        out = dxf_export_path(path)
+        gpd.GeoDataFrame(geometry=gdf2.geometry, crs=gdf2.crs).to_file(out)
+        print(f"Wrote {out}")
+    return gdf2
+
+
+def run_loss(baseline_path, planned_path, options=None, progress=None):
+    """Full loss assessment from file paths: convert, clean, score, intersect.
+
+    progress (a Progress) receives stage updates and is checked for
+    cancellation between stages and intersection chunks.
+    """
+    options = options or LossOptions()
+    progress = progress or Progress()
+    progress.stage("read")
+    shp1 = convert_if_needed(baseline_path, is_baseline=True)
+    gdf2 = load_plan(planned_path, options, progress)
+    region = baseline_region(shp1, gdf2, options)
+    if region is not None and options.max_center_distance is not None:
+        check_file_distance(shp1, gdf2, options)
+    gdf1 = load_baseline(shp1, options, progress, region)
+    result = compute_loss(gdf1, gdf2, options, baseline_scored=True, progress=progress)
+    result.baseline_clipped = region is not None
+    if gdf1.attrs.get("repair"):
+        result.baseline_repair = RepairReport(**gdf1.attrs["repair"])
+    if gdf2.attrs.get("repair"):
+        result.planned_repair = RepairReport(**gdf2.attrs["repair"])
+    return result
+
+
+# -------------------- Export --------------------
+# save-dialog choices for result layers; the extension picks the writer in export_layer
+EXPORT_FILETYPES = [("Shapefile", "*.shp"), ("GeoParquet", "*.parquet"), ("FlatGeobuf", "*.fgb")]
+
+
+def export_layer(gdf, path):
+    """Write a result layer in one bulk write, format chosen by the extension.
+
+    .parquet (GeoParquet, with a bbox covering column) and .fgb (FlatGeobuf)
+    keep every column name as is; .shp truncates names to 10 characters
+    ("Biodiversity units" -> "Biodiversi") and writes sidecar files.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        gdf.to_parquet(path, index=False, write_covering_bbox=True)
+        return path
+    kwargs = {}
+    try:
+        import pyarrow  # noqa: F401
+        kwargs["use_arrow"] = True
+    except ImportError:
+        pass
+    if ext == ".fgb":
+        gdf.to_file(path, driver="FlatGeobuf", **kwargs)
+    elif ext == ".shp":
+        gdf.to_file(path, **kwargs)
+    else:
+        raise RuntimeError(f"Unsupported export format: {ext or path} (use .shp, .parquet or .fgb)")
+    return path
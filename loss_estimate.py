@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Quick loss estimates from a unit-density raster of the baseline.
+
+Early design meetings need approximate figures for many sketched layouts,
+not an exact overlay per sketch. A UnitRaster holds, for a cleaned and
+scored baseline at a chosen cell size, the biodiversity units and the
+habitat area inside every cell, as summed-area tables (integral images).
+Both are exact: each baseline polygon's outline is cut at the grid lines
+and every piece adds its share of area to the cells it crosses and the
+cells to its left, so no polygon is clipped cell by cell.
+
+A plan polygon is estimated the same way from its own outline: the pieces
+inside a cell add that cell's units times the share of the cell they
+enclose, and each piece adds the units of every cell to its left in the row,
+read from the summed-area table. The work grows with the plan's outline
+length in cells, not with its area or the baseline size. The estimate
+assumes units are spread evenly inside each cell, so it can only be off in
+cells the plan outline crosses; the error bound adds, per such cell, the
+inside share times the outside share times the cell's spread of unit
+density. The exact figures of run_loss lie within the bound, apart from
+its per-row rounding to LossOptions.decimals.
+
+LossEstimator.run takes run_loss's arguments and keeps the last raster,
+so sketches against one baseline only pay for their own outline.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from loss_engine import (LossError, LossOptions, Progress, align_crs, check_file_distance, convert_if_needed,
+                         figures_only, load_baseline, load_plan, plan_polygons, prepare_baseline, scoring_fingerprint,
+                         union_plan, _unit_values)
+from loss_incremental import _signature
+
+# raster cell size (map units: metres) when none is given
+DEFAULT_CELL = 10.0
+# refuse rasters larger than this (cells); four arrays of this size are kept
+MAX_CELLS = 25_000_000
+
+
+@dataclass
+class LossEstimate:
+    """Approximate loss of a plan; the exact figures lie within +/- the errors."""
+    units: float
+    units_error: float
+    loss_ha: float
+    loss_ha_error: float
+    features: int
+    cell: float
+
+    def summary(self):
+        return (f"{self.units:,.3f} +/- {self.units_error:,.3f} units, {self.loss_ha:,.3f} +/- "
+                f"{self.loss_ha_error:,.3f} ha ({self.features} features, {self.cell:g} m cells)")
+
+
+def _outline_pieces(geoms, x0, y0, cell):
+    """Outlines of polygons cut at every grid line, one row per piece.
+
+    Returns (row, col, x, dy, owner): the cell holding each piece, the
+    piece's mid x inside the cell and its signed height (both as fractions of
+    a cell; exterior rings run counter-clockwise, holes clockwise) and the
+    position in geoms of the polygon it belongs to.
+    """
+    parts, part_of = shapely.get_parts(geoms, return_index=True)
+    rings, ring_of = shapely.get_rings(parts, return_index=True)
+    exterior = np.r_[True, ring_of[1:] != ring_of[:-1]]
+    sign = np.where(shapely.is_ccw(rings) == exterior, 1.0, -1.0)
+    coords, index = shapely.get_coordinates(rings, return_index=True)
+    u = (coords[:, 0] - x0) / cell
+    v = (coords[:, 1] - y0) / cell
+    seg = np.flatnonzero(index[1:] == index[:-1])
+    ua, va, ub, vb = u[seg], v[seg], u[seg + 1], v[seg + 1]
+    ring = index[seg]
+
+    # parameters t along each segment where it crosses a vertical or horizontal grid line
+    ts, owners = [np.zeros(len(seg)), np.ones(len(seg))], [np.arange(len(seg))] * 2
+    for a, b in ((ua, ub), (va, vb)):
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        first = np.floor(lo) + 1
+        count = np.maximum(np.ceil(hi) - first, 0).astype(int)
+        s = np.repeat(np.arange(len(seg)), count)
+        k = first[s] + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        ts.append((k - a[s]) / (b[s] - a[s]))
+        owners.append(s)
+    t, s = np.concatenate(ts), np.concatenate(owners)
+    order = np.lexsort((t, s))
+    t, s = t[order], s[order]
+    piece = np.flatnonzero(s[1:] == s[:-1])
+    s, t0, t1 = s[piece], t[piece], t[piece + 1]
+
+    du, dv = ub - ua, vb - va
+    xm = ua[s] + du[s] * (t0 + t1) / 2
+    ym = va[s] + dv[s] * (t0 + t1) / 2
+    row, col = np.floor(ym).astype(int), np.floor(xm).astype(int)
+    return row, col, xm - col, dv[s] * (t1 - t0) * sign[ring[s]], part_of[ring_of[ring[s]]]
+
+
+def _cell_sums(pieces, weight, shape):
+    """Share of every cell covered by the polygons, weighted per polygon (rows bottom-up), from outline pieces."""
+    row, col, x, dy, owner = pieces
+    nr, nc = shape
+    w = weight[owner]
+    flat = row * nc + col
+    # a piece encloses x * dy of its own cell and all of dy of every cell to its left
+    own = np.bincount(flat, w * x * dy, nr * nc).reshape(nr, nc)
+    right = np.bincount(flat, w * dy, nr * nc).reshape(nr, nc)
+    return own + right[:, ::-1].cumsum(axis=1)[:, ::-1] - right
+
+
+def _summed_area(values):
+    """Summed-area table: sat[i, j] is the sum of values[:i, :j]."""
+    sat = np.zeros((values.shape[0] + 1, values.shape[1] + 1))
+    sat[1:, 1:] = values.cumsum(axis=0).cumsum(axis=1)
+    return sat
+
+
+class UnitRaster:
+    """Units and habitat area per cell of a scored baseline as summed-area tables, with their spread per cell.
+
+    Rows run bottom-up from (x0, y0). Values are per cell (units, m2); the
+    spread of a cell is how far its density varies inside it, times the cell
+    area: zero where no baseline outline crosses the cell.
+    """
+
+    def __init__(self, baseline_gdf, options=None, cell=DEFAULT_CELL):
+        """baseline_gdf: cleaned, scored, polygon-only baseline (PreparedBaseline.gdf), without overlaps."""
+        options = options or LossOptions()
+        self.cell = float(cell)
+        self.crs = baseline_gdf.crs
+        minx, miny, maxx, maxy = baseline_gdf.total_bounds
+        self.x0, self.y0 = np.floor(minx / cell) * cell, np.floor(miny / cell) * cell
+        # one spare row/column: outline pieces lying on the top or right edge fall into it
+        self.shape = (int((maxy - self.y0) // cell) + 1, int((maxx - self.x0) // cell) + 1)
+        if self.shape[0] * self.shape[1] > MAX_CELLS:
+            raise LossError("Raster too large", f"A {cell:g} m raster of this baseline needs "
+                                                f"{self.shape[0] * self.shape[1]:,} cells; choose a larger cell size.")
+        # units per m2 of each polygon: the unit formula for one m2, unrounded
+        _, density = _unit_values(np.full(len(baseline_gdf), 10000.0), baseline_gdf["Condition score"],
+                                  baseline_gdf["Distinctiveness score"], baseline_gdf["Significance score"],
+                                  options.significance, 12, options.fill_unscored)
+        density = np.nan_to_num(density / 10000.0)
+        pieces = _outline_pieces(np.asarray(baseline_gdf.geometry.array), self.x0, self.y0, self.cell)
+        area = self.cell ** 2
+        cover = _cell_sums(pieces, np.ones(len(density)), self.shape)
+        self.units_sat = _summed_area(_cell_sums(pieces, density, self.shape) * area)
+        self.area_sat = _summed_area(cover * area)
+        self.units_spread = self._spread(pieces, density, cover) * area
+        self.area_spread = self._spread(pieces, np.ones(len(density)), cover) * area
+
+    def _spread(self, pieces, weight, cover):
+        """Highest minus lowest weight of the polygons in each cell, 0 counting where the cell is not covered."""
+        row, col, _, _, owner = pieces
+        flat = row * self.shape[1] + col
+        order = np.argsort(flat, kind="stable")
+        flat, w = flat[order], weight[owner][order]
+        start = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]])
+        cells = flat[start]
+        high, low = np.maximum.reduceat(w, start), np.minimum.reduceat(w, start)
+        partial = cover.ravel()[cells] < 1 - 1e-9
+        high = np.where(partial, np.maximum(high, 0), high)
+        low = np.where(partial, np.minimum(low, 0), low)
+        spread = np.zeros(cover.size, dtype=np.float32)
+        spread[cells] = high - low
+        return spread.reshape(self.shape)
+
+    @property
+    def nbytes(self):
+        return self.units_sat.nbytes + self.area_sat.nbytes + self.units_spread.nbytes + self.area_spread.nbytes
+
+    def estimate(self, geoms):
+        """LossEstimate for an array of plan polygons, each footprint counted separately as in run_loss."""
+        geoms = np.asarray(geoms)
+        row, col, x, dy, owner = _outline_pieces(geoms, self.x0, self.y0, self.cell)
+        nr, nc = self.shape
+        keep = (row >= 0) & (row < nr)
+        row, col, x, dy, owner = row[keep], col[keep], x[keep], dy[keep], owner[keep]
+
+        # the share of each crossed cell inside its footprint, for the error bound
+        order = np.lexsort((col, row, owner))
+        row, col, x, dy, owner = row[order], col[order], x[order], dy[order], owner[order]
+        first = np.r_[True, (owner[1:] != owner[:-1]) | (row[1:] != row[:-1]) | (col[1:] != col[:-1])]
+        group = np.cumsum(first) - 1
+        own, height = np.bincount(group, x * dy), np.bincount(group, dy)
+        g_owner, g_row, g_col = owner[first], row[first], col[first]
+        line_first = np.r_[True, (g_owner[1:] != g_owner[:-1]) | (g_row[1:] != g_row[:-1])]
+        line = np.cumsum(line_first) - 1
+        upto = np.cumsum(height)
+        before_line = (upto - height)[line_first][line]
+        share = np.clip(own + np.bincount(line, height)[line] - (upto - before_line), 0, 1)
+        inside = (g_col >= 0) & (g_col < nc)
+        g_row, g_col, share = g_row[inside], g_col[inside], share[inside]
+        mixed = share * (1 - share)
+
+        # cells left of a piece in its row come from the summed-area table, cells it crosses pro rata
+        clipped = np.clip(col, 0, nc)
+        crossed = (col >= 0) & (col < nc)
+        c = np.where(crossed, col, 0)
+
+        def total(sat):
+            left = sat[row + 1, clipped] - sat[row, clipped]
+            here = np.where(crossed, sat[row + 1, c + 1] - sat[row, c + 1] - (sat[row + 1, c] - sat[row, c]), 0.0)
+            return float(np.sum(dy * left) + np.sum(x * dy * here))
+
+        return LossEstimate(
+            units=total(self.units_sat),
+            units_error=float(np.sum(mixed * self.units_spread[g_row, g_col])),
+            loss_ha=total(self.area_sat) / 10000.0,
+            loss_ha_error=float(np.sum(mixed * self.area_spread[g_row, g_col])) / 10000.0,
+            features=len(geoms),
+            cell=self.cell,
+        )
+
+
+class LossEstimator:
+    """Quick loss estimates against a baseline, keeping the unit raster of the last baseline and settings."""
+
+    def __init__(self, cell=DEFAULT_CELL):
+        self.cell = cell
+        self.raster = None
+        self._raster_key = None
+
+    def raster_for(self, shp1, options, progress=None):
+        """The UnitRaster of a baseline, built from the whole (cleaned, scored) layer when not cached."""
+        key = (shp1, _signature(shp1), scoring_fingerprint(options), options.significance, options.fill_unscored,
+               options.target_crs, options.baseline_columns, self.cell)
+        if self._raster_key != key:
+            self.raster = None
+            gdf1 = load_baseline(shp1, figures_only(options), progress)
+            gdf1, _, _ = align_crs(gdf1, gdf1.iloc[:0], options)
+            base = prepare_baseline(gdf1, options, baseline_scored=True, progress=progress)
+            self.raster = UnitRaster(base.gdf, options, self.cell)
+            self._raster_key = key
+            print(f"Unit raster: {self.raster.shape[0]} x {self.raster.shape[1]} cells of {self.cell:g} m "
+                  f"({self.raster.nbytes / 1024 ** 2:.0f} MB)")
+        return self.raster
+
+    def run(self, baseline_path, planned_path, options=None, progress=None):
+        """LossEstimate of planned_path against baseline_path; takes run_loss's arguments."""
+        options = options or LossOptions()
+        progress = progress or Progress()
+        progress.stage("read")
+        shp1 = convert_if_needed(baseline_path, is_baseline=True)
+        gdf2 = load_plan(planned_path, options, progress)
+        if options.max_center_distance is not None:
+            check_file_distance(shp1, gdf2, options)
+        raster = self.raster_for(shp1, options, progress)
+        _, gdf2, _ = align_crs(gpd.GeoDataFrame(geometry=[], crs=raster.crs), gdf2, options)
+        gdf2 = plan_polygons(gdf2)
+        if options.union_plan:
+            gdf2, _ = union_plan(gdf2)
+        progress.stage("intersect")
+        estimate = raster.estimate(np.asarray(gdf2.geometry.array))
+        progress.stage("aggregate")
+        print(f"Loss estimate: {estimate.summary()}")
+        return estimate
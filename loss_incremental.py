@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental loss runs: re-assess a layout that changed a little since the last run.
+
+Designers iterate by nudging one or two footprints and running the Loss tab
+again. An IncrementalLoss keeps the cleaned, scored baseline (read with some
+room around the plan) and the intersection rows of every footprint from the
+previous run, keyed by a hash of the footprint's geometry and attributes.
+The next run of the same baseline and settings only intersects footprints
+whose hash is new, drops the rows of footprints that are gone, and puts the
+table back in the order a full run gives, so the figures are the same as
+run_loss would report.
+
+IncrementalLoss.run takes run_loss's arguments, so it can be handed to
+LossWorker.submit as the runner. A different baseline file (or the same file
+changed on disk), other settings, other plan columns, or a plan outside the
+baseline area read last time start over with a full run.
+"""
+
+import hashlib
+import os
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from baseline_cache import source_files
+from loss_engine import (LossError, LossResult, Progress, RepairReport, align_crs, baseline_region,
+                         check_file_distance, compute_units, convert_if_needed, habitat_summary, load_baseline,
+                         load_plan, plan_polygons, prepare_baseline, sindex_intersection, union_plan,
+                         _report_slivers, _require_features)
+
+# baseline read around the plan, as a share of the plan extent, so nudged footprints stay inside it
+REGION_MARGIN = 0.25
+
+
+def feature_keys(gdf):
+    """One key per row: hash of the geometry (WKB) and attribute values, numbered when rows repeat."""
+    wkb = shapely.to_wkb(np.asarray(gdf.geometry.array), output_dimension=2)
+    attrs = gdf.drop(columns=gdf.geometry.name).astype(str).agg("\x1f".join, axis=1) if len(gdf.columns) > 1 \
+        else pd.Series("", index=gdf.index)
+    seen = {}
+    keys = []
+    for geom, values in zip(wkb, attrs):
+        digest = hashlib.sha1(geom + values.encode("utf-8")).hexdigest()
+        seen[digest] = seen.get(digest, 0) + 1
+        keys.append(f"{digest}:{seen[digest]}")
+    return np.array(keys, dtype=object)
+
+
+def _signature(path):
+    """Size and modification time of every file making up a layer."""
+    return tuple((str(p), os.stat(p).st_size, os.stat(p).st_mtime_ns) for p in source_files(path))
+
+
+class IncrementalLoss:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget the last run; the next one is a full run."""
+        self._baseline_key = None  # (path, file signature, options)
+        self._baseline = None      # cleaned, scored baseline around _region
+        self._region = None
+        self._tree = None          # STRtree over _baseline, to cut out each run's region
+        self._repair = None
+        self._forget_plan()
+        self.last_stats = {}
+
+    def _forget_plan(self):
+        self._plan_keys = set()    # feature keys of the last plan
+        self._slivers = {}         # with LossOptions.grid_size: slivers removed per plan feature key
+        self._plan_columns = None
+        self._rows = None          # last intersection table, with units
+        self._row_keys = np.array([], dtype=object)  # plan feature key of each row
+        self._row_base = np.array([], dtype=object)  # baseline index label of each row
+
+    # -------------------- Baseline --------------------
+    def _load_baseline(self, shp1, gdf2, options, progress):
+        """The baseline limited to the plan's region, read from disk only when the cached one does not cover it."""
+        region = baseline_region(shp1, gdf2, options)
+        key = (shp1, _signature(shp1), options)
+        covered = self._baseline is not None and self._baseline_key == key and (
+            self._region is None if region is None else self._region is not None and self._region.covers(region))
+        if not covered:
+            self.reset()
+            read_region = None
+            if region is not None:
+                # a padded box, even in mask mode: each run then cuts out its exact region
+                minx, miny, maxx, maxy = region.bounds
+                pad = REGION_MARGIN * max(maxx - minx, maxy - miny)
+                read_region = shapely.box(minx - pad, miny - pad, maxx + pad, maxy + pad)
+            self._baseline = load_baseline(shp1, replace(options, clip_baseline="bbox"), progress, read_region)
+            self._baseline_key, self._region = key, read_region
+            self._tree = shapely.STRtree(np.asarray(self._baseline.geometry.array))
+            self._repair = RepairReport(**self._baseline.attrs["repair"]) if self._baseline.attrs.get("repair") else None
+        progress.stage("read")
+        if region is None:
+            return self._baseline, False
+        # the rows _in_region would keep, found through the tree instead of testing every feature
+        rows = np.sort(self._tree.query(region, predicate="intersects"))
+        return _require_features(self._baseline.iloc[rows]), True
+
+    # -------------------- Run --------------------
+    def run(self, baseline_path, planned_path, options=None, progress=None):
+        """Loss of planned_path against baseline_path, recomputing only footprints that changed since the last run."""
+        from loss_engine import LossOptions
+
+        options = options or LossOptions()
+        progress = progress or Progress()
+        progress.stage("read")
+        shp1 = convert_if_needed(baseline_path, is_baseline=True)
+        gdf2 = load_plan(planned_path, options, progress)
+        if options.max_center_distance is not None:
+            # against the whole file: the baseline kept here is cut down to the plan's region
+            check_file_distance(shp1, gdf2, options)
+        gdf1, clipped = self._load_baseline(shp1, gdf2, options, progress)
+
+        gdf1, gdf2, warnings = align_crs(gdf1, gdf2, options)
+        base = prepare_baseline(gdf1, options, baseline_scored=True, progress=progress)
+        repair = RepairReport(**gdf2.attrs["repair"]) if gdf2.attrs.get("repair") else None
+        gdf2 = plan_polygons(gdf2)
+        plan_union = None
+        if options.union_plan:
+            gdf2, plan_union = union_plan(gdf2, base)
+        gdf2 = gdf2.reset_index(drop=True)
+
+        progress.stage("intersect")
+        keys = feature_keys(gdf2)
+        if self._plan_columns != tuple(gdf2.columns):
+            self._forget_plan()
+        changed = np.array([k not in self._plan_keys for k in keys], dtype=bool)
+        keep = np.isin(self._row_keys, keys[~changed])
+
+        parts = [] if self._rows is None else [self._rows[keep]]
+        row_keys, row_base = [self._row_keys[keep]], [self._row_base[keep]]
+        slivers = {k: self._slivers[k] for k in keys[~changed]} if options.grid_size else {}
+        if changed.any():
+            new_rows, i, j = sindex_intersection(base.gdf, gdf2[changed], progress, return_pairs=True,
+                                                  grid_size=options.grid_size)
+            if options.grid_size:
+                slivers.update(zip(keys[changed], new_rows.attrs["slivers_by_plan"]))
+            parts.append(compute_units(new_rows, options))
+            row_keys.append(keys[changed][j])
+            row_base.append(base.gdf.index.to_numpy()[i])
+        rows = pd.concat(parts, ignore_index=True)
+        row_keys, row_base = np.concatenate(row_keys), np.concatenate(row_base)
+        # the row order of a full run: by baseline feature, then by plan feature
+        position = dict(zip(keys, range(len(keys))))
+        order = np.lexsort((np.array([position[k] for k in row_keys], dtype=int),
+                            base.gdf.index.get_indexer(row_base)))
+        rows = rows.iloc[order].reset_index(drop=True)
+        if options.grid_size:
+            rows.attrs["slivers"] = sum(slivers.values())
+        row_keys, row_base = row_keys[order], row_base[order]
+
+        self.last_stats = {"footprints": len(keys), "recomputed": int(changed.sum()),
+                           "removed": len(self._plan_keys - set(keys)), "reused_rows": int(keep.sum())}
+        print(f"Incremental run: {self.last_stats['recomputed']} of {len(keys)} footprints recomputed, "
+              f"{self.last_stats['removed']} removed, {self.last_stats['reused_rows']} loss rows reused")
+        self._rows, self._row_keys, self._row_base = rows, row_keys, row_base
+        self._plan_keys, self._plan_columns = set(keys), tuple(gdf2.columns)
+        self._slivers = slivers
+
+        if rows.empty:
+            raise LossError("No overlap", "No overlap between baseline and planned development after cleaning.")
+        progress.stage("aggregate")
+        return LossResult(
+            baseline=base.gdf,
+            intersection=rows,
+            total_baseline_ha=base.total_baseline_ha,
+            total_loss_ha=float(rows["Loss area (ha)"].sum()),
+            total_units=float(rows["Biodiversity units"].sum()),
+            unmapped_condition=base.unmapped_condition,
+            unmapped_distinctiveness=base.unmapped_distinctiveness,
+            warnings=list(warnings) + base.warnings,
+            baseline_repair=self._repair,
+            planned_repair=repair,
+            baseline_clipped=clipped,
+            habitats=habitat_summary(rows),
+            plan_union=plan_union,
+            slivers_removed=_report_slivers(rows, options),
+        )
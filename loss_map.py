@@ -0,0 +1,563 @@
+# -*- coding: utf-8 -*-
+"""
+Loss map rendering and the loss settings of the map app (29Oct_map.py).
+
+Kept out of the Tk script so the same maps can be drawn headless (see
+biodiversity_cli.py). matplotlib is only imported when a map is drawn.
+Drawn maps and the prepared polygon layers are kept in small LRU caches
+keyed by a content hash of the data, so showing or saving the same result
+again does not redraw it.
+"""
+
+import hashlib
+import io
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from baseline_cache import default_cache_dir
+from loss_engine import LossOptions, Rule, ScoringRules, habitat_summary
+
+# -------------------- Settings --------------------
+# Scoring rules used by 29Oct_map's Loss tab (substring match, first hit wins)
+CONDITION_RULES = ScoringRules("condition-29oct", [
+    Rule(3.0, ('good', '3')),
+    Rule(2.5, ('fairly good', '2.5')),
+    Rule(2.0, ('moderate', '2')),
+    Rule(1.5, ('fairly poor', '1.5')),
+    Rule(1.0, ('poor', '1')),
+])
+
+DISTINCTIVENESS_RULES = ScoringRules("distinctiveness-29oct", [
+    Rule(8, ('v.high', 'very high', '8')),
+    Rule(6, ('high', '6')),
+    Rule(4, ('medium', '4')),
+    Rule(2, ('low', '2')),
+    Rule(0, ('v.low', 'very low', '0')),
+])
+
+def loss_options(significance, dxf_export=False, union_plan=False, grid_size=None):
+    """Loss engine settings for this app: everything in EPSG:31370, 2-decimal rounding."""
+    return LossOptions(
+        significance=significance,
+        target_crs="EPSG:31370",
+        max_center_distance=10000,  # centres more than 10km apart are probably the wrong files
+        require_columns=True,
+        decimals=2,
+        fill_unscored=False,
+        condition_rules=CONDITION_RULES,
+        distinct_rules=DISTINCTIVENESS_RULES,
+        dxf_export=dxf_export,
+        cache_dir=str(default_cache_dir()),
+        union_plan=union_plan,
+        grid_size=grid_size,
+    )
+
+# -------------------- Map Visualization Functions --------------------
+# Nature-inspired palette by broad habitat type; anything else is drawn in OTHER_HABITAT_COLOR
+NATURE_COLORS = {
+    'Grassland': '#9ACD32', 'Woodland': '#228B22', 'Forest': '#006400',
+    'Heathland and shrub': '#DAA520', 'Cropland': '#8B4513',
+    'Wetland': '#20B2AA', 'Urban': '#A9A9A9', 'Other': '#FFD700'
+}
+OTHER_HABITAT_COLOR = '#FF6B35'
+
+
+def habitat_color_map(baseline_gdf):
+    """{habitat type: colour} for the habitat types found in the baseline (empty without the column)."""
+    if 'Baseline Broad Habitat Type' not in baseline_gdf.columns:
+        return {}
+    return {habitat_type: NATURE_COLORS.get(str(habitat_type).strip(), OTHER_HABITAT_COLOR)
+            for habitat_type in baseline_gdf['Baseline Broad Habitat Type'].unique()}
+
+def _pyplot():
+    """pyplot on the Agg backend, imported on the first render so importing this module stays cheap."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def add_scale_bar(ax, gdf, location='lower left', length_km=None):
+    """Add a scale bar to the map"""
+    try:
+        # Get the bounds of the data
+        bounds = gdf.total_bounds  # [minx, miny, maxx, maxy]
+        
+        # Calculate appropriate scale bar length (auto-adjust based on map size)
+        map_width_m = bounds[2] - bounds[0]
+        if length_km is None:
+            # Auto-calculate reasonable scale bar length
+            if map_width_m > 5000:  # Large area
+                length_km = 1.0
+            elif map_width_m > 1000:  # Medium area
+                length_km = 0.5
+            else:  # Small area
+                length_km = 0.1
+        
+        length_m = length_km * 1000  # Convert to meters
+        
+        # Set position (using relative coordinates) - LOWER LEFT for scale bar
+        if location == 'lower left':
+            x_rel = 0.05  # 5% from left
+            y_rel = 0.08  # 8% from bottom (moved up slightly to avoid edge)
+        elif location == 'lower right':
+            x_rel = 0.95  # 95% from left  
+            y_rel = 0.08  # 8% from bottom
+        else:  # lower center
+            x_rel = 0.5   # center
+            y_rel = 0.08  # 8% from bottom
+        
+        # Convert relative to data coordinates
+        x_data = bounds[0] + x_rel * map_width_m
+        y_data = bounds[1] + y_rel * (bounds[3] - bounds[1])
+        
+        # Draw the main scale bar (thicker for better visibility)
+        ax.plot([x_data, x_data + length_m], [y_data, y_data], 
+               color='black', linewidth=6, solid_capstyle='butt')  # Increased linewidth
+        
+        # Add perpendicular ends (thicker)
+        end_height = length_m * 0.15  # 15% of bar length (increased)
+        ax.plot([x_data, x_data], [y_data - end_height/2, y_data + end_height/2], 
+               color='black', linewidth=4)  # Thicker
+        ax.plot([x_data + length_m, x_data + length_m], 
+               [y_data - end_height/2, y_data + end_height/2], 
+               color='black', linewidth=4)  # Thicker
+        
+        # Add scale text (larger font)
+        if length_km >= 1:
+            scale_text = f'{length_km:.0f} km'
+        else:
+            scale_text = f'{length_km * 1000:.0f} m'
+        
+        ax.text(x_data + length_m/2, y_data + end_height, scale_text,
+               ha='center', va='bottom', fontsize=12, fontweight='bold',  # Increased font size
+               bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.9, linewidth=1))
+        
+        print(f"✅ Added scale bar: {scale_text}")
+        
+    except Exception as e:
+        print(f"⚠️ Could not add scale bar: {e}")
+
+def add_north_arrow(ax, location='lower right', size=40):
+    """Add a north arrow to the map - bigger and in lower right corner"""
+    import matplotlib.patches as mpatches
+    try:
+        # Use relative coordinates for positioning
+        if location == 'lower right':
+            x = 0.93  # 93% from left (lower right)
+            y = 0.08  # 8% from bottom (lower position)
+        elif location == 'upper right':
+            x = 0.95
+            y = 0.95
+        elif location == 'upper left':
+            x = 0.05
+            y = 0.95
+        else:  # lower left
+            x = 0.05
+            y = 0.08
+        
+        # Create a larger north arrow using a triangle (more visible)
+        arrow_size = size * 0.001  # Scale factor for arrow size
+        
+        # Draw a triangle for the north arrow
+        arrow_points = [
+            [x, y + arrow_size],           # Top point
+            [x - arrow_size/2, y],         # Bottom left
+            [x + arrow_size/2, y],         # Bottom right
+            [x, y + arrow_size]            # Back to top (close triangle)
+        ]
+        
+        arrow_patch = mpatches.Polygon(
+            arrow_points,
+            closed=True,
+            facecolor='black',
+            edgecolor='black',
+            linewidth=2,
+            transform=ax.transAxes
+        )
+        ax.add_patch(arrow_patch)
+        
+        # Add "N" text below the arrow (bigger and bolder)
+        ax.text(x, y + arrow_size, 'N', 
+               ha='center', va='top', 
+               fontsize=16, fontweight='bold',  # Increased font size
+               transform=ax.transAxes,
+               bbox=dict(boxstyle="circle,pad=0.4", facecolor='white', edgecolor='black', linewidth=1))
+        
+        print("✅ Added BIG north arrow in lower right corner")
+        
+    except Exception as e:
+        print(f"⚠️ Could not add north arrow: {e}")
+
+# pyplot keeps global figure state and previews are drawn on the loss worker thread
+RENDER_LOCK = threading.Lock()
+
+# columns the map shows besides the geometry; a change to any of them means a new map
+MAP_COLUMNS = ['Baseline Broad Habitat Type', 'Loss area (ha)', 'Biodiversity units']
+
+
+class RenderCache:
+    """Least-recently-used store holding at most max_entries values."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# finished maps: MapImage previews and PNG bytes, by data, mode and size
+RENDER_CACHE = RenderCache(8)
+# polygon_paths output by geometry and tolerance (large layers are big: keep few)
+LAYER_CACHE = RenderCache(4)
+
+
+def geometry_key(gdf):
+    """Content hash of gdf's geometries: every coordinate plus each feature's type and size.
+
+    Hashing the raw coordinate array is several times faster than going
+    through WKB, which matters on the Refresh path of a 200k-feature baseline.
+    """
+    import numpy as np
+    import shapely
+
+    geoms = gdf.geometry.values
+    digest = hashlib.sha256(str(gdf.crs).encode())
+    for counts in (shapely.get_type_id(geoms), shapely.get_num_geometries(geoms), shapely.get_num_coordinates(geoms)):
+        digest.update(np.ascontiguousarray(counts, dtype=np.int64).tobytes())
+    digest.update(shapely.get_coordinates(geoms).tobytes())
+    return digest.hexdigest()
+
+
+def map_key(baseline_gdf, intersection_gdf):
+    """(baseline geometry key, intersection geometry key, attribute key) of the data a map shows."""
+    import pandas as pd
+
+    digest = hashlib.sha256()
+    for gdf in (baseline_gdf, intersection_gdf):
+        columns = [c for c in MAP_COLUMNS if c in gdf.columns]
+        digest.update(repr(columns).encode())
+        if columns:
+            digest.update(pd.util.hash_pandas_object(gdf[columns], index=False).values.tobytes())
+    return geometry_key(baseline_gdf), geometry_key(intersection_gdf), digest.hexdigest()
+
+
+def polygon_paths(geoms, tolerance=0.0):
+    """(paths, index): one compound matplotlib Path per non-empty (multi)polygon in geoms.
+
+    index gives the position in geoms of each path. With a tolerance the
+    outlines are simplified first, so detail finer than a pixel does not cost
+    thousands of vertices. GEOS keeps the simplified polygons valid; a feature
+    that would collapse (smaller than the tolerance) keeps its own outline.
+    """
+    import numpy as np
+    import shapely
+    from matplotlib.path import Path
+
+    geoms = np.asarray(geoms, dtype=object)
+    if tolerance > 0:
+        # plain Douglas-Peucker: the topology-preserving variant is ~10x slower and
+        # costs more than it saves at sub-pixel tolerances
+        simplified = shapely.simplify(geoms, tolerance, preserve_topology=False)
+        geoms = np.where(shapely.is_empty(simplified) & ~shapely.is_empty(geoms), geoms, simplified)
+    parts, owner = shapely.get_parts(geoms, return_index=True)
+    rings, part = shapely.get_rings(parts, return_index=True)
+    coords, ring = shapely.get_coordinates(rings, return_index=True)
+    if not len(coords):
+        return [], np.empty(0, dtype=int)
+    # every ring starts with MOVETO and ends with CLOSEPOLY (its closing vertex)
+    codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+    ring_start = np.flatnonzero(np.r_[True, ring[1:] != ring[:-1]])
+    codes[ring_start] = Path.MOVETO
+    codes[np.r_[ring_start[1:], len(coords)] - 1] = Path.CLOSEPOLY
+    feature = owner[part[ring]]
+    start = np.flatnonzero(np.r_[True, feature[1:] != feature[:-1]])
+    end = np.r_[start[1:], len(coords)]
+    paths = [Path(coords[a:b], codes[a:b]) for a, b in zip(start, end)]
+    return paths, feature[start]
+
+
+def add_polygon_layer(ax, gdf, colors, tolerance=0.0, key=None, **kwargs):
+    """Draw gdf's polygons on ax as one collection, colors giving one colour per row.
+
+    With key (geometry_key of gdf) the paths are kept in LAYER_CACHE for the
+    next map of the same layer at the same tolerance. kwargs go to the
+    PathCollection (alpha, edgecolor, linewidth, ...). Returns the
+    collection, or None when there is nothing to draw.
+    """
+    import numpy as np
+    from matplotlib.collections import PathCollection
+    from matplotlib.colors import to_rgba_array
+
+    prepared = LAYER_CACHE.get((key, tolerance)) if key else None
+    if prepared is None:
+        prepared = polygon_paths(gdf.geometry.values, tolerance)
+        if key:
+            LAYER_CACHE.put((key, tolerance), prepared)
+    paths, index = prepared
+    if not paths:
+        return None
+    # convert each distinct colour once, not once per feature
+    names, inverse = np.unique(np.asarray(colors, dtype=str), return_inverse=True)
+    facecolors = to_rgba_array(names)[inverse.ravel()][index]
+    collection = PathCollection(paths, facecolors=facecolors, **kwargs)
+    # the layer's bounds as data limits: cheaper than matplotlib walking every path
+    ax.add_collection(collection, autolim=False)
+    minx, miny, maxx, maxy = gdf.total_bounds
+    ax.update_datalim([(minx, miny), (maxx, maxy)])
+    ax.set_aspect('equal')
+    ax.autoscale_view()
+    return collection
+
+
+def pixel_size(ax, bounds):
+    """Map units per output pixel once bounds (minx, miny, maxx, maxy) fill ax at equal aspect."""
+    fig = ax.figure
+    box = ax.get_position()
+    width_px = box.width * fig.get_figwidth() * fig.dpi
+    height_px = box.height * fig.get_figheight() * fig.dpi
+    return max((bounds[2] - bounds[0]) / width_px, (bounds[3] - bounds[1]) / height_px)
+
+
+@dataclass
+class MapImage:
+    """A rendered map held in memory: width x height pixels of 8-bit RGBA, row by row."""
+    width: int
+    height: int
+    rgba: bytes
+
+
+def create_loss_map_as_png(baseline_gdf, intersection_gdf, output_png, preview_mode=False, summary=None):
+    """Create PNG map - can be used for both high-quality save and fast preview
+
+    summary: the run's loss-by-habitat table (LossResult.habitats) for the map's
+    table; worked out from intersection_gdf when not given.
+    """
+    with RENDER_LOCK:
+        keys = map_key(baseline_gdf, intersection_gdf)
+        cache_key = ("png", preview_mode) + keys
+        png = RENDER_CACHE.get(cache_key)
+        if png is None:
+            buffer = io.BytesIO()
+            if not _draw_loss_map(baseline_gdf, intersection_gdf, buffer, preview_mode, keys=keys, summary=summary):
+                return False
+            png = buffer.getvalue()
+            RENDER_CACHE.put(cache_key, png)
+        else:
+            print("✅ Same map drawn before: reusing it")
+    try:
+        with open(output_png, "wb") as f:
+            f.write(png)
+    except OSError as e:
+        print(f"💥 Could not write {output_png}: {e}")
+        return False
+    return True
+
+
+def render_loss_map_preview(baseline_gdf, intersection_gdf, width, height, summary=None):
+    """Preview map drawn straight into memory at exactly width x height pixels.
+
+    Same layout as the preview PNG, rasterised at the size it is shown at, so
+    there is no file to write, decode or scale down. summary is as for
+    create_loss_map_as_png. Returns a MapImage, or None if drawing failed.
+    """
+    size_px = (int(width), int(height))
+    with RENDER_LOCK:
+        keys = map_key(baseline_gdf, intersection_gdf)
+        cache_key = ("preview", size_px) + keys
+        image = RENDER_CACHE.get(cache_key)
+        if image is None:
+            image = _draw_loss_map(baseline_gdf, intersection_gdf, None, True, size_px=size_px, keys=keys,
+                                   summary=summary) or None
+            if image is not None:
+                RENDER_CACHE.put(cache_key, image)
+    return image
+
+
+def _draw_loss_map(baseline_gdf, intersection_gdf, output_png, preview_mode, size_px=None, keys=None, summary=None):
+    plt = _pyplot()
+    import matplotlib.patches as mpatches
+    try:
+        print("🔍 Starting PNG map creation...")
+        
+        # Clear matplotlib cache
+        plt.close('all')
+        import gc
+        gc.collect()
+        
+        # Different settings for preview vs save
+        if preview_mode:
+            # PREVIEW SETTINGS - Fast rendering
+            figsize = (14, 8)  # Smaller
+            dpi = 100          # Lower quality
+            fontsize = 10      # Smaller text
+            linewidth = 1.0    # Thinner lines
+        else:
+            # SAVE SETTINGS - High quality
+            figsize = (20, 12) # Larger
+            dpi = 300          # Higher quality  
+            fontsize = 12      # Normal text
+            linewidth = 1.5    # Thicker lines
+        if size_px is not None:
+            # keep the preview layout, just pick the dpi that fills size_px exactly
+            dpi = min(size_px[0] / figsize[0], size_px[1] / figsize[1])
+            figsize = (size_px[0] / dpi, size_px[1] / dpi)
+        
+        fig, (ax_map, ax_table) = plt.subplots(1, 2, figsize=figsize, dpi=dpi,
+                                              gridspec_kw={'width_ratios': [2, 1]})
+        
+        # Outlines are simplified to half an output pixel: nothing visible changes, but a
+        # large baseline is drawn with far fewer vertices
+        bounds = baseline_gdf.total_bounds
+        if len(intersection_gdf):
+            ib = intersection_gdf.total_bounds
+            bounds = [min(bounds[0], ib[0]), min(bounds[1], ib[1]), max(bounds[2], ib[2]), max(bounds[3], ib[3])]
+        tolerance = pixel_size(ax_map, bounds) / 2 if len(baseline_gdf) else 0.0
+        if tolerance > 0:
+            # rounded down to a power of two, so nearby output sizes share LAYER_CACHE entries
+            tolerance = 2.0 ** math.floor(math.log2(tolerance))
+        baseline_key, intersection_key = keys[:2] if keys else (None, None)
+        
+        # Step 2: Plot baseline habitats (one collection, a colour per feature)
+        color_map = habitat_color_map(baseline_gdf)
+        if 'Baseline Broad Habitat Type' in baseline_gdf.columns:
+            # Plot baseline with light colors
+            colors = baseline_gdf['Baseline Broad Habitat Type'].map(color_map).fillna(OTHER_HABITAT_COLOR)
+            add_polygon_layer(ax_map, baseline_gdf, colors, tolerance, baseline_key,
+                              alpha=0.3, edgecolor='gray', linewidth=0.5)
+        else:
+            # Fallback if no habitat type column
+            add_polygon_layer(ax_map, baseline_gdf, ['lightgray'] * len(baseline_gdf), tolerance, baseline_key,
+                              alpha=0.5, edgecolor='gray', linewidth=0.5)
+        
+        # Step 3: Plot intersection/loss areas
+        if 'Baseline Broad Habitat Type' in intersection_gdf.columns:
+            colors = intersection_gdf['Baseline Broad Habitat Type'].map(color_map).fillna(OTHER_HABITAT_COLOR)
+            add_polygon_layer(ax_map, intersection_gdf, colors, tolerance, intersection_key,
+                              alpha=0.8, edgecolor='black', linewidth=linewidth)
+        else:
+            add_polygon_layer(ax_map, intersection_gdf, ['red'] * len(intersection_gdf), tolerance,
+                              intersection_key, alpha=0.8, edgecolor='black', linewidth=linewidth)
+        
+        # Step 4: Create summary table
+        if summary is None and 'Baseline Broad Habitat Type' in intersection_gdf.columns:
+            summary = habitat_summary(intersection_gdf)
+        if summary is not None:
+            if preview_mode:
+                # Truncate long names for preview
+                names = [h[:12] + '...' if len(h) > 12 else h for h in summary['Habitat type']]
+                summary_data = [[n, f"{a:.1f}", f"{u:.1f}"]
+                                for n, a, u in zip(names, summary['Loss area (ha)'], summary['Biodiversity units'])]
+            else:
+                summary_data = [[n, f"{a:.2f}", f"{u:.2f}"] for n, a, u in
+                                zip(summary['Habitat type'], summary['Loss area (ha)'], summary['Biodiversity units'])]
+            
+            # Create table
+            if summary_data:
+                if preview_mode:
+                    col_labels = ['Habitat', 'Area', 'Loss']
+                else:
+                    col_labels = ['Habitat Type', 'Area (ha)', 'Biodiversity Loss']
+                    
+                table = ax_table.table(cellText=summary_data,
+                                     colLabels=col_labels,
+                                     loc='center',
+                                     cellLoc='center',
+                                     colColours=['#E8F5E8', '#E8F5E8', '#E8F5E8'])
+                
+                table.auto_set_font_size(False)
+                table.set_fontsize(fontsize-2)
+                table.scale(1, 1.5)
+        
+        # Step 5: Create legend
+        if color_map:
+            legend_patches = []
+            items = list(color_map.items())
+            if preview_mode:
+                items = items[:5]  # Limit to 5 items for preview
+                
+            for habitat_type, color in items:
+                patch = mpatches.Patch(color=color, label=habitat_type, alpha=0.8)
+                legend_patches.append(patch)
+            
+            ax_map.legend(handles=legend_patches, 
+                         title='Habitat Types',
+                         loc='upper right',
+                         fontsize=fontsize-2,
+                         framealpha=0.9)
+        
+        # Step 6: Add Scale Bar and North Arrow
+        try:
+            add_scale_bar(ax_map, baseline_gdf)
+            add_north_arrow(ax_map)
+        except Exception as e:
+            print(f"⚠️ Map elements failed: {e}")
+        
+        # Step 7: Customize map appearance
+        ax_map.set_title('Biodiversity Loss Map', fontsize=fontsize+2, fontweight='bold', pad=20)
+        ax_table.set_title('Loss Summary', fontsize=fontsize, fontweight='bold', pad=20)
+        ax_table.axis('off')
+        
+        # Calculate and display totals
+        total_biodiversity_loss = intersection_gdf['Biodiversity units'].sum() if 'Biodiversity units' in intersection_gdf.columns else 0
+        total_area_loss = intersection_gdf['Loss area (ha)'].sum() if 'Loss area (ha)' in intersection_gdf.columns else 0
+        
+        stats_text = f"Total Biodiversity Loss: {total_biodiversity_loss:,.1f} units\nTotal Area Impacted: {total_area_loss:,.1f} ha"
+        
+        ax_map.text(0.02, 0.98, stats_text, 
+                   transform=ax_map.transAxes, 
+                   fontsize=fontsize, 
+                   fontweight='bold',
+                   verticalalignment='top',
+                   bbox=dict(boxstyle="round,pad=0.5", facecolor='white', alpha=0.9))
+        
+        # Remove axis ticks from map
+        ax_map.set_xticks([])
+        ax_map.set_yticks([])
+        
+        # Add grid for better spatial reference
+        ax_map.grid(True, alpha=0.3)
+        
+        # Save with appropriate quality
+        plt.tight_layout()
+        if size_px is not None:
+            # in-memory preview: no bbox_inches='tight', which would change the size
+            fig.canvas.draw()
+            width, height = fig.canvas.get_width_height()
+            image = MapImage(width, height, bytes(fig.canvas.buffer_rgba()))
+            plt.close('all')
+            print(f"✅ Preview drawn at {width}x{height} px")
+            return image
+        plt.savefig(output_png, dpi=dpi, bbox_inches='tight', 
+                   facecolor='white', edgecolor='none',
+                   format='png', transparent=False)
+        plt.close('all')
+        gc.collect()
+        
+        print(f"✅ PNG saved successfully (preview_mode: {preview_mode})")
+        return True
+        
+    except Exception as e:
+        print(f"💥 Map creation error: {e}")
+        import traceback
+        traceback.print_exc()
+        plt.close('all')
+        return False
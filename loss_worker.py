@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Background runner for loss assessments.
+
+The desktop apps hand jobs to a LossWorker and drain its events from the Tk
+loop with root.after, so the window keeps repainting while a run is going.
+Jobs run one after the other on a single daemon thread (the heavy shapely and
+pyogrio calls release the GIL) and further clicks simply queue up behind the
+running one. cancel() sets the job's event; the run stops at its next stage
+boundary or intersection chunk (see loss_engine.Progress).
+
+Nothing in this module touches tkinter: events are plain tuples on a queue.
+loss_engine (and with it geopandas) is imported by the worker thread when the
+first job starts, so creating a LossWorker at app start is free. PreviewWorker
+does the same for redrawing map previews outside a run.
+"""
+
+import itertools
+import queue
+import threading
+from typing import Any, NamedTuple, Optional
+
+
+class LossEvent(NamedTuple):
+    kind: str  # "started", "progress", "done", "cancelled" or "error"
+    job_id: int
+    label: str
+    stage: Optional[str] = None
+    fraction: float = 0.0
+    payload: Any = None  # the runner's result (a LossResult) for "done", the exception for "error"
+
+
+class LossWorker:
+    def __init__(self):
+        self.events = queue.Queue()
+        self._jobs = queue.Queue()
+        self._ids = itertools.count(1)
+        self._cancel = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, baseline_path, planned_path, options=None, label="", after=None, runner=None):
+        """Queue a run_loss call and return its job id.
+
+        options may also be a function returning the LossOptions; it is called
+        on the worker thread, so whatever it imports stays off the caller's.
+        after(result, progress), if given, runs on the worker thread once the
+        result is in and is reported as the "render" stage (map previews).
+        runner (default run_loss) takes the same arguments and returns the result, e.g.
+        loss_batch.run_scenarios with a directory of plans.
+        """
+        job_id = next(self._ids)
+        with self._lock:
+            self._cancel[job_id] = threading.Event()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="loss-worker", daemon=True)
+                self._thread.start()
+        self._jobs.put((job_id, label or f"Assessment {job_id}", baseline_path, planned_path, options, after, runner))
+        return job_id
+
+    def pending(self):
+        """Jobs queued or running."""
+        with self._lock:
+            return len(self._cancel)
+
+    def cancel(self, job_id=None):
+        """Cancel one job, or the running job and everything queued when job_id is None."""
+        with self._lock:
+            flags = list(self._cancel.values()) if job_id is None else [self._cancel.get(job_id)]
+        for flag in flags:
+            if flag is not None:
+                flag.set()
+
+    def poll(self):
+        """All events posted since the last call, without blocking."""
+        out = []
+        while True:
+            try:
+                out.append(self.events.get_nowait())
+            except queue.Empty:
+                return out
+
+    def _loop(self):
+        try:
+            from loss_engine import LOSS_STAGES, LossCancelled, Progress, run_loss
+        except ImportError as e:  # broken install (e.g. no geopandas): fail each job rather than hang
+            while True:
+                job_id, label = self._jobs.get()[:2]
+                with self._lock:
+                    self._cancel.pop(job_id, None)
+                self.events.put(LossEvent("error", job_id, label, payload=e))
+
+        while True:
+            job_id, label, baseline_path, planned_path, options, after, runner = self._jobs.get()
+            with self._lock:
+                cancel = self._cancel.get(job_id)
+
+            def post(kind, **kw):
+                self.events.put(LossEvent(kind, job_id, label, **kw))
+
+            stages = LOSS_STAGES + (("render",) if after else ())
+            progress = Progress(lambda stage, fraction: post("progress", stage=stage, fraction=fraction),
+                                cancel, stages)
+            try:
+                progress.check()
+                post("started")
+                if callable(options):
+                    options = options()
+                result = (runner or run_loss)(baseline_path, planned_path, options, progress=progress)
+                if after is not None:
+                    progress.stage("render")
+                    after(result, progress)
+                post("done", fraction=1.0, payload=result)
+            except LossCancelled:
+                post("cancelled")
+            except Exception as e:
+                post("error", payload=e)
+            finally:
+                with self._lock:
+                    self._cancel.pop(job_id, None)
+
+
+class PreviewWorker:
+    """Runs one drawing call at a time on a daemon thread; finished ones come back through poll().
+
+    Only the newest request matters (a map preview for the canvas' latest
+    size), so a request replaces any earlier one that has not started yet.
+    """
+
+    def __init__(self):
+        self.results = queue.Queue()
+        self._pending = None
+        self._wake = threading.Condition()
+        self._drawing = False
+        self._thread = None
+
+    def request(self, tag, draw, *args, **kwargs):
+        """Call draw(*args, **kwargs) on the worker thread; poll() returns it with tag."""
+        with self._wake:
+            self._pending = (tag, draw, args, kwargs)
+            self._wake.notify()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="map-preview", daemon=True)
+            self._thread.start()
+
+    def busy(self):
+        """True while a request is waiting or being drawn."""
+        with self._wake:
+            return self._pending is not None or self._drawing
+
+    def poll(self):
+        """(tag, result or the exception) for every drawing finished since the last call."""
+        out = []
+        while True:
+            try:
+                out.append(self.results.get_nowait())
+            except queue.Empty:
+                return out
+
+    def _loop(self):
+        while True:
+            with self._wake:
+                while self._pending is None:
+                    self._wake.wait()
+                tag, draw, args, kwargs = self._pending
+                self._pending = None
+                self._drawing = True
+            try:
+                result = draw(*args, **kwargs)
+            except Exception as e:
+                result = e
+            # the result is queued before busy() turns False, so a last poll() sees it
+            self.results.put((tag, result))
+            with self._wake:
+                self._drawing = False
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Tile pyramid of the loss map, for the pan/zoom viewer in 29Oct_map's Map tab.
+
+The square around the baseline and loss layers is cut into 2**z x 2**z
+tiles of TILE_PX pixels at zoom level z, so each level doubles the detail.
+Tiles are drawn on demand: a TileSource renders one tile from the features
+its spatial index finds in the tile (outlines simplified to the tile's pixel
+size), keeps recent tiles in memory and writes them as PNGs under the tile
+cache folder, keyed by a content hash of the two layers. A TileWorker
+renders the tiles the viewer asks for on a background thread; a newer
+request replaces whatever is still waiting, so the tiles of a view the user
+has already panned away from are never drawn.
+
+Nothing here touches tkinter; the viewer drains TileWorker.poll() from the
+Tk loop (see map_viewer.py). matplotlib and PIL load with the first tile.
+"""
+
+import hashlib
+import math
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from loss_map import (OTHER_HABITAT_COLOR, RENDER_LOCK, MapImage, RenderCache, add_polygon_layer, habitat_color_map,
+                      map_key)
+
+TILE_PX = 256
+MAX_ZOOM = 14
+# finest detail worth a zoom level: map units (metres) per tile pixel
+MIN_PIXEL_SIZE = 0.05
+# tile sets kept in the disk cache (one per loss result); older ones are deleted
+MAX_TILE_SETS = 10
+
+
+def default_tile_dir():
+    from baseline_cache import default_cache_dir
+
+    return default_cache_dir() / "tiles"
+
+
+class TileSource:
+    """Lazily rendered tiles of one loss result (baseline plus loss layer)."""
+
+    def __init__(self, baseline_gdf, intersection_gdf, cache_dir=None, memory_tiles=256):
+        self.baseline = baseline_gdf
+        self.intersection = intersection_gdf
+        bounds = baseline_gdf.total_bounds
+        if len(intersection_gdf):
+            ib = intersection_gdf.total_bounds
+            bounds = [min(bounds[0], ib[0]), min(bounds[1], ib[1]), max(bounds[2], ib[2]), max(bounds[3], ib[3])]
+        # the level-0 tile: a square centred on the data, with a small margin
+        side = max(bounds[2] - bounds[0], bounds[3] - bounds[1], 1.0) * 1.05
+        cx, cy = (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+        self.minx, self.maxy, self.side = cx - side / 2, cy + side / 2, side
+        self.max_zoom = min(MAX_ZOOM, max(0, math.ceil(math.log2(side / (TILE_PX * MIN_PIXEL_SIZE)))))
+        self.cache_dir = Path(cache_dir) if cache_dir else default_tile_dir()
+        self.memory = RenderCache(memory_tiles)
+        self._prepared = None
+        self._prepare_lock = threading.Lock()
+
+    # -------------------- Geometry --------------------
+    def pixel_size(self, z):
+        """Map units per pixel at zoom z."""
+        return self.side / (TILE_PX * 2 ** z)
+
+    def tile_bounds(self, z, x, y):
+        """(minx, miny, maxx, maxy) of tile x (from the left), y (from the top) at zoom z."""
+        size = self.side / 2 ** z
+        minx = self.minx + x * size
+        maxy = self.maxy - y * size
+        return minx, maxy - size, minx + size, maxy
+
+    # -------------------- Tiles --------------------
+    def cached(self, z, x, y):
+        """The tile if it is in memory, else None (never renders or reads disk)."""
+        return self.memory.get((z, x, y))
+
+    def tile(self, z, x, y):
+        """MapImage of a tile: from memory, the disk cache, or drawn now."""
+        image = self.memory.get((z, x, y))
+        if image is not None:
+            return image
+        prepared = self._prepare()
+        path = prepared["dir"] / str(z) / f"{x}_{y}.png"
+        image = self._read(path)
+        if image is None:
+            image = self._render(prepared, z, x, y)
+            self._write(path, image)
+        self.memory.put((z, x, y), image)
+        return image
+
+    def _prepare(self):
+        """Content key, spatial indexes and colours, built once by the first tile."""
+        with self._prepare_lock:
+            if self._prepared is None:
+                key = hashlib.sha256("|".join(map_key(self.baseline, self.intersection)).encode()).hexdigest()
+                color_map = habitat_color_map(self.baseline)
+                layers = []
+                for gdf, fallback, style in (
+                        (self.baseline, 'lightgray', dict(alpha=0.3, edgecolor='gray', linewidth=0.5)),
+                        (self.intersection, 'red', dict(alpha=0.8, edgecolor='black', linewidth=1.0))):
+                    if 'Baseline Broad Habitat Type' in gdf.columns:
+                        colors = gdf['Baseline Broad Habitat Type'].map(color_map).fillna(OTHER_HABITAT_COLOR)
+                    else:
+                        colors = [fallback] * len(gdf)
+                    layers.append((gdf, gdf.sindex, list(colors), style))
+                tile_dir = self.cache_dir / key[:24]
+                prune_tile_cache(self.cache_dir, keep=tile_dir)
+                self._prepared = {"dir": tile_dir, "layers": layers}
+            return self._prepared
+
+    def _render(self, prepared, z, x, y):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        import numpy as np
+        import shapely
+
+        minx, miny, maxx, maxy = self.tile_bounds(z, x, y)
+        area = shapely.box(minx, miny, maxx, maxy)
+        tolerance = self.pixel_size(z) / 2
+        # 72 dpi: a line width in points is the same number of pixels
+        fig = Figure(figsize=(TILE_PX / 72, TILE_PX / 72), dpi=72, facecolor='white')
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_axes((0, 0, 1, 1))
+        ax.set_axis_off()
+        with RENDER_LOCK:
+            for gdf, sindex, colors, style in prepared["layers"]:
+                rows = np.sort(sindex.query(area, predicate="intersects"))
+                if len(rows):
+                    # features much larger than the tile are clipped to it (plus a margin
+                    # that keeps the cut edges out of sight), so they stay cheap to draw
+                    geoms = gdf.geometry.values[rows].copy()
+                    b = shapely.bounds(geoms)
+                    big = np.maximum(b[:, 2] - b[:, 0], b[:, 3] - b[:, 1]) > 2 * (maxx - minx)
+                    if big.any():
+                        geoms[big] = shapely.intersection(geoms[big], area.buffer(tolerance * 8))
+                    part = gdf.iloc[rows].set_geometry(geoms)
+                    add_polygon_layer(ax, part, [colors[i] for i in rows], tolerance, **style)
+            ax.set_xlim(minx, maxx)
+            ax.set_ylim(miny, maxy)
+            canvas.draw()
+            width, height = canvas.get_width_height()
+            return MapImage(width, height, bytes(canvas.buffer_rgba()))
+
+    @staticmethod
+    def _read(path):
+        if not path.exists():
+            return None
+        try:
+            from PIL import Image
+
+            with Image.open(path) as img:
+                img = img.convert("RGBA")
+                return MapImage(img.width, img.height, img.tobytes())
+        except Exception as e:
+            print(f"Tile cache read failed ({e}), redrawing {path.name}")
+            return None
+
+    @staticmethod
+    def _write(path, image):
+        try:
+            from PIL import Image
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+            Image.frombuffer("RGBA", (image.width, image.height), image.rgba, "raw", "RGBA", 0, 1).save(tmp, "PNG")
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"Tile cache write failed: {e}")
+
+
+def prune_tile_cache(cache_dir, keep=None, max_sets=MAX_TILE_SETS):
+    """Mark tile set keep as used and delete all but the max_sets most recently used sets."""
+    cache_dir = Path(cache_dir)
+    if keep is not None and Path(keep).exists():
+        now = time.time()
+        os.utime(keep, (now, now))
+    if not cache_dir.exists():
+        return
+    sets = sorted((p for p in cache_dir.iterdir() if p.is_dir() and p != Path(keep or "")),
+                  key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in sets[max_sets - (1 if keep is not None else 0):]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class TileWorker:
+    """Draws requested tiles on a daemon thread; finished tiles come back through poll()."""
+
+    def __init__(self):
+        self.results = queue.Queue()
+        self._pending = []
+        self._wake = threading.Condition()
+        self._drawing = False
+        self._thread = None
+
+    def request(self, source, tiles):
+        """Draw tiles ((z, x, y), first ones first) of source, dropping any earlier request still waiting."""
+        with self._wake:
+            self._pending = [(source, t) for t in reversed(tiles)]
+            self._wake.notify()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="map-tiles", daemon=True)
+            self._thread.start()
+
+    def busy(self):
+        """True while tiles are waiting or being drawn."""
+        with self._wake:
+            return bool(self._pending) or self._drawing
+
+    def poll(self):
+        """(source, (z, x, y), MapImage or the exception) for every tile finished since the last call."""
+        out = []
+        while True:
+            try:
+                out.append(self.results.get_nowait())
+            except queue.Empty:
+                return out
+
+    def _loop(self):
+        while True:
+            with self._wake:
+                while not self._pending:
+                    self._wake.wait()
+                source, tile = self._pending.pop()
+                self._drawing = True
+            try:
+                image = source.tile(*tile)
+            except Exception as e:
+                image = e
+            # the result is queued before busy() turns False, so a last poll() sees it
+            self.results.put((source, tile, image))
+            with self._wake:
+                self._drawing = False
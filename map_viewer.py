@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Pan/zoom viewer for the loss map, shown in 29Oct_map's Map tab.
+
+A Tk canvas laid with map_tiles tiles: drag to pan, mouse wheel (or the +/-
+keys) to zoom around the pointer, double-click to zoom in, Home to fit.
+Panning only moves the tiles already on the canvas, and a tile that is not
+in memory yet is asked of the TileWorker; while it is drawn the parent tile
+stands in, scaled up. Nothing on the Tk thread renders or reads from disk.
+"""
+
+import tkinter as tk
+
+from PIL import Image, ImageTk
+
+from map_tiles import TILE_PX, TileSource, TileWorker
+
+POLL_MS = 40
+
+
+def _photo(image, crop=None):
+    """Tk image of a MapImage, or of the crop box of it blown up to a whole tile."""
+    img = Image.frombuffer("RGBA", (image.width, image.height), image.rgba, "raw", "RGBA", 0, 1)
+    if crop is not None:
+        img = img.crop(crop).resize((TILE_PX, TILE_PX), Image.Resampling.NEAREST)
+    return ImageTk.PhotoImage(img)
+
+
+class MapViewer:
+    def __init__(self, parent, **canvas_options):
+        self.canvas = tk.Canvas(parent, bg="white", highlightthickness=0, **canvas_options)
+        self.worker = TileWorker()
+        self.source = None
+        self.zoom = 0
+        self.origin = (0.0, 0.0)  # canvas position of the level's top-left corner
+        self._items = {}  # (z, x, y) -> (canvas item, photo, placeholder?)
+        self._drag = None
+        self._polling = False
+        c = self.canvas
+        c.bind("<ButtonPress-1>", self._on_press)
+        c.bind("<B1-Motion>", self._on_drag)
+        c.bind("<ButtonRelease-1>", self._on_release)
+        c.bind("<Double-Button-1>", lambda e: self.zoom_by(1, (e.x, e.y)))
+        c.bind("<MouseWheel>", lambda e: self.zoom_by(1 if e.delta > 0 else -1, (e.x, e.y)))
+        c.bind("<Button-4>", lambda e: self.zoom_by(1, (e.x, e.y)))  # X11 wheel
+        c.bind("<Button-5>", lambda e: self.zoom_by(-1, (e.x, e.y)))
+        c.bind("<Configure>", lambda e: self._update())
+        c.bind("<Enter>", lambda e: c.focus_set())
+        c.bind("<plus>", lambda e: self.zoom_by(1))
+        c.bind("<equal>", lambda e: self.zoom_by(1))
+        c.bind("<minus>", lambda e: self.zoom_by(-1))
+        c.bind("<Home>", lambda e: self.fit())
+
+    # -------------------- Public --------------------
+    def show(self, baseline_gdf, intersection_gdf):
+        """Start viewing a new loss result, fitted to the canvas."""
+        self.source = TileSource(baseline_gdf, intersection_gdf)
+        self.fit()
+
+    def clear(self):
+        self.source = None
+        self.canvas.delete("all")
+        self._items.clear()
+
+    def fit(self):
+        """Largest zoom at which the whole extent fits the canvas, centred."""
+        if self.source is None:
+            return
+        w, h = self._size()
+        self.zoom = 0
+        while self.zoom < self.source.max_zoom and TILE_PX * 2 ** (self.zoom + 1) <= min(w, h):
+            self.zoom += 1
+        span = TILE_PX * 2 ** self.zoom
+        self._reset((w - span) / 2, (h - span) / 2)
+
+    def zoom_by(self, step, anchor=None):
+        """Zoom in (step > 0) or out one level, keeping the map point under anchor in place."""
+        if self.source is None:
+            return
+        zoom = min(max(self.zoom + step, 0), self.source.max_zoom)
+        if zoom == self.zoom:
+            return
+        ax, ay = anchor if anchor is not None else [v / 2 for v in self._size()]
+        f = 2.0 ** (zoom - self.zoom)
+        self.zoom = zoom
+        self._reset(ax - (ax - self.origin[0]) * f, ay - (ay - self.origin[1]) * f)
+
+    # -------------------- Drawing --------------------
+    def _size(self):
+        w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if w <= 1 or h <= 1:
+            w, h = self.canvas.winfo_reqwidth(), self.canvas.winfo_reqheight()
+        return w, h
+
+    def _reset(self, ox, oy):
+        self.canvas.delete("tile")
+        self._items.clear()
+        self.origin = (ox, oy)
+        self._update()
+
+    def _visible(self):
+        """Tiles of the current level on the canvas, nearest the centre first."""
+        w, h = self._size()
+        ox, oy = self.origin
+        n = 2 ** self.zoom
+        xs = range(max(0, int((0 - ox) // TILE_PX)), min(n, int((w - ox) // TILE_PX) + 1))
+        ys = range(max(0, int((0 - oy) // TILE_PX)), min(n, int((h - oy) // TILE_PX) + 1))
+        cx, cy = (w / 2 - ox) / TILE_PX - 0.5, (h / 2 - oy) / TILE_PX - 0.5
+        return sorted(((self.zoom, x, y) for x in xs for y in ys),
+                      key=lambda t: (t[1] - cx) ** 2 + (t[2] - cy) ** 2)
+
+    def _update(self):
+        """Place what is in memory, stand-ins for the rest, and ask the worker for the missing tiles."""
+        if self.source is None:
+            return
+        visible = self._visible()
+        wanted = set(visible)
+        for key in [k for k in self._items if k not in wanted]:
+            self.canvas.delete(self._items.pop(key)[0])
+        missing = []
+        for key in visible:
+            item = self._items.get(key)
+            if item is not None and not item[2]:
+                continue
+            image = self.source.cached(*key)
+            if image is not None:
+                self._place(key, image)
+            else:
+                missing.append(key)
+                if item is None:
+                    self._place_standin(key)
+        self._draw_hud()
+        if missing:
+            self.worker.request(self.source, missing)
+            if not self._polling:
+                self._polling = True
+                self.canvas.after(POLL_MS, self._poll)
+
+    def _place(self, key, image, crop=None):
+        old = self._items.pop(key, None)
+        _, x, y = key
+        photo = _photo(image, crop)
+        item = self.canvas.create_image(self.origin[0] + x * TILE_PX, self.origin[1] + y * TILE_PX,
+                                        anchor="nw", image=photo, tags=("tile",))
+        self._items[key] = (item, photo, crop is not None)
+        if old is not None:
+            self.canvas.delete(old[0])
+        self.canvas.tag_raise("hud")
+
+    def _place_standin(self, key):
+        """The nearest cached ancestor tile, cropped and scaled up, while the real one is drawn."""
+        z, x, y = key
+        for up in range(1, min(z, 4) + 1):
+            parent = self.source.cached(z - up, x >> up, y >> up)
+            if parent is not None:
+                f = 2 ** up
+                size = TILE_PX // f
+                left, top = (x % f) * size, (y % f) * size
+                self._place(key, parent, (left, top, left + size, top + size))
+                return
+
+    def _draw_hud(self):
+        self.canvas.delete("hud")
+        metres = self.source.pixel_size(self.zoom) * 100
+        self.canvas.create_text(
+            8, 8, anchor="nw", fill="#333333", font=("Arial", 9), tags=("hud",),
+            text=f"Zoom {self.zoom}/{self.source.max_zoom}  |  100 px = {metres:,.1f} m  |  "
+                 f"drag to pan, wheel to zoom, Home to fit")
+
+    def _poll(self):
+        results = self.worker.poll()
+        visible = set(self._visible()) if self.source is not None else set()
+        for source, key, image in results:
+            if isinstance(image, Exception):
+                print(f"Tile {key} failed: {image}")
+            elif source is self.source and key in visible:
+                self._place(key, image)
+        if self.worker.busy() or not self.worker.results.empty():
+            self.canvas.after(POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    # -------------------- Mouse --------------------
+    def _on_press(self, event):
+        self._drag = (event.x, event.y)
+        self._drag_origin = self.origin
+
+    def _on_drag(self, event):
+        if self._drag is None or self.source is None:
+            return
+        dx, dy = event.x - self._drag[0], event.y - self._drag[1]
+        self._drag = (event.x, event.y)
+        self.canvas.move("tile", dx, dy)
+        self.origin = (self.origin[0] + dx, self.origin[1] + dy)
+        # tiles coming into view: whole ones only once a tile's width has been crossed
+        if abs(self.origin[0] - self._drag_origin[0]) > TILE_PX or abs(self.origin[1] - self._drag_origin[1]) > TILE_PX:
+            self._drag_origin = self.origin
+            self._update()
+
+    def _on_release(self, event):
+        self._drag = None
+        self._update()
@@ -35,6 +35,7 @@ configure_proj_paths()
 import certifi
 import geopandas
 import fiona
+import pyogrio
 from cx_Freeze import setup, Executable
 
 # === PATH SETUP ===
@@ -43,6 +44,8 @@ env_bin = env_root / "Library" / "bin"
 geopandas_data = Path(geopandas.__file__).parent / "datasets"
 proj_data = env_root / "Library" / "share" / "proj"
 fiona_libs = Path(fiona.__file__).parent / ".libs"
+pyogrio_dir = Path(pyogrio.__file__).parent
+pyogrio_libs = pyogrio_dir.parent / "pyogrio.libs"
 
 # === INCLUDE FILES ===
 include_files = []
@@ -71,22 +74,61 @@ if fiona_libs.exists():
         for f in fiona_libs.iterdir()
     )
 
-# D) GeoPandas datasets
+# D) pyogrio (the loss engine's reader): its wheel's GDAL DLLs, which it loads from ../pyogrio.libs,
+#    and the GDAL/PROJ data it looks for next to itself
+if pyogrio_libs.exists():
+    include_files.extend(
+        (str(f), f"lib/pyogrio.libs/{f.name}")
+        for f in pyogrio_libs.iterdir()
+    )
+for data_dir in ("gdal_data", "proj_data"):
+    if (pyogrio_dir / data_dir).exists():
+        include_files.append((str(pyogrio_dir / data_dir), f"lib/pyogrio/{data_dir}"))
+
+# E) GeoPandas datasets
 if geopandas_data.exists():
     include_files.append((str(geopandas_data), "geopandas/datasets"))
 
-# E) SSL certificates
+# F) SSL certificates
 include_files.append((certifi.where(), "lib/certifi/cacert.pem"))
 
+# G) matplotlib config for 29Oct_map: matplotlibrc plus a font cache generated here, so the
+#    installed app never scans fonts on its first map render (it copies these to a per-user folder)
+MPL_CONFIG_BUILD = Path("build") / "mpl_config"
+
+def build_matplotlib_config(dest):
+    """Write matplotlibrc and a relocatable font cache into dest.
+
+    Only matplotlib's own fonts are kept: their paths are stored relative to
+    mpl-data, so the cache stays valid wherever the frozen app is installed
+    (system font paths from this machine would make matplotlib rescan).
+    """
+    dest.mkdir(parents=True, exist_ok=True)
+    (dest / "matplotlibrc").write_text("backend: Agg\nfont.family: DejaVu Sans\n", encoding="utf-8")
+    import matplotlib
+    from matplotlib import font_manager
+    data_path = Path(matplotlib.get_data_path())
+    fm = font_manager.FontManager()
+    fm.ttflist = [f for f in fm.ttflist if data_path in Path(f.fname).parents]
+    fm.afmlist = [f for f in fm.afmlist if data_path in Path(f.fname).parents]
+    cache = dest / f"fontlist-v{font_manager.FontManager.__version__}.json"
+    font_manager.json_dump(fm, cache)
+    print(f"Prebuilt matplotlib font cache: {cache} ({len(fm.ttflist)} fonts)")
+
+build_matplotlib_config(MPL_CONFIG_BUILD)
+include_files.extend((str(f), f"lib/mpl_config/{f.name}") for f in MPL_CONFIG_BUILD.iterdir())
+
 # === BUILD OPTIONS ===
 build_options = {
     "packages": [
         "tkinter", "PIL", "requests", "geopandas", 
         "numpy", "pandas", "shapely", "fiona",
-        "pyproj", "rtree", "urllib3", "certifi"
+        "pyogrio", "pyarrow",  # layer reads (loss_engine.read_layer) and the Arrow read path
+        "pyproj", "rtree", "urllib3", "certifi",
+        "matplotlib"  # 29Oct_map's loss maps (Agg backend only)
     ],
     "include_files": include_files,
-    "excludes": ["matplotlib", "PyQt5", "qtpy"],  # Explicitly exclude Qt
+    "excludes": ["PyQt5", "qtpy"],  # Explicitly exclude Qt
     "optimize": 2,
     "include_msvcr": True,
 }
@@ -99,6 +141,12 @@ executables = [
         base="Win32GUI" if sys.platform == "win32" else None,
         target_name="BiodiversityCalculator1.exe",
         icon=icon_path
+    ),
+    Executable(
+        "29Oct_map.py",
+        base="Win32GUI" if sys.platform == "win32" else None,
+        target_name="BiodiversityMap.exe",
+        icon=icon_path
     )
 ]
 